@@ -53,6 +53,26 @@ class WaitAction(Action):
         pass
 
 
+class TakeStairsAction(Action):
+    def __init__(self, entity: Actor, down: bool = True):
+        super().__init__(entity)
+        self.down = down
+
+    def perform(self) -> None:
+        """Usa las escaleras que haya en la ubicación de la entidad."""
+        game_map = self.engine.game_map
+        location = (self.entity.x, self.entity.y)
+
+        if self.down and location == game_map.downstairs_location:
+            self.engine.game_world.descend()
+            self.engine.message_log.add_message("Bajas las escaleras.", color.descend)
+        elif not self.down and location == game_map.upstairs_location:
+            self.engine.game_world.ascend()
+            self.engine.message_log.add_message("Subes las escaleras.", color.descend)
+        else:
+            raise exceptions.Impossible("No hay escaleras aquí")
+
+
 class ActionWithDirection(Action):
     def __init__(self, entity: Actor, dx: int, dy: int):
         super().__init__(entity)
@@ -60,6 +80,12 @@ class ActionWithDirection(Action):
         self.dx = dx
         self.dy = dy
 
+    def retarget(self, dx: int, dy: int) -> ActionWithDirection:
+        """Cambia la dirección y devuelve la misma acción, para reusarla."""
+        self.dx = dx
+        self.dy = dy
+        return self
+
     @property
     def dest_xy(self) -> Tuple[int, int]:
         """Devuelve el destiono de esta acción"""
@@ -84,22 +110,26 @@ class MeleeAction(ActionWithDirection):
         target = self.target_actor
         if not target:
             raise exceptions.Impossible("Nada para atacar")
+
+        if self.engine.melee_batch is not None:
+            self.engine.melee_batch.add(self.entity, target)
+            return
+
         damage = self.entity.fighter.power - target.fighter.defense
 
-        attack_desc = f"{self.entity.name.capitalize()} atacó a {target.name}"
         if self.entity is self.engine.player:
             attack_color = color.player_atk
         else:
             attack_color = color.enemy_atk
 
         if damage > 0:
-            self.engine.message_log.add_message(
-                f"{attack_desc} con {damage} puntos de daño", attack_color
+            self.engine.message_log.add_event(
+                "melee_hit", self.entity.name, target.name, damage, fg=attack_color
             )
             target.fighter.hp -= damage
         else:
-            self.engine.message_log.add_message(
-                f"{attack_desc} pero no hizo daño", attack_color
+            self.engine.message_log.add_event(
+                "melee_miss", self.entity.name, target.name, fg=attack_color
             )
 
 
@@ -116,22 +146,30 @@ class MovementAction(ActionWithDirection):
             # Fuera de rango
             raise exceptions.Impossible("Camino bloqueado")
         
-        if not self.engine.game_map.tiles["walkable"][dest_x, dest_y]:
-            # Bloqueado por un objeto
-            raise exceptions.Impossible("Camino bloqueado")
-        if self.engine.game_map.get_blocking_entity_at_location(dest_x, dest_y):
-            # Bloqueado por otra entidad.
+        if self.engine.game_map.cost[dest_x, dest_y] != 1:
+            # Bloqueado por un objeto o por otra entidad.
             raise exceptions.Impossible("Camino bloqueado")
 
         self.entity.move(self.dx, self.dy)
 
 
 class BumpAction(ActionWithDirection):
+    def __init__(self, entity: Actor, dx: int, dy: int):
+        super().__init__(entity, dx, dy)
+
+        # Se crean la primera vez que hacen falta y después se reusan.
+        self._melee: Optional[MeleeAction] = None
+        self._movement: Optional[MovementAction] = None
+
     def perform(self) -> None:
         if self.blocking_entity:
-            return MeleeAction(self.entity, self.dx, self.dy).perform()
+            if self._melee is None:
+                self._melee = MeleeAction(self.entity, self.dx, self.dy)
+            return self._melee.retarget(self.dx, self.dy).perform()
         else:
-            return MovementAction(self.entity, self.dx, self.dy).perform()
+            if self._movement is None:
+                self._movement = MovementAction(self.entity, self.dx, self.dy)
+            return self._movement.retarget(self.dx, self.dy).perform()
 
 
 class PickupAction(Action):
@@ -141,20 +179,43 @@ class PickupAction(Action):
         super().__init__(entity)
 
     def perform(self) -> None:
-        actor_location_x = self.entity.x
-        actor_location_y = self.entity.y
+        game_map = self.engine.game_map
         inventory = self.entity.inventory
 
-        for item in self.engine.game_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
-                if len(inventory.items) >= inventory.capacity:
-                    raise exceptions.Impossible("Tu inventario está lleno")
+        item = game_map.top_item_at(self.entity.x, self.entity.y)
+        if item is None:
+            raise exceptions.Impossible("No hay nada para agarrar")
+        if inventory.is_full:
+            raise exceptions.Impossible("Tu inventario está lleno")
+
+        game_map.remove_entity(item)
+        inventory.add(item)
 
-                self.engine.game_map.entities.remove(item)
-                item.parent = self.entity.inventory
-                inventory.items.append(item)
+        self.engine.message_log.add_event("pickup", item.name)
 
-                self.engine.message_log.add_message(f"Agarraste {item.name}!")
-                return
 
-        raise exceptions.Impossible("No hay nada para agarrar")
\ No newline at end of file
+class PickupAllAction(Action):
+    """Agarra los items de la ubicación de la entidad que entren en el inventario"""
+
+    def perform(self) -> None:
+        game_map = self.engine.game_map
+        inventory = self.entity.inventory
+
+        item = game_map.top_item_at(self.entity.x, self.entity.y)
+        if item is None:
+            raise exceptions.Impossible("No hay nada para agarrar")
+        if inventory.is_full:
+            raise exceptions.Impossible("Tu inventario está lleno")
+
+        picked = 0
+        while item is not None and not inventory.is_full:
+            game_map.remove_entity(item)
+            inventory.add(item)
+            picked += 1
+            item = game_map.top_item_at(self.entity.x, self.entity.y)
+
+        self.engine.message_log.add_event("pickup_all", picked)
+        if item is not None:
+            self.engine.message_log.add_message(
+                "Tu inventario está lleno", color.impossible
+            )
\ No newline at end of file
@@ -13,6 +13,7 @@ error = (0xFF, 0x40, 0x40)
 
 welcome_text = (0x20, 0xA0, 0xFF)
 health_recovered = (0x0, 0xFF, 0x0)
+descend = (0x9F, 0x3F, 0xFF)
 
 bar_text = white
 bar_filled = (0x0, 0x60, 0x0)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from typing import Dict, List, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+import color
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from entity import Actor
+
+
+class MeleeBatch:
+    """
+    Junta los ataques cuerpo a cuerpo de un turno para resolverlos todos juntos.
+
+    El daño (power - defense) se calcula con arrays, cada objetivo recibe la suma de
+    sus golpes con un solo cambio de HP, y los ataques iguales sobre el mismo
+    objetivo se informan con un solo mensaje.
+    """
+
+    def __init__(self) -> None:
+        self.attackers: List[Actor] = []
+        self.targets: List[Actor] = []
+
+    def __len__(self) -> int:
+        return len(self.attackers)
+
+    def add(self, attacker: Actor, target: Actor) -> None:
+        self.attackers.append(attacker)
+        self.targets.append(target)
+
+    def resolve(self, engine: Engine) -> None:
+        if not self.attackers:
+            return
+
+        count = len(self.attackers)
+        power = np.fromiter(
+            (attacker.fighter.power for attacker in self.attackers), np.int32, count
+        )
+        defense = np.fromiter(
+            (target.fighter.defense for target in self.targets), np.int32, count
+        )
+        damage = np.maximum(power - defense, 0)
+
+        # Índice de cada objetivo, en el orden en que fue atacado por primera vez.
+        target_index: Dict[Actor, int] = {}
+        indices = np.fromiter(
+            (
+                target_index.setdefault(target, len(target_index))
+                for target in self.targets
+            ),
+            np.intp,
+            count,
+        )
+        totals = np.bincount(indices, weights=damage, minlength=len(target_index))
+
+        # Golpes agrupados por objetivo y nombre del atacante: (cantidad, daño).
+        groups: Dict[Tuple[int, str], List[int]] = {}
+        players: Dict[Tuple[int, str], bool] = {}
+        for attacker, index, hit in zip(
+            self.attackers, indices.tolist(), damage.tolist()
+        ):
+            key = (index, attacker.name)
+            group = groups.setdefault(key, [0, 0])
+            group[0] += 1
+            group[1] += hit
+            players[key] = attacker is engine.player
+
+        targets = list(target_index)
+        for (index, name), (hits, total) in groups.items():
+            self._log(engine, name, targets[index], hits, total, players[index, name])
+
+        for target, total in zip(targets, totals.astype(int).tolist()):
+            if total > 0:
+                target.fighter.hp -= total
+
+        self.attackers.clear()
+        self.targets.clear()
+
+    @staticmethod
+    def _log(
+        engine: Engine,
+        name: str,
+        target: Actor,
+        hits: int,
+        damage: int,
+        by_player: bool,
+    ) -> None:
+        attack_color = color.player_atk if by_player else color.enemy_atk
+        log = engine.message_log
+
+        if hits == 1:
+            if damage > 0:
+                log.add_event("melee_hit", name, target.name, damage, fg=attack_color)
+            else:
+                log.add_event("melee_miss", name, target.name, fg=attack_color)
+        elif damage > 0:
+            log.add_event(
+                "melee_group_hit", hits, name, target.name, damage, fg=attack_color
+            )
+        else:
+            log.add_event("melee_group_miss", hits, name, target.name, fg=attack_color)
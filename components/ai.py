@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-from typing import List, Tuple, TYPE_CHECKING
+from typing import List, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np
-import tcod
 
 from actions import Action, MeleeAction, MovementAction, WaitAction
 from components.base_component import BaseComponent
+import regions
 
 if TYPE_CHECKING:
     from entity import Actor
@@ -19,32 +19,60 @@ class BaseAI(Action):
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """Compute and return a path to the target position.
 
+        On large maps with a region graph, the fine search only runs inside the start
+        and end regions and the rest of the route follows the graph's portals, using
+        cached legs unless an entity blocks them. If that fails the whole map is
+        searched.
+
         If there is no valid path then returns an empty list.
         """
-        # Copia la matriz caminable
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
-
-        for entity in self.entity.gamemap.entities:
-            # Comprueba que una entidad bloquea el movimiento y el coste no sea cero
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                cost[entity.x, entity.y] += 10
-
-        graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
-        pathfinder = tcod.path.Pathfinder(graph)
-
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position.
-
-        # Calcula la ruta al destino y elimina el punto de inicio.
-        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+        gamemap = self.entity.gamemap
+        start = (self.entity.x, self.entity.y)
+        dest = (dest_x, dest_y)
+
+        if (
+            gamemap.regions is not None
+            and gamemap.width * gamemap.height >= regions.MIN_MAP_AREA
+        ):
+            path = gamemap.regions.find_path(
+                start, dest, self._search_area, gamemap.blockers
+            )
+            if path is not None:
+                return path
+
+        return self._search_area(
+            slice(0, gamemap.width), slice(0, gamemap.height), None, start, dest
+        )
+
+    def _search_area(
+        self,
+        area_x: slice,
+        area_y: slice,
+        mask: Optional[np.ndarray],
+        start: Tuple[int, int],
+        dest: Tuple[int, int],
+    ) -> List[Tuple[int, int]]:
+        """Busca un camino dentro de la caja `area_x`, `area_y` del mapa.
+
+        Si se pasa `mask`, solo se puede caminar por los Tiles marcados en ella.
+        """
+        # El costo ya incluye las entidades que bloquean el camino.
+        cost = self.entity.gamemap.cost[area_x, area_y]
+        if mask is not None:
+            cost = cost * mask
 
-        # Convierte List[List[int]] en List[Tuple[int, int]].
-        return [(index[0], index[1]) for index in path]
+        return regions.search_area(area_x, area_y, cost, start, dest)
 
 class HostileEnemy(BaseAI):
     def __init__(self, entity: Actor):
         super().__init__(entity)
         self.path: List[Tuple[int, int]] = []
 
+        # Acciones que se reusan en cada turno en lugar de crear una por turno.
+        self._melee = MeleeAction(entity, 0, 0)
+        self._movement = MovementAction(entity, 0, 0)
+        self._wait = WaitAction(entity)
+
     def perform(self) -> None:
         target = self.engine.player
         dx = target.x - self.entity.x
@@ -53,14 +81,16 @@ class HostileEnemy(BaseAI):
 
         if self.engine.game_map.visible[self.entity.x, self.entity.y]:
             if distance <= 1:
-                return MeleeAction(self.entity, dx, dy).perform()
+                return self._melee.retarget(dx, dy).perform()
 
             self.path = self.get_path_to(target.x, target.y)
+            self.entity.state_changed()
 
         if self.path:
             dest_x, dest_y = self.path.pop(0)
-            return MovementAction(
-                self.entity, dest_x - self.entity.x, dest_y - self.entity.y,
+            self.entity.state_changed()
+            return self._movement.retarget(
+                dest_x - self.entity.x, dest_y - self.entity.y,
             ).perform()
 
-        return WaitAction(self.entity).perform()
\ No newline at end of file
+        return self._wait.perform()
\ No newline at end of file
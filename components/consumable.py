@@ -31,7 +31,7 @@ class Consumable(BaseComponent):
         entity = self.parent
         inventory = entity.parent
         if isinstance(inventory, components.inventory.Inventory):
-            inventory.items.remove(entity)
+            inventory.remove(entity)
 
 
 class HealingConsumable(Consumable):
@@ -43,9 +43,8 @@ class HealingConsumable(Consumable):
         amount_recovered = consumer.fighter.heal(self.amount)
 
         if amount_recovered > 0:
-            self.engine.message_log.add_message(
-                f"You consume the {self.parent.name}, and recover {amount_recovered} HP!",
-                color.health_recovered,
+            self.engine.message_log.add_event(
+                "heal", self.parent.name, amount_recovered, fg=color.health_recovered
             )
             self.consume()
         else:
@@ -14,11 +14,17 @@ if TYPE_CHECKING:
 class Fighter(BaseComponent):
     parent: Actor
 
-    def __init__(self, hp: int, defense: int, power: int):
+    def __init__(self, hp: int, defense: int, power: int, regen_turns: int = 0):
         self.max_hp = hp
         self._hp = hp
         self.defense = defense
         self.power = power
+        # Cada cuántos turnos se recupera 1 HP. Con 0 no se regenera.
+        self.regen_turns = regen_turns
+        self._regen_counter = 0
+        # Daño recibido en total. Sirve para saber si hubo un golpe aunque la
+        # regeneración del mismo turno haya dejado los HP igual.
+        self.damage_taken = 0
 
     @property
     def hp(self) -> int:
@@ -26,18 +32,41 @@ class Fighter(BaseComponent):
 
     @hp.setter
     def hp(self, value: int) -> None:
-        self._hp = max(0, min(value, self.max_hp))
+        value = max(0, min(value, self.max_hp))
+        if value < self._hp:
+            self.damage_taken += self._hp - value
+        self._hp = value
+        self.parent.state_changed()
         if self._hp == 0 and self.parent.ai:
             self.die()
 
+    @property
+    def regen_counter(self) -> int:
+        """Turnos acumulados hacia el próximo HP regenerado."""
+        return self._regen_counter
+
+    def restore(
+        self, hp: int, max_hp: int, defense: int, power: int, regen_counter: int
+    ) -> None:
+        """
+        Vuelve a valores guardados, por ejemplo al deshacer un turno.
+
+        A diferencia del setter de `hp`, no mata al actor ni cuenta daño recibido.
+        """
+        self.max_hp = max_hp
+        self._hp = hp
+        self.defense = defense
+        self.power = power
+        self._regen_counter = regen_counter
+
     def die(self) -> None:
         if self.engine.player is self.parent:
-            death_message = "Estás muerto!"
-            death_message_color = color.player_die
+            self.engine.message_log.add_event("player_death", fg=color.player_die)
             self.engine.event_handler = GameOverEventHandler(self.engine)
         else:
-            death_message = f"{self.parent.name} está muerto!"
-            death_message_color = color.enemy_die
+            self.engine.message_log.add_event(
+                "enemy_death", self.parent.name, fg=color.enemy_die
+            )
 
         self.parent.char = "%"
         self.parent.color = (191, 0, 0)
@@ -46,7 +75,18 @@ class Fighter(BaseComponent):
         self.parent.name = f"remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE
 
-        self.engine.message_log.add_message(death_message, death_message_color)
+    def regenerate(self) -> None:
+        """Avanza un turno de regeneración. Se llama al final de cada turno."""
+        if not self.regen_turns or self.hp == self.max_hp or not self.parent.is_alive:
+            if self._regen_counter:
+                self._regen_counter = 0
+                self.parent.state_changed()
+            return
+        self._regen_counter += 1
+        self.parent.state_changed()
+        if self._regen_counter >= self.regen_turns:
+            self._regen_counter = 0
+            self.hp += 1
 
     def heal(self, amount: int) -> int:
         if self.hp == self.max_hp:
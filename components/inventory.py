@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import List, TYPE_CHECKING
+import heapq
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING
 
 from components.base_component import BaseComponent
 
@@ -9,17 +10,82 @@ if TYPE_CHECKING:
 
 
 class Inventory(BaseComponent):
+    """
+    Items de un actor, cada uno en un casillero fijo.
+
+    El casillero es la letra con la que se elige el item en los menús, así que no
+    cambia cuando se sacan otros items. Al agregar un item se usa el casillero
+    libre más bajo, y sacar un item no recorre la lista.
+    """
+
     parent: Actor
 
     def __init__(self, capacity: int):
         self.capacity = capacity
-        self.items: List[Item] = []
+        self.slots: List[Optional[Item]] = []
+        self._free_slots: List[int] = []  # Heap de casilleros vacíos en `slots`.
+        self._slot_of: Dict[Item, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    @property
+    def is_full(self) -> bool:
+        return len(self._slot_of) >= self.capacity
+
+    @property
+    def items(self) -> List[Item]:
+        """Los items en orden de casillero."""
+        return [item for item in self.slots if item is not None]
+
+    def slotted(self) -> Iterator[Tuple[int, Item]]:
+        """Devuelve (casillero, item) en orden de casillero."""
+        for slot, item in enumerate(self.slots):
+            if item is not None:
+                yield slot, item
+
+    def get(self, slot: int) -> Optional[Item]:
+        if 0 <= slot < len(self.slots):
+            return self.slots[slot]
+        return None
+
+    def add(self, item: Item) -> int:
+        """Guarda `item` en el casillero libre más bajo y devuelve el casillero."""
+        if self._free_slots:
+            slot = heapq.heappop(self._free_slots)
+            self.slots[slot] = item
+        else:
+            slot = len(self.slots)
+            self.slots.append(item)
+        self._slot_of[item] = slot
+        item.parent = self
+        self.parent.state_changed()
+        return slot
+
+    def restore(self, slots: Sequence[Optional[Item]]) -> None:
+        """Vuelve a dejar los casilleros como en `slots`, por ejemplo al deshacer."""
+        self.slots = list(slots)
+        self._slot_of = {
+            item: slot for slot, item in enumerate(self.slots) if item is not None
+        }
+        # Una lista ordenada ya es un heap válido.
+        self._free_slots = [
+            slot for slot, item in enumerate(self.slots) if item is None
+        ]
+        for item in self._slot_of:
+            item.parent = self
+
+    def remove(self, item: Item) -> None:
+        slot = self._slot_of.pop(item)
+        self.slots[slot] = None
+        heapq.heappush(self._free_slots, slot)
+        self.parent.state_changed()
 
     def drop(self, item: Item) -> None:
         """
         Elimina un elemento del inventario y lo restaura al mapa del juego, en la ubicación actual del jugador.
         """
-        self.items.remove(item)
+        self.remove(item)
         item.place(self.parent.x, self.parent.y, self.gamemap)
 
-        self.engine.message_log.add_message(f"Soltaste {item.name}.")
\ No newline at end of file
+        self.engine.message_log.add_event("drop", item.name)
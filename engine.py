@@ -1,57 +1,156 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import Callable, Optional, TYPE_CHECKING
 
 from tcod.console import Console
 from tcod.map import compute_fov
 
+from actions import WaitAction
+from combat import MeleeBatch
+import color
 import exceptions
 from input_handlers import MainGameEventHandler
 from message_log import MessageLog
-from render_functions import render_bar, render_names_at_mouse_location
+from panels import HealthBarPanel, MessageLogPanel
+from render_functions import (
+    render_dungeon_level,
+    render_names_at_mouse_location,
+)
+from snapshots import UndoHistory
 
 
 if TYPE_CHECKING:
+    from actions import Action
     from entity import Actor
     from game_map import GameMap
+    from game_world import GameWorld
     from input_handlers import EventHandler
 
+# Comandos del jugador que se pueden deshacer con BACKSPACE.
+UNDO_TURNS = 20
+
 
 class Engine:
     game_map: GameMap
+    game_world: GameWorld
 
     def __init__(self, player: Actor):
+        self.player = player
         self.event_handler: EventHandler = MainGameEventHandler(self)
         self.message_log = MessageLog()
         self.mouse_location = (0, 0)
-        self.player = player
+        # Mientras no es None, los ataques cuerpo a cuerpo se juntan acá y se
+        # resuelven todos juntos al terminar el turno de los enemigos.
+        self.melee_batch: Optional[MeleeBatch] = None
+        self._melee_batch = MeleeBatch()
+        self._rest = WaitAction(player)
+        self.undo_history = UndoHistory(UNDO_TURNS)
+        # Se redibujan solo cuando cambian los mensajes o la vida del jugador.
+        self.message_panel = MessageLogPanel(self, width=40, height=5)
+        self.health_panel = HealthBarPanel(self, width=20)
 
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
-            if entity.ai:
-                try:
-                    entity.ai.perform()
-                except exceptions.Impossible:
-                    pass
+        self.melee_batch = self._melee_batch
+        try:
+            # Se copia porque un monstruo puede morir o cambiar de mapa en su turno.
+            for entity in tuple(self.game_map.monsters):
+                if entity.ai:
+                    try:
+                        entity.ai.perform()
+                    except exceptions.Impossible:
+                        pass
+        finally:
+            batch, self.melee_batch = self.melee_batch, None
+            batch.resolve(self)
+
+    def hostiles_in_view(self) -> bool:
+        visible = self.game_map.visible
+        return any(visible[actor.x, actor.y] for actor in self.game_map.monsters)
+
+    def fast_forward(
+        self, next_action: Callable[[], Optional[Action]], max_turns: int = 1_000
+    ) -> int:
+        """
+        Juega turnos seguidos sin dibujar, pidiendo cada acción a `next_action`.
+
+        Se detiene cuando `next_action` devuelve None, la acción no se puede
+        realizar, aparece un enemigo a la vista o se agrega un mensaje al historial.
+        Devuelve la cantidad de turnos jugados.
+        """
+        messages = self.message_log.total
+        turns = 0
+        while turns < max_turns:
+            action = next_action()
+            if action is None:
+                break
+            try:
+                action.perform()
+            except exceptions.Impossible as exc:
+                self.message_log.add_message(exc.args[0], color.impossible)
+                break
+
+            self.end_turn()
+            turns += 1
+
+            if self.message_log.total != messages or self.hostiles_in_view():
+                break
+        return turns
+
+    def rest(self, max_turns: int, until_healed: bool = False) -> int:
+        """
+        Espera hasta `max_turns` turnos seguidos sin dibujar, o hasta curarse del todo.
+
+        Además de los cortes de `fast_forward`, se detiene si el jugador recibe daño.
+        Devuelve la cantidad de turnos que esperó.
+        """
+        fighter = self.player.fighter
+        damage_taken = fighter.damage_taken
+
+        def next_action() -> Optional[Action]:
+            if fighter.damage_taken != damage_taken:
+                return None
+            if until_healed and fighter.hp >= fighter.max_hp:
+                return None
+            return self._rest
+
+        return self.fast_forward(next_action, max_turns)
+
+    def end_turn(self) -> None:
+        """
+        Termina el turno del jugador.
+
+        Juegan los enemigos, el jugador regenera vida y se actualiza el FOV.
+        """
+        self.handle_enemy_turns()
+        self.player.fighter.regenerate()
+        self.update_fov()
 
     def update_fov(self) -> None:
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8,
-        )
+        # El FOV solo depende de la posición del jugador y de los Tiles del mapa.
+        origin = (self.player.x, self.player.y)
+        if self.game_map.fov_origin == origin:
+            return
+        self.game_map.fov_origin = origin
+
         # Sí un Tile es "visible" entonces se debe agregar a "explored".
-        self.game_map.explored |= self.game_map.visible
+        self.game_map.update_fov(
+            compute_fov(
+                self.game_map.tiles["transparent"],
+                (self.player.x, self.player.y),
+                radius=8,
+            )
+        )
 
     def render(self, console: Console) -> None:
         self.game_map.render(console)
 
-        self.message_log.render(console=console, x=21, y=45, width=40, height=5)
+        self.message_panel.render(console, x=21, y=45)
+
+        self.health_panel.render(console, x=0, y=45)
 
-        render_bar(
+        render_dungeon_level(
             console=console,
-            current_value=self.player.fighter.hp,
-            maximum_value=self.player.fighter.max_hp,
-            total_width=20,
+            dungeon_level=self.game_world.current_floor,
+            location=(0, 47),
         )
 
         render_names_at_mouse_location(console=console, x=21, y=44, engine=self)
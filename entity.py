@@ -11,6 +11,7 @@ if TYPE_CHECKING:
     from components.fighter import Fighter
     from components.inventory import Inventory
     from game_map import GameMap
+    from lighting import Light
 
 T = TypeVar("T", bound="Entity")
 
@@ -29,6 +30,7 @@ class Entity:
         name: str = "<Unnamed>",
         blocks_movement: bool = False,
         render_order: RenderOrder = RenderOrder.CORPSE,
+        light: Optional[Light] = None,
     ):
         self.x = x
         self.y = y
@@ -37,36 +39,147 @@ class Entity:
         self.name = name
         self.blocks_movement = blocks_movement
         self.render_order = render_order
+        self.light = light
         if parent:
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
 
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @name.setter
+    def name(self, value: str) -> None:
+        self._name = value
+        gamemap = self._on_gamemap()
+        if gamemap:
+            gamemap.entity_renamed(self)
+
+    @property
+    def blocks_movement(self) -> bool:
+        return self._blocks_movement
+
+    @blocks_movement.setter
+    def blocks_movement(self, value: bool) -> None:
+        changed = value != getattr(self, "_blocks_movement", value)
+        self._blocks_movement = value
+        gamemap = self._on_gamemap()
+        if changed and gamemap:
+            gamemap.entity_blocking_changed(self)
+
+    @property
+    def char(self) -> str:
+        return self._char
+
+    @char.setter
+    def char(self, value: str) -> None:
+        self._char = value
+        self._glyph_changed()
+
+    @property
+    def color(self) -> Tuple[int, int, int]:
+        return self._color
+
+    @color.setter
+    def color(self, value: Tuple[int, int, int]) -> None:
+        self._color = value
+        self._glyph_changed()
+
+    @property
+    def render_order(self) -> RenderOrder:
+        return self._render_order
+
+    @render_order.setter
+    def render_order(self, value: RenderOrder) -> None:
+        self._render_order = value
+        self._glyph_changed()
+
+    def _glyph_changed(self) -> None:
+        gamemap = self._on_gamemap()
+        if gamemap:
+            gamemap.entity_glyph_changed(self)
+
+    def state_changed(self) -> None:
+        """
+        Avisa al GameMap que cambió un estado sin setter propio, como la vida, el
+        inventario o el camino de la IA, para que lo guarde el próximo snapshot.
+        """
+        gamemap = self._on_gamemap()
+        if gamemap:
+            gamemap.entity_changed(self)
+
+    def _on_gamemap(self) -> Optional[GameMap]:
+        """
+        Devuelve el GameMap donde esta la entidad, o None (por ejemplo si esta en
+        un inventario).
+        """
+        parent = getattr(self, "parent", None)
+        if parent is not None and parent.gamemap is parent:
+            return parent
+        return None
+
+    def restore(
+        self,
+        parent: Union[GameMap, Inventory],
+        x: int,
+        y: int,
+        char: str,
+        color: Tuple[int, int, int],
+        name: str,
+        blocks_movement: bool,
+        render_order: RenderOrder,
+        light: Optional[Light],
+    ) -> None:
+        """
+        Vuelve la entidad a un estado guardado, por ejemplo al deshacer un turno.
+
+        No avisa al GameMap como los setters: la entidad tiene que estar fuera del
+        mapa, que rearma sus índices cuando se la vuelve a agregar con `add_entity`.
+        """
+        assert self not in getattr(parent, "entities", ()), "Sacar antes del mapa"
+        self.parent = parent
+        self.x, self.y = x, y
+        self._char = char
+        self._color = color
+        self._name = name
+        self._blocks_movement = blocks_movement
+        self._render_order = render_order
+        self.light = light
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
         """Spawn una copia de la instancia, en la ubicación dada"""
         clone = copy.deepcopy(self)
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
 
     def move(self, dx: int, dy: int) -> None:
         self.x += dx
         self.y += dy
+        gamemap = self._on_gamemap()
+        if gamemap:
+            gamemap.entity_moved(self, self.x - dx, self.y - dy)
 
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
         """Coloca la entidad en una nueva ubicación.  Maneja el movimiento de la entidad a través de los GameMaps"""
+        old_gamemap = self._on_gamemap()
+        if gamemap and old_gamemap:
+            old_gamemap.remove_entity(self)
+
+        old_x, old_y = self.x, self.y
         self.x = x
         self.y = y
         if gamemap:
-            if hasattr(self, "parent"):
-                if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
             self.parent = gamemap
+            gamemap.add_entity(self)
+        elif old_gamemap:
+            old_gamemap.entity_moved(self, old_x, old_y)
 
 class Actor(Entity):
     def __init__(
@@ -80,6 +193,7 @@ class Actor(Entity):
         ai_cls: Type[BaseAI],
         fighter: Fighter,
         inventory: Inventory,
+        light: Optional[Light] = None,
     ):
         super().__init__(
             x=x,
@@ -89,9 +203,10 @@ class Actor(Entity):
             name=name,
             blocks_movement=True,
             render_order=RenderOrder.ACTOR,
+            light=light,
         )
 
-        self.ai: Optional[BaseAI] = ai_cls(self)
+        self.ai = ai_cls(self)
 
         self.fighter = fighter
         self.fighter.parent = self
@@ -99,10 +214,26 @@ class Actor(Entity):
         self.inventory = inventory
         self.inventory.parent = self
 
+    @property
+    def ai(self) -> Optional[BaseAI]:
+        return self._ai
+
+    @ai.setter
+    def ai(self, value: Optional[BaseAI]) -> None:
+        was_alive = bool(getattr(self, "_ai", None))
+        self._ai = value
+        gamemap = self._on_gamemap()
+        if gamemap and was_alive != bool(value):
+            gamemap.actor_life_changed(self)
+
+    def restore_ai(self, ai: Optional[BaseAI]) -> None:
+        """Vuelve a una IA guardada sin avisar al GameMap, ver `Entity.restore`."""
+        self._ai = ai
+
     @property
     def is_alive(self) -> bool:
         """Retorna verdadero si el actor puede realizar acciones"""
-        return bool(self.ai)
+        return bool(self._ai)
     
 class Item(Entity):
     def __init__(
@@ -114,6 +245,7 @@ class Item(Entity):
         color: Tuple[int, int, int] = (255, 255, 255),
         name: str = "<Unnamed>",
         consumable: Consumable,
+        light: Optional[Light] = None,
     ):
         super().__init__(
             x=x,
@@ -123,6 +255,7 @@ class Item(Entity):
             name=name,
             blocks_movement=False,
             render_order=RenderOrder.ITEM,
+            light=light,
         )
 
         self.consumable = consumable
@@ -3,13 +3,14 @@ from components.consumable import HealingConsumable
 from components.fighter import Fighter
 from components.inventory import Inventory
 from entity import Actor, Item
+from lighting import Light
 
 player = Actor(
     char="@",
     color=(255, 255, 255),
     name="Player",
     ai_cls=HostileEnemy,
-    fighter=Fighter(hp=30, defense=2, power=5),
+    fighter=Fighter(hp=30, defense=2, power=5, regen_turns=5),
     inventory=Inventory(capacity=26),
 )
 
@@ -29,6 +30,7 @@ troll = Actor(
     ai_cls=HostileEnemy,
     fighter=Fighter(hp=16, defense=1, power=4),
     inventory=Inventory(capacity=0),
+    light=Light(radius=2, color=(40, 110, 40), intensity=0.6),
 )
 
 health_potion = Item(
@@ -36,4 +38,5 @@ health_potion = Item(
     color=(127, 0, 255),
     name="Health Potion",
     consumable=HealingConsumable(amount=4),
+    light=Light(radius=1, color=(110, 0, 220), intensity=0.5),
 )
\ No newline at end of file
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import time
+import traceback
+from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+
+import tcod
+
+import color
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from recording import FrameRecorder
+
+
+class FrameStats:
+    """Tiempos del loop principal, para saber cuanto cuesta cada frame."""
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.render_time = 0.0
+        self.max_render_time = 0.0
+        self.events = 0
+        self.coalesced_motion = 0
+        self.skipped_motion = 0
+        self.start_time = time.perf_counter()
+
+    def add_frame(self, render_time: float) -> None:
+        self.frames += 1
+        self.render_time += render_time
+        self.max_render_time = max(self.max_render_time, render_time)
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.start_time
+        average = self.render_time / self.frames if self.frames else 0.0
+        return (
+            f"{self.frames} frames en {elapsed:.1f}s "
+            f"({self.frames / elapsed if elapsed else 0.0:.1f} fps), "
+            f"render promedio {average * 1000:.2f}ms, "
+            f"maximo {self.max_render_time * 1000:.2f}ms, "
+            f"{self.events} eventos, "
+            f"{self.coalesced_motion} MouseMotion combinados, "
+            f"{self.skipped_motion} MouseMotion sin cambios"
+        )
+
+
+def coalesce_events(
+    events: Iterable[tcod.event.Event], stats: Optional[FrameStats] = None
+) -> Iterator[tcod.event.Event]:
+    """Combina cada rafaga seguida de MouseMotion en el ultimo de ellos.
+
+    El resto de los eventos se devuelven en el mismo orden en el que llegaron.
+    """
+    pending_motion: Optional[tcod.event.MouseMotion] = None
+    for event in events:
+        if isinstance(event, tcod.event.MouseMotion):
+            if pending_motion is not None and stats:
+                stats.coalesced_motion += 1
+            pending_motion = event
+            continue
+        if pending_motion is not None:
+            yield pending_motion
+            pending_motion = None
+        yield event
+    if pending_motion is not None:
+        yield pending_motion
+
+
+def handle_event(
+    context: tcod.context.Context,
+    engine: Engine,
+    event: tcod.event.Event,
+    stats: Optional[FrameStats] = None,
+) -> bool:
+    """Procesa un evento y devuelve True si hay que volver a dibujar la pantalla."""
+    context.convert_event(event)
+    return dispatch_event(engine, event, stats)
+
+
+def dispatch_event(
+    engine: Engine, event: tcod.event.Event, stats: Optional[FrameStats] = None
+) -> bool:
+    """Igual que `handle_event`, para eventos que ya pasaron por `convert_event`."""
+    previous_location = engine.mouse_location
+    if isinstance(event, tcod.event.MouseMotion):
+        # Un movimiento dentro del mismo Tile no cambia nada de lo que se muestra.
+        if event.tile is None or tuple(event.tile) == previous_location:
+            if stats:
+                stats.skipped_motion += 1
+            return False
+
+    try:
+        engine.event_handler.handle_events(event)
+    except Exception:
+        traceback.print_exc()
+        engine.message_log.add_message(traceback.format_exc(), color.error)
+        return True
+
+    if isinstance(event, tcod.event.MouseMotion):
+        return engine.mouse_location != previous_location
+    return True
+
+
+def run(
+    context: tcod.context.Context,
+    console: tcod.console.Console,
+    engine: Engine,
+    max_fps: int = 0,
+    stats: Optional[FrameStats] = None,
+    recorder: Optional[FrameRecorder] = None,
+) -> None:
+    """
+    Loop principal manejado por eventos.
+
+    Solo redibuja cuando algun evento cambio el estado o el Tile del mouse, y nunca
+    mas de `max_fps` veces por segundo (0 es sin limite). Mientras no hay nada que
+    dibujar se bloquea en `tcod.event.wait`, asi que sin entrada no usa CPU.
+    Si hay `recorder`, guarda cada frame dibujado.
+    """
+    frame_time = 1 / max_fps if max_fps > 0 else 0.0
+    next_frame = 0.0
+    needs_render = True
+
+    while True:
+        timeout: Optional[float] = None
+        if needs_render:
+            now = time.perf_counter()
+            if now >= next_frame:
+                console.clear()
+                engine.event_handler.on_render(console=console)
+                if recorder:
+                    recorder.record(console.rgb)
+                context.present(console)
+                if stats:
+                    stats.add_frame(time.perf_counter() - now)
+                next_frame = now + frame_time
+                needs_render = False
+            else:
+                # Sigue procesando entrada hasta que toque el siguiente frame.
+                timeout = next_frame - now
+
+        for event in coalesce_events(tcod.event.wait(timeout), stats):
+            if stats:
+                stats.events += 1
+            if handle_event(context, engine, event, stats):
+                needs_render = True
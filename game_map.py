@@ -1,24 +1,79 @@
 from __future__ import annotations
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
+    KeysView,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+)
 import numpy as np
 from tcod.console import Console
 
 from entity import Actor, Item
+from glyphs import GlyphTable
+from lighting import LightMap
 import tile_types
 
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
+    from procgen import RectangularRoom
+    from regions import RegionGraph
+    from snapshots import ChunkStore, EntityStore
+
+# Lado de los bloques en que los snapshots copian los arrays de Tiles.
+CHUNK_SIZE = 16
+# Arrays de Tiles que guardan los snapshots, ver `snapshots`.
+SNAPSHOT_ARRAYS = ("tiles", "visible", "explored")
 
 
 class GameMap:
     def __init__(
-        self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()
+        self,
+        engine: Engine,
+        width: int,
+        height: int,
+        entities: Iterable[Entity] = (),
+        tiles: Optional[np.ndarray] = None,
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
-        self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
+        self.entities: Set[Entity] = set()
+        # Un generador puede pasar los Tiles ya armados, en orden "F". Llenar un
+        # mapa enorme de paredes para después pisarlas cuesta casi tanto como
+        # generarlo.
+        if tiles is None:
+            tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
+        self.tiles = tiles
+
+        # Cantidad de entidades que bloquean el movimiento en cada Tile.
+        self.blockers = np.zeros((width, height), dtype=np.int16, order="F")
+        self._cost = np.zeros((width, height), dtype=np.int16, order="F")
+        self._cost_stale = True
+
+        # Texto del mouse de cada Tile, ver `names_at`. Se borra la entrada de un
+        # Tile cuando una entidad entra, sale o cambia de nombre en él.
+        self._names: Dict[Tuple[int, int], str] = {}
+
+        # Items de cada Tile, del primero que se dejó al último. Un dict sirve de
+        # lista ordenada en la que sacar un item no la recorre.
+        self.item_stacks: Dict[Tuple[int, int], Dict[Item, None]] = {}
+
+        # Colecciones de entidades por tipo, en el orden en que entraron al mapa así
+        # las simulaciones recorren siempre en el mismo orden. Se mantienen al
+        # agregar, sacar o matar entidades, ver `actors`, `monsters`, `items`, etc.
+        self._all_actors: Dict[Actor, None] = {}
+        self._living_actors: Dict[Actor, None] = {}
+        self._monsters: Dict[Actor, None] = {}
+        self._corpses: Dict[Actor, None] = {}
+        self._items: Dict[Item, None] = {}
+
+        # Aspecto de cada entidad en arrays, para dibujarlas sin recorrerlas.
+        self.glyphs = GlyphTable()
 
         self.visible = np.full(
             (width, height), fill_value=False, order="F"
@@ -27,25 +82,217 @@ class GameMap:
             (width, height), fill_value=False, order="F"
         )  # Tiles que el jugador vio en el pasado
 
+        # Capa de fondo ya compuesta (light/dark/SHROUD).
+        # Se actualiza solo donde cambia el FOV, ver `update_fov`.
+        self.background = np.full(
+            (width, height), fill_value=tile_types.SHROUD, order="F"
+        )
+        self._background_stale = True
+
+        # Luz de antorchas y entidades, se suma al fondo de los Tiles visibles.
+        self.lights = LightMap(self)
+
+        # Grafo de habitaciones y pasillos, si el generador lo armó.
+        self.regions: Optional[RegionGraph] = None
+
+        # Posición desde la que se calculó `visible`, None si hay que recalcularlo.
+        self.fov_origin: Optional[Tuple[int, int]] = None
+
+        # Bloques de CHUNK_SIZE x CHUNK_SIZE de cada array de SNAPSHOT_ARRAYS escritos
+        # desde el último snapshot. Todo el que escribe esos arrays marca lo que tocó.
+        chunks = (-(-width // CHUNK_SIZE), -(-height // CHUNK_SIZE))
+        self.dirty_chunks: Dict[str, np.ndarray] = {
+            name: np.ones(chunks, dtype=bool) for name in SNAPSHOT_ARRAYS
+        }
+        # Copias por bloques de los snapshots de este mapa, se crea con el primero.
+        self.chunk_store: Optional[ChunkStore] = None
+        # Entidades que cambiaron desde el último snapshot, en el orden en que
+        # cambiaron por primera vez. Las marcan los avisos de las entidades.
+        self.dirty_entities: Dict[Entity, None] = {}
+        # Estados de las entidades en el último snapshot, se crea con el primero.
+        self.entity_store: Optional[EntityStore] = None
+
+        self.downstairs_location: Optional[Tuple[int, int]] = None
+        self.upstairs_location: Optional[Tuple[int, int]] = None
+
+        for entity in entities:
+            self.add_entity(entity)
+
     @property
     def gamemap(self) -> GameMap:
         return self
 
     @property
-    def actors(self) -> Iterator[Actor]:
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
-        )
+    def actors(self) -> KeysView[Actor]:
+        """Actores vivos, incluido el jugador."""
+        return self._living_actors.keys()
+
+    @property
+    def all_actors(self) -> KeysView[Actor]:
+        """Actores vivos y muertos."""
+        return self._all_actors.keys()
+
+    @property
+    def monsters(self) -> KeysView[Actor]:
+        """Actores vivos, sin el jugador."""
+        return self._monsters.keys()
 
     @property
-    def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+    def corpses(self) -> KeysView[Actor]:
+        return self._corpses.keys()
+
+    @property
+    def items(self) -> KeysView[Item]:
+        return self._items.keys()
+
+    @property
+    def cost(self) -> np.ndarray:
+        """
+        Costo de pasar por cada Tile, para el pathfinding y el movimiento.
+
+        0 si no es caminable, 1 si esta libre, y 10 mas por cada entidad que lo
+        bloquea. Se mantiene al dia con cada alta, baja o movimiento de entidades,
+        asi que se puede usar directamente sin copiarlo.
+        """
+        if self._cost_stale:
+            self._cost[:] = self.tiles["walkable"] * (1 + 10 * self.blockers)
+            self._cost_stale = False
+        return self._cost
+
+    def add_entity(self, entity: Entity) -> None:
+        """Agrega `entity` al mapa, en su posicion actual."""
+        if entity in self.entities:
+            return
+        self.entities.add(entity)
+        self.dirty_entities[entity] = None
+        self._names.pop((entity.x, entity.y), None)
+        if isinstance(entity, Item):
+            self._items[entity] = None
+            self._stack_item(entity, entity.x, entity.y)
+        elif isinstance(entity, Actor):
+            self._all_actors[entity] = None
+            self._index_actor(entity)
+        self.glyphs.add(entity)
+        if entity.light is not None:
+            self.lights.attach(entity)
+        if entity.blocks_movement:
+            self._add_blocker(entity.x, entity.y, 1)
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Saca `entity` del mapa."""
+        self.entities.remove(entity)
+        self.dirty_entities[entity] = None
+        self._names.pop((entity.x, entity.y), None)
+        if isinstance(entity, Item):
+            del self._items[entity]
+            self._unstack_item(entity, entity.x, entity.y)
+        elif isinstance(entity, Actor):
+            del self._all_actors[entity]
+            self._unindex_actor(entity)
+        self.glyphs.remove(entity)
+        if entity.light is not None:
+            self.lights.detach(entity)
+        if entity.blocks_movement:
+            self._add_blocker(entity.x, entity.y, -1)
+
+    def entity_moved(self, entity: Entity, old_x: int, old_y: int) -> None:
+        """Avisa que `entity` se movio desde (old_x, old_y) a su posicion actual."""
+        self.dirty_entities[entity] = None
+        self._names.pop((old_x, old_y), None)
+        self._names.pop((entity.x, entity.y), None)
+        if isinstance(entity, Item):
+            self._unstack_item(entity, old_x, old_y)
+            self._stack_item(entity, entity.x, entity.y)
+        self.glyphs.moved(entity)
+        if entity.light is not None:
+            self.lights.entity_moved(entity)
+        if entity.blocks_movement:
+            self._add_blocker(old_x, old_y, -1)
+            self._add_blocker(entity.x, entity.y, 1)
+
+    def actor_life_changed(self, actor: Actor) -> None:
+        """Avisa que `actor` murió o volvió a tener una IA."""
+        self.dirty_entities[actor] = None
+        self._unindex_actor(actor)
+        self._index_actor(actor)
+
+    def reindex_actors(self) -> None:
+        """
+        Rearma los índices de vivos, monstruos y cadáveres en el orden del mapa.
+
+        Los snapshots lo usan al revivir actores, así los turnos enemigos vuelven al
+        orden que tenían antes de la muerte.
+        """
+        self._living_actors.clear()
+        self._monsters.clear()
+        self._corpses.clear()
+        for actor in self._all_actors:
+            self._index_actor(actor)
+
+    def _index_actor(self, actor: Actor) -> None:
+        if not actor.is_alive:
+            self._corpses[actor] = None
+            return
+        self._living_actors[actor] = None
+        if actor is not self.engine.player:
+            self._monsters[actor] = None
+
+    def _unindex_actor(self, actor: Actor) -> None:
+        self._living_actors.pop(actor, None)
+        self._monsters.pop(actor, None)
+        self._corpses.pop(actor, None)
+
+    def entity_glyph_changed(self, entity: Entity) -> None:
+        """Avisa que cambio `entity.char`, `entity.color` o `entity.render_order`."""
+        self.dirty_entities[entity] = None
+        self.glyphs.changed(entity)
+
+    def entity_renamed(self, entity: Entity) -> None:
+        """Avisa que cambio `entity.name`."""
+        self.dirty_entities[entity] = None
+        self._names.pop((entity.x, entity.y), None)
+
+    def entity_blocking_changed(self, entity: Entity) -> None:
+        """Avisa que cambio `entity.blocks_movement`."""
+        self.dirty_entities[entity] = None
+        self._add_blocker(entity.x, entity.y, 1 if entity.blocks_movement else -1)
+
+    def entity_changed(self, entity: Entity) -> None:
+        """Avisa que cambió un estado de `entity` que el mapa no indexa (vida, IA)."""
+        self.dirty_entities[entity] = None
+
+    def _stack_item(self, item: Item, x: int, y: int) -> None:
+        self.item_stacks.setdefault((x, y), {})[item] = None
+
+    def _unstack_item(self, item: Item, x: int, y: int) -> None:
+        stack = self.item_stacks[x, y]
+        del stack[item]
+        if not stack:
+            del self.item_stacks[x, y]
+
+    def items_at(self, x: int, y: int) -> List[Item]:
+        """Items en (x, y), del primero que se dejó al último."""
+        return list(self.item_stacks.get((x, y), ()))
+
+    def top_item_at(self, x: int, y: int) -> Optional[Item]:
+        """El último item que se dejó en (x, y), o None si no hay ninguno."""
+        stack = self.item_stacks.get((x, y))
+        return next(reversed(stack)) if stack else None
+
+    def _add_blocker(self, x: int, y: int, amount: int) -> None:
+        self.blockers[x, y] += amount
+        if not self._cost_stale and self._cost[x, y]:
+            self._cost[x, y] += 10 * amount
 
     def get_blocking_entity_at_location(
         self, location_x: int, location_y: int
     ) -> Optional[Entity]:
+        if (
+            not self.in_bounds(location_x, location_y)
+            or not self.blockers[location_x, location_y]
+        ):
+            return None
+
         for entity in self.entities:
             if (
                 entity.blocks_movement
@@ -57,15 +304,118 @@ class GameMap:
         return None
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
+        if not self.in_bounds(x, y) or not self.blockers[x, y]:
+            # Los actores vivos siempre bloquean el paso.
+            return None
         for actor in self.actors:
             if actor.x == x and actor.y == y:
                 return actor
 
         return None
 
+    def names_at(self, x: int, y: int) -> str:
+        """Devuelve los nombres de las entidades en (x, y), como los muestra el mouse.
+
+        El texto queda guardado hasta que cambie algo en ese Tile, así que dejar el
+        mouse quieto no vuelve a recorrer las entidades en cada frame.
+        """
+        names = self._names.get((x, y))
+        if names is None:
+            names = ", ".join(
+                entity.name
+                for entity in self.entities
+                if entity.x == x and entity.y == y
+            ).capitalize()
+            self._names[x, y] = names
+        return names
+
     def in_bounds(self, x: int, y: int) -> bool:
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def region_at(self, x: int, y: int) -> int:
+        """Id de la habitación o pasillo en (x, y), o -1 si no hay ninguno."""
+        if self.regions is None or not self.in_bounds(x, y):
+            return -1
+        return self.regions.region_at(x, y)
+
+    def room_at(self, x: int, y: int) -> Optional[RectangularRoom]:
+        """Devuelve la habitación que contiene a (x, y), o None si no hay."""
+        region = self.region_at(x, y)
+        if self.regions is None or not 0 <= region < len(self.regions.rooms):
+            return None
+        return self.regions.rooms[region]
+
+    def region_neighbours(self, region: int) -> FrozenSet[int]:
+        """Ids de las regiones pegadas a `region`.
+
+        Devuelve una copia: el grafo de regiones solo se arma al generar el mapa.
+        """
+        if self.regions is None or not 0 <= region < self.regions.region_count:
+            return frozenset()
+        return frozenset(self.regions.neighbours[region])
+
+    def entities_in_region(self, region: int) -> List[Entity]:
+        """Devuelve las entidades que están dentro de `region`."""
+        if self.regions is None or region < 0 or not self.entities:
+            return []
+        entities = list(self.entities)
+        xs = np.fromiter((entity.x for entity in entities), np.intp, len(entities))
+        ys = np.fromiter((entity.y for entity in entities), np.intp, len(entities))
+        inside = self.regions.labels[xs, ys] == region
+        return [entity for entity, keep in zip(entities, inside.tolist()) if keep]
+
+    def refresh_tiles(self) -> None:
+        """Avisa que `tiles` cambió y que hay que recomponer las capas derivadas."""
+        self.dirty_chunks["tiles"][:] = True
+        self._background_stale = True
+        self._cost_stale = True
+        self.fov_origin = None
+        self.lights.invalidate()
+
+    def update_fov(self, visible: np.ndarray) -> None:
+        """
+        Reemplaza el FOV actual por `visible` y agrega esos Tiles a "explored".
+
+        Solo se recomponen en `background` los Tiles cuyo estado visible cambio respecto
+        del FOV anterior. Un Tile solo puede pasar a "explored" al volverse visible,
+        asi que esa diferencia tambien cubre los cambios de "explored".
+        """
+        if self._background_stale:
+            self.dirty_chunks["visible"][:] = True
+            self.dirty_chunks["explored"][:] = True
+            self.visible[:] = visible
+            self.explored |= visible
+            self.background[:] = np.select(
+                condlist=[self.visible, self.explored],
+                choicelist=[self.tiles["light"], self.tiles["dark"]],
+                default=tile_types.SHROUD,
+            )
+            self._background_stale = False
+            return
+
+        changed = np.nonzero(visible != self.visible)
+        chunk_xs, chunk_ys = changed[0] // CHUNK_SIZE, changed[1] // CHUNK_SIZE
+        self.dirty_chunks["visible"][chunk_xs, chunk_ys] = True
+        self.dirty_chunks["explored"][chunk_xs, chunk_ys] = True
+        self.visible[:] = visible
+        self.explored[changed] |= visible[changed]
+        self.background[changed] = np.where(
+            self.visible[changed],
+            self.tiles["light"][changed],
+            self.tiles["dark"][changed],
+        )
+
+    def refresh_background(self, area_x: slice, area_y: slice) -> None:
+        """Recompone `background` en una caja donde cambió `visible` o `explored`."""
+        self.background[area_x, area_y] = np.select(
+            condlist=[self.visible[area_x, area_y], self.explored[area_x, area_y]],
+            choicelist=[
+                self.tiles["light"][area_x, area_y],
+                self.tiles["dark"][area_x, area_y],
+            ],
+            default=tile_types.SHROUD,
+        )
+
     def render(self, console: Console) -> None:
         """
         Dibuja el mapa.
@@ -74,19 +424,25 @@ class GameMap:
         Si no está en "Visible", pero SI esta en "Explored", entonces lo dibuja con los colores de "Dark".
         Si no esta en ningun lado, el predeterminado es "SHROUD""
         """
-        console.rgb[0 : self.width, 0 : self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
-            default=tile_types.SHROUD,
-        )
+        if self._background_stale:
+            self.update_fov(self.visible)
 
-        entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
-        )
+        console.rgb[0 : self.width, 0 : self.height] = self.background
+
+        if self.lights.has_lights:
+            # Suma la luz al fondo de los Tiles visibles.
+            light = self.lights.update()[self.visible]
+            bg = console.rgb["bg"][0 : self.width, 0 : self.height]
+            bg[self.visible] = np.minimum(bg[self.visible] + light, 255)
 
-        for entity in entities_sorted_for_rendering:
-            # Imprime solo las entidades dentro del FOV
-            if self.visible[entity.x, entity.y]:
-                console.print(
-                    x=entity.x, y=entity.y, string=entity.char, fg=entity.color
-                )
+        self.render_entities(console)
+
+    def render_entities(self, console: Console) -> None:
+        """
+        Dibuja todas las entidades visibles de una sola vez.
+
+        Los datos de cada entidad ya estan en `glyphs`, que se mantiene con cada
+        alta, baja, movimiento o cambio de aspecto. Si dos entidades comparten un
+        Tile se ve la de mayor `render_order`, y entre iguales la ultima agregada.
+        """
+        self.glyphs.draw(console, self.visible)
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import collections
+import io
+import pickle
+import random
+import zlib
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from game_map import GameMap
+from lighting import Light
+from procgen import generate_dungeon
+from regions import RegionGraph
+import tile_types
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from entity import Entity
+    from procgen import RectangularRoom
+
+
+class FloorRecord(NamedTuple):
+    """Un piso desalojado de memoria, guardado en forma compacta."""
+
+    width: int
+    height: int
+    tiles: bytes  # Ids de `tile_types.TILE_TYPES`, comprimidos.
+    explored: bytes  # Bits de "explored", comprimidos.
+    entities: bytes  # Entidades serializadas, comprimidas.
+    regions: Optional[bytes]  # Etiquetas de regiones, comprimidas.
+    rooms: Optional[List[RectangularRoom]]
+    upstairs_location: Optional[Tuple[int, int]]
+    downstairs_location: Optional[Tuple[int, int]]
+    static_lights: Tuple[Tuple[int, int, Light], ...] = ()
+
+
+class _EntityPickler(pickle.Pickler):
+    """Serializa entidades reemplazando las referencias a su GameMap."""
+
+    def __init__(self, file: io.BytesIO, gamemap: GameMap):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.gamemap = gamemap
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        if obj is self.gamemap:
+            return "gamemap"
+        return None
+
+
+class _EntityUnpickler(pickle.Unpickler):
+    def __init__(self, file: io.BytesIO, gamemap: GameMap):
+        super().__init__(file)
+        self.gamemap = gamemap
+
+    def persistent_load(self, pid: Any) -> GameMap:
+        if pid == "gamemap":
+            return self.gamemap
+        raise pickle.UnpicklingError(f"Referencia desconocida {pid!r}")
+
+
+def pack_floor(gamemap: GameMap, exclude: Any = None) -> FloorRecord:
+    """Guarda `gamemap` en un `FloorRecord`, sin incluir a la entidad `exclude`."""
+    # Se guardan en el orden en que entraron al mapa y no en el de `entities`, que
+    # es un set: al restaurar el piso los monstruos juegan en el mismo orden.
+    entities: List[Entity] = [*gamemap.all_actors, *gamemap.items]
+    if len(entities) != len(gamemap.entities):
+        entities.extend(gamemap.entities.difference(entities))
+    buffer = io.BytesIO()
+    _EntityPickler(buffer, gamemap).dump(
+        [entity for entity in entities if entity is not exclude]
+    )
+
+    regions = rooms = None
+    if gamemap.regions is not None:
+        regions = zlib.compress(gamemap.regions.labels.tobytes(order="F"))
+        rooms = gamemap.regions.rooms
+
+    return FloorRecord(
+        width=gamemap.width,
+        height=gamemap.height,
+        tiles=zlib.compress(tile_types.to_ids(gamemap.tiles).tobytes(order="F")),
+        explored=zlib.compress(np.packbits(gamemap.explored.ravel(order="F"))),
+        entities=zlib.compress(buffer.getvalue()),
+        regions=regions,
+        rooms=rooms,
+        upstairs_location=gamemap.upstairs_location,
+        downstairs_location=gamemap.downstairs_location,
+        static_lights=tuple(gamemap.lights.static_lights),
+    )
+
+
+def unpack_floor(record: FloorRecord, engine: Engine) -> GameMap:
+    """Reconstruye el GameMap guardado en `record`."""
+    shape = (record.width, record.height)
+    size = record.width * record.height
+    gamemap = GameMap(engine, record.width, record.height)
+
+    tile_ids = np.frombuffer(zlib.decompress(record.tiles), dtype=np.uint8)
+    gamemap.tiles[:] = tile_types.from_ids(tile_ids.reshape(shape, order="F"))
+    explored = np.unpackbits(
+        np.frombuffer(zlib.decompress(record.explored), dtype=np.uint8), count=size
+    )
+    gamemap.explored[:] = explored.reshape(shape, order="F").astype(bool)
+
+    if record.regions is not None and record.rooms is not None:
+        labels = np.frombuffer(zlib.decompress(record.regions), dtype=np.int32)
+        gamemap.regions = RegionGraph(
+            labels.reshape(shape, order="F").copy(order="F"), record.rooms
+        )
+
+    gamemap.upstairs_location = record.upstairs_location
+    gamemap.downstairs_location = record.downstairs_location
+    for x, y, light in record.static_lights:
+        gamemap.lights.add_static(x, y, light)
+
+    buffer = io.BytesIO(zlib.decompress(record.entities))
+    for entity in _EntityUnpickler(buffer, gamemap).load():
+        gamemap.add_entity(entity)
+    gamemap.refresh_tiles()
+    return gamemap
+
+
+class GameWorld:
+    """
+    Guarda la configuración de generación y los pisos ya visitados.
+
+    Los últimos `max_live_floors` pisos usados quedan vivos en memoria. Los más
+    viejos se guardan como `FloorRecord` y se reconstruyen al volver a ellos, así
+    una partida larga no acumula mapas completos ni regenera pisos.
+    """
+
+    def __init__(
+        self,
+        *,
+        engine: Engine,
+        map_width: int,
+        map_height: int,
+        max_rooms: int,
+        room_min_size: int,
+        room_max_size: int,
+        max_monsters_per_room: int,
+        max_items_per_room: int,
+        max_live_floors: int = 3,
+        current_floor: int = 0,
+        generator: Callable[..., GameMap] = generate_dungeon,
+        rng: Optional[random.Random] = None,
+    ):
+        self.engine = engine
+
+        self.map_width = map_width
+        self.map_height = map_height
+
+        self.max_rooms = max_rooms
+        self.room_min_size = room_min_size
+        self.room_max_size = room_max_size
+
+        self.max_monsters_per_room = max_monsters_per_room
+        self.max_items_per_room = max_items_per_room
+
+        # `generate_dungeon`, `generate_caves` o cualquier función con sus argumentos.
+        self.generator = generator
+        # Azar de la generación, propio de esta partida: ver `setup_game.new_game`.
+        self.rng = rng if rng is not None else random.Random()
+
+        self.max_live_floors = max(1, max_live_floors)
+        self.current_floor = current_floor
+
+        # Pisos vivos, del usado hace más tiempo al más reciente.
+        self.live_floors: collections.OrderedDict[int, GameMap] = (
+            collections.OrderedDict()
+        )
+        self.records: Dict[int, FloorRecord] = {}
+
+    def generate_floor(self) -> None:
+        """Genera el piso siguiente al actual y mueve al jugador ahí."""
+        self.current_floor += 1
+
+        self.engine.game_map = self.generator(
+            max_rooms=self.max_rooms,
+            room_min_size=self.room_min_size,
+            room_max_size=self.room_max_size,
+            map_width=self.map_width,
+            map_height=self.map_height,
+            max_monsters_per_room=self.max_monsters_per_room,
+            max_items_per_room=self.max_items_per_room,
+            engine=self.engine,
+            rng=self.rng,
+            upstairs=self.current_floor > 1,
+        )
+        self._keep_live(self.current_floor, self.engine.game_map)
+
+    def descend(self) -> None:
+        """Baja al piso siguiente, generándolo si todavía no existe."""
+        if not self._enter(self.current_floor + 1):
+            self.generate_floor()
+            return
+
+        location = self.engine.game_map.upstairs_location
+        assert location is not None
+        self.engine.player.place(*location, self.engine.game_map)
+
+    def ascend(self) -> None:
+        """Sube al piso anterior."""
+        if not self._enter(self.current_floor - 1):
+            raise RuntimeError(f"El piso {self.current_floor - 1} no existe")
+
+        location = self.engine.game_map.downstairs_location
+        assert location is not None
+        self.engine.player.place(*location, self.engine.game_map)
+
+    def _enter(self, floor: int) -> bool:
+        """Activa un piso ya visitado. Devuelve False si nunca se generó."""
+        gamemap = self.live_floors.get(floor)
+        if gamemap is None:
+            record = self.records.pop(floor, None)
+            if record is None:
+                return False
+            gamemap = unpack_floor(record, self.engine)
+
+        self.current_floor = floor
+        self.engine.game_map = gamemap
+        self._keep_live(floor, gamemap)
+        return True
+
+    def _keep_live(self, floor: int, gamemap: GameMap) -> None:
+        # Un cambio de piso no se deshace, y los snapshots del piso anterior lo
+        # mantendrían vivo aunque salga de `live_floors`.
+        self.engine.undo_history.clear()
+        self.live_floors[floor] = gamemap
+        self.live_floors.move_to_end(floor)
+
+        while len(self.live_floors) > self.max_live_floors:
+            old_floor, old_map = self.live_floors.popitem(last=False)
+            self.records[old_floor] = pack_floor(old_map, exclude=self.engine.player)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import itertools
+from typing import Dict, List, Tuple, TYPE_CHECKING
+
+import numpy as np
+from tcod.console import Console
+
+if TYPE_CHECKING:
+    from entity import Entity
+
+
+class GlyphTable:
+    """
+    Posición, caracter, color y orden de dibujo de las entidades de un GameMap.
+
+    Cada entidad ocupa una fila de unos arrays paralelos, que el GameMap mantiene
+    al agregar, sacar, mover o cambiar el aspecto de una entidad. Así dibujarlas
+    es filtrar y escribir arrays, sin recorrer las entidades en cada frame.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._rows: Dict[Entity, int] = {}
+        self._free: List[int] = []
+        # Número de alta de cada fila: entre dos entidades del mismo `render_order`
+        # en un Tile se ve la que entró última al mapa.
+        self._added = itertools.count()
+        self._size = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        def grow(array: np.ndarray) -> np.ndarray:
+            new = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            new[: self._size] = array[: self._size]
+            return new
+
+        if self._size:
+            self.xs = grow(self.xs)
+            self.ys = grow(self.ys)
+            self.chars = grow(self.chars)
+            self.colors = grow(self.colors)
+            self.orders = grow(self.orders)
+            self.sequence = grow(self.sequence)
+            self.used = grow(self.used)
+        else:
+            self.xs = np.zeros(capacity, dtype=np.intp)
+            self.ys = np.zeros(capacity, dtype=np.intp)
+            self.chars = np.zeros(capacity, dtype=np.int32)
+            self.colors = np.zeros((capacity, 3), dtype=np.uint8)
+            self.orders = np.zeros(capacity, dtype=np.int32)
+            self.sequence = np.zeros(capacity, dtype=np.int64)
+            self.used = np.zeros(capacity, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, entity: Entity) -> None:
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._size == len(self.used):
+                self._allocate(2 * self._size)
+            row = self._size
+            self._size += 1
+        self._rows[entity] = row
+        self.used[row] = True
+        self.sequence[row] = next(self._added)
+        self._write(row, entity)
+
+    def remove(self, entity: Entity) -> None:
+        row = self._rows.pop(entity)
+        self.used[row] = False
+        self._free.append(row)
+
+    def moved(self, entity: Entity) -> None:
+        row = self._rows[entity]
+        self.xs[row] = entity.x
+        self.ys[row] = entity.y
+
+    def changed(self, entity: Entity) -> None:
+        """Avisa que cambió el caracter, el color o el orden de dibujo de `entity`."""
+        row = self._rows.get(entity)
+        if row is not None:
+            self._write(row, entity)
+
+    def priority(self, entity: Entity) -> Tuple[int, int, Entity]:
+        """Prioridad de dibujo de `entity`: gana la mayor entre las de un Tile."""
+        row = self._rows[entity]
+        return int(self.orders[row]), int(self.sequence[row]), entity
+
+    def _write(self, row: int, entity: Entity) -> None:
+        self.xs[row] = entity.x
+        self.ys[row] = entity.y
+        self.chars[row] = ord(entity.char)
+        self.colors[row] = entity.color
+        self.orders[row] = entity.render_order.value
+
+    def draw(self, console: Console, visible: np.ndarray) -> None:
+        """Escribe en `console` las entidades en Tiles visibles, una por Tile."""
+        rows = np.flatnonzero(self.used[: self._size])
+        rows = rows[visible[self.xs[rows], self.ys[rows]]]
+        if not len(rows):
+            return
+
+        # De menor a mayor prioridad: orden de dibujo y después orden de alta.
+        rows = rows[np.lexsort((self.sequence[rows], self.orders[rows]))]
+        # Se queda con la última fila de cada Tile. Las asignaciones con índices
+        # repetidos no garantizan cuál gana, así que se sacan los repetidos antes.
+        tiles = self.xs[rows] * visible.shape[1] + self.ys[rows]
+        _, last = np.unique(tiles[::-1], return_index=True)
+        rows = rows[len(rows) - 1 - last]
+
+        xs, ys = self.xs[rows], self.ys[rows]
+        console.ch[xs, ys] = self.chars[rows]
+        console.fg[xs, ys] = self.colors[rows]
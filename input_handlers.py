@@ -1,18 +1,22 @@
 from __future__ import annotations
-from typing import Optional, TYPE_CHECKING
+from typing import Callable, Optional, TYPE_CHECKING
 
 import tcod.event
-from tcod import libtcodpy
 
 import actions
 from actions import (
     Action,
     PickupAction,
+    PickupAllAction,
     BumpAction,
+    MovementAction,
+    TakeStairsAction,
     WaitAction
 )
 import color
 import exceptions
+from panels import HistoryPanel, InventoryPanel
+import travel
 
 if TYPE_CHECKING:
     from entity import Item
@@ -49,6 +53,10 @@ MOVE_KEYS = {
     tcod.event.KeySym.n: (1, 1),
 }
 
+# Turnos que se esperan con shift+r, y máximo de turnos para descansar con r.
+WAIT_TURNS = 10
+MAX_REST_TURNS = 1_000
+
 WAIT_KEYS = {
     tcod.event.KeySym.PERIOD,
     tcod.event.KeySym.KP_5,
@@ -67,15 +75,15 @@ class EventHandler(tcod.event.EventDispatch[Action]):
         if action is None:
             return False
 
+        self.engine.undo_history.push(self.engine.game_map)
         try:
             action.perform()
         except exceptions.Impossible as exc:
+            self.engine.undo_history.discard_last()
             self.engine.message_log.add_message(exc.args[0], color.impossible)
             return False
 
-        self.engine.handle_enemy_turns()
-
-        self.engine.update_fov()
+        self.engine.end_turn()
         return True
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
@@ -90,26 +98,53 @@ class EventHandler(tcod.event.EventDispatch[Action]):
 
 
 class MainGameEventHandler(EventHandler):
+    def __init__(self, engine: Engine):
+        super().__init__(engine)
+
+        # Las acciones de moverse y esperar del jugador se reusan en cada tecla.
+        self._bump = BumpAction(engine.player, 0, 0)
+        self._wait = WaitAction(engine.player)
+        self._move = MovementAction(engine.player, 0, 0)
+
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[Action]:
         action: Optional[Action] = None
 
         key = event.sym
+        modifier = event.mod
 
         player = self.engine.player
 
+        if key == tcod.event.KeySym.PERIOD and modifier & tcod.event.Modifier.SHIFT:
+            return TakeStairsAction(player, down=True)
+        if key == tcod.event.KeySym.COMMA and modifier & tcod.event.Modifier.SHIFT:
+            return TakeStairsAction(player, down=False)
+
         if key in MOVE_KEYS:
             dx, dy = MOVE_KEYS[key]
-            action = BumpAction(player, dx, dy)
+            action = self._bump.retarget(dx, dy)
         elif key in WAIT_KEYS:
-            action = WaitAction(player)
+            action = self._wait
 
         elif key == tcod.event.KeySym.ESCAPE:
             raise SystemExit()
 
+        elif key == tcod.event.KeySym.BACKSPACE:
+            self.undo()
+
         elif key == tcod.event.KeySym.v:
             self.engine.event_handler = HistoryViewer(self.engine)
 
-        elif key == tcod.event.K_g:
+        elif key == tcod.event.KeySym.x:
+            self.auto_explore()
+
+        elif key == tcod.event.KeySym.r and modifier & tcod.event.Modifier.SHIFT:
+            self.rest(WAIT_TURNS, until_healed=False)
+        elif key == tcod.event.KeySym.r:
+            self.rest(MAX_REST_TURNS, until_healed=True)
+
+        elif key == tcod.event.KeySym.g and modifier & tcod.event.Modifier.SHIFT:
+            action = PickupAllAction(player)
+        elif key == tcod.event.KeySym.g:
             action = PickupAction(player)
 
         elif key == tcod.event.K_i:
@@ -120,6 +155,84 @@ class MainGameEventHandler(EventHandler):
 
         return action
 
+    def ev_mousebuttondown(self, event: tcod.event.MouseButtonDown) -> None:
+        """Con el botón izquierdo viaja hasta el Tile explorado donde se hizo clic."""
+        x, y = event.tile
+        game_map = self.engine.game_map
+        if (
+            event.button == tcod.event.MouseButton.LEFT
+            and game_map.in_bounds(x, y)
+            and game_map.explored[x, y]
+        ):
+            self.travel_to(x, y)
+
+    def undo(self) -> None:
+        engine = self.engine
+        if engine.undo_history.undo(engine.game_map):
+            engine.message_log.add_message("Turno deshecho")
+        else:
+            engine.message_log.add_message(
+                "No hay turnos para deshacer", color.impossible
+            )
+
+    def fast_forward(self, play: Callable[[], int]) -> int:
+        """Corre `play`, que juega varios turnos, como un solo comando para deshacer."""
+        engine = self.engine
+        engine.undo_history.push(engine.game_map)
+        turns = play()
+        if not turns:
+            engine.undo_history.discard_last()
+        return turns
+
+    def rest(self, max_turns: int, until_healed: bool) -> None:
+        engine = self.engine
+        fighter = engine.player.fighter
+        if engine.hostiles_in_view():
+            engine.message_log.add_message("Hay enemigos a la vista", color.impossible)
+        elif until_healed and fighter.hp == fighter.max_hp:
+            engine.message_log.add_message("No tenés heridas", color.impossible)
+        else:
+            self.fast_forward(lambda: engine.rest(max_turns, until_healed=until_healed))
+
+    def auto_explore(self) -> None:
+        """Camina hacia lo que falta explorar hasta que algo interrumpa."""
+        engine = self.engine
+        player = engine.player
+        if engine.hostiles_in_view():
+            engine.message_log.add_message("Hay enemigos a la vista", color.impossible)
+            return
+
+        def next_action() -> Optional[Action]:
+            step = travel.explore_step(engine.game_map, (player.x, player.y))
+            return None if step is None else self._move.retarget(*step)
+
+        if not self.fast_forward(lambda: engine.fast_forward(next_action)):
+            engine.message_log.add_message(
+                "No queda nada por explorar", color.impossible
+            )
+
+    def travel_to(self, x: int, y: int) -> None:
+        """Camina hasta (x, y) por Tiles explorados, hasta llegar o que algo corte."""
+        engine = self.engine
+        player = engine.player
+        if engine.hostiles_in_view():
+            engine.message_log.add_message("Hay enemigos a la vista", color.impossible)
+            return
+
+        path = travel.travel_path(engine.game_map, (player.x, player.y), (x, y))
+        if not path:
+            engine.message_log.add_message("No hay camino", color.impossible)
+            return
+        path.reverse()  # Así cada paso sale del final de la lista.
+
+        def next_action() -> Optional[Action]:
+            if not path:
+                return None
+            next_x, next_y = path.pop()
+            return self._move.retarget(next_x - player.x, next_y - player.y)
+
+        self.fast_forward(lambda: engine.fast_forward(next_action))
+
 
 class GameOverEventHandler(EventHandler):
     def ev_keydown(self, event: tcod.event.KeyDown) -> None:
@@ -140,31 +253,13 @@ class HistoryViewer(EventHandler):
         super().__init__(engine)
         self.log_length = len(engine.message_log.messages)
         self.cursor = self.log_length - 1
+        # Arma las líneas del historial una vez; mover el cursor solo las copia.
+        self.panel = HistoryPanel(engine, 1, 1)
 
     def on_render(self, console: tcod.console.Console) -> None:
         super().on_render(console)
-
-        log_console = tcod.console.Console(console.width - 6, console.height - 6)
-
-        log_console.draw_frame(0, 0, log_console.width, log_console.height)
-        log_console.print_box(
-            0,
-            0,
-            log_console.width,
-            1,
-            "┤Historial de mensajes├",
-            alignment=libtcodpy.CENTER,
-        )
-
-        self.engine.message_log.render_messages(
-            log_console,
-            1,
-            1,
-            log_console.width - 2,
-            log_console.height - 2,
-            self.engine.message_log.messages[: self.cursor + 1],
-        )
-        log_console.blit(console, 3, 3)
+        self.panel.resize(console.width - 6, console.height - 6)
+        self.panel.render_at(console, 3, 3, self.cursor)
 
     def ev_keydown(self, event: tcod.event.KeyDown) -> None:
         if event.sym in CURSOR_Y_KEYS:
@@ -227,44 +322,23 @@ class InventoryEventHandler(AskUserEventHandler):
 
     TITLE = "<missing title>"
 
+    def __init__(self, engine: Engine):
+        super().__init__(engine)
+        # El menú se redibuja solo si cambia el inventario.
+        self.panel = InventoryPanel(engine, self.TITLE)
+
     def on_render(self, console: tcod.Console) -> None:
         """Representa un menú de inventario que muestra los elementos del inventario y la letra para seleccionarlos.
         Se moverá a una posición diferente según dónde se encuentre el jugador, de modo que siempre pueda ver dónde se encuentra.
         """
         super().on_render(console)
-        number_of_items_in_inventory = len(self.engine.player.inventory.items)
-
-        height = number_of_items_in_inventory + 2
-
-        if height <= 3:
-            height = 3
 
         if self.engine.player.x <= 30:
             x = 40
         else:
             x = 0
 
-        y = 0
-
-        width = len(self.TITLE) + 4
-
-        console.draw_frame(
-            x=x,
-            y=y,
-            width=width,
-            height=height,
-            title=self.TITLE,
-            clear=True,
-            fg=(255, 255, 255),
-            bg=(0, 0, 0),
-        )
-
-        if number_of_items_in_inventory > 0:
-            for i, item in enumerate(self.engine.player.inventory.items):
-                item_key = chr(ord("a") + i)
-                console.print(x + 1, y + i + 1, f"({item_key}) {item.name}")
-        else:
-            console.print(x + 1, y + 1, "(Vacío)")
+        self.panel.render(console, x, 0)
 
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[Action]:
         player = self.engine.player
@@ -272,9 +346,8 @@ class InventoryEventHandler(AskUserEventHandler):
         index = key - tcod.event.K_a
 
         if 0 <= index <= 26:
-            try:
-                selected_item = player.inventory.items[index]
-            except IndexError:
+            selected_item = player.inventory.get(index)
+            if selected_item is None:
                 self.engine.message_log.add_message("Entrada no válida", color.invalid)
                 return None
             return self.on_item_selected(selected_item)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import functools
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, TYPE_CHECKING
+
+import numpy as np
+import tcod
+
+if TYPE_CHECKING:
+    from entity import Entity
+    from game_map import GameMap
+
+
+class Light(NamedTuple):
+    """Una fuente de luz: alcance en Tiles, color y brillo en el centro (0 a 1)."""
+
+    radius: int
+    color: Tuple[int, int, int]
+    intensity: float = 1.0
+
+
+class _Contribution(NamedTuple):
+    """La luz que aporta una fuente, dentro de su caja en el mapa."""
+
+    area_x: slice
+    area_y: slice
+    rgb: np.ndarray  # int32, forma (ancho de la caja, alto de la caja, 3).
+
+
+@functools.lru_cache(maxsize=None)
+def _kernel(light: Light) -> np.ndarray:
+    """Luz de `light` en un cuadrado de lado 2 * radius + 1, sin contar paredes.
+
+    El brillo baja en línea recta con la distancia al centro.
+    """
+    offsets = np.arange(-light.radius, light.radius + 1)
+    distance = np.hypot(offsets[:, np.newaxis], offsets[np.newaxis, :])
+    falloff = np.clip(1 - distance / (light.radius + 1), 0, 1) * light.intensity
+    kernel = falloff[:, :, np.newaxis] * np.array(light.color, dtype=np.float32)
+    kernel = kernel.astype(np.int32)
+    kernel.flags.writeable = False
+    return kernel
+
+
+class LightMap:
+    """
+    Luz acumulada de todas las fuentes de un GameMap.
+
+    Las luces estáticas (antorchas) se suman una sola vez por nivel. Las dinámicas
+    son entidades con `light`; cada una guarda su último aporte, y cuando se mueve
+    solo se resta ese aporte y se suma el nuevo. Así el costo por turno depende de
+    las fuentes que se movieron, no de cuántas hay.
+    """
+
+    def __init__(self, gamemap: GameMap):
+        self.gamemap = gamemap
+        self.static_lights: List[Tuple[int, int, Light]] = []
+        self._sources: Dict[Entity, Optional[_Contribution]] = {}
+        self._moved: Set[Entity] = set()
+        # Suma de todas las luces, int32 de forma (ancho, alto, 3). None si hay que
+        # volver a calcularla entera.
+        self._total: Optional[np.ndarray] = None
+
+    @property
+    def has_lights(self) -> bool:
+        return bool(self.static_lights or self._sources)
+
+    def add_static(self, x: int, y: int, light: Light) -> None:
+        self.static_lights.append((x, y, light))
+        self._total = None
+
+    def attach(self, entity: Entity) -> None:
+        """Empieza a seguir la luz de `entity`."""
+        self._sources[entity] = None
+        self._moved.add(entity)
+
+    def detach(self, entity: Entity) -> None:
+        contribution = self._sources.pop(entity)
+        self._moved.discard(entity)
+        if contribution is not None and self._total is not None:
+            self._total[contribution.area_x, contribution.area_y] -= contribution.rgb
+
+    def entity_moved(self, entity: Entity) -> None:
+        self._moved.add(entity)
+
+    def invalidate(self) -> None:
+        """Avisa que cambiaron los Tiles: todas las luces se vuelven a calcular."""
+        self._total = None
+
+    def update(self) -> np.ndarray:
+        """Devuelve la luz total de cada Tile, recalculando solo lo que cambió."""
+        if self._total is None:
+            gamemap = self.gamemap
+            total = np.zeros((gamemap.width, gamemap.height, 3), dtype=np.int32)
+            for x, y, light in self.static_lights:
+                self._add(total, self._contribution(x, y, light))
+            for entity in self._sources:
+                contribution = self._entity_contribution(entity)
+                self._sources[entity] = self._add(total, contribution)
+            self._total = total
+            self._moved.clear()
+            return total
+
+        total = self._total
+        for entity in self._moved:
+            old = self._sources[entity]
+            if old is not None:
+                total[old.area_x, old.area_y] -= old.rgb
+            self._sources[entity] = self._add(total, self._entity_contribution(entity))
+        self._moved.clear()
+        return total
+
+    @staticmethod
+    def _add(
+        total: np.ndarray, contribution: Optional[_Contribution]
+    ) -> Optional[_Contribution]:
+        if contribution is not None:
+            total[contribution.area_x, contribution.area_y] += contribution.rgb
+        return contribution
+
+    def _entity_contribution(self, entity: Entity) -> Optional[_Contribution]:
+        assert entity.light is not None
+        return self._contribution(entity.x, entity.y, entity.light)
+
+    def _contribution(self, x: int, y: int, light: Light) -> Optional[_Contribution]:
+        """Luz de `light` en (x, y), cortada por las paredes que la tapan."""
+        gamemap = self.gamemap
+        if not gamemap.in_bounds(x, y):
+            return None
+        radius = light.radius
+        x1, x2 = max(0, x - radius), min(gamemap.width, x + radius + 1)
+        y1, y2 = max(0, y - radius), min(gamemap.height, y + radius + 1)
+
+        lit = tcod.map.compute_fov(
+            gamemap.tiles["transparent"][x1:x2, y1:y2],
+            (x - x1, y - y1),
+            radius=radius,
+            light_walls=True,
+        )
+        kernel = _kernel(light)[
+            x1 - x + radius : x2 - x + radius, y1 - y + radius : y2 - y + radius
+        ]
+        return _Contribution(
+            slice(x1, x2), slice(y1, y2), kernel * lit[:, :, np.newaxis]
+        )
@@ -1,65 +1,178 @@
-import copy
-import traceback
-import tcod
+from __future__ import annotations
 
-import color
-from engine import Engine
-import entity_factories
-from procgen import generate_dungeon
+import argparse
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+# Solo se importa lo necesario para abrir la ventana. El resto del juego se importa
+# en segundo plano mientras se muestra la pantalla de carga.
+_START_TIME = time.perf_counter()
+
+
+class StartupReport:
+    """Registra cuánto tarda cada fase del arranque, al estilo de `-X importtime`."""
+
+    def __init__(self) -> None:
+        self.phases: List[Tuple[str, float, float]] = []
+        self._last = _START_TIME
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str) -> None:
+        """Cierra la fase `phase`, que empezó en la marca anterior."""
+        with self._lock:
+            now = time.perf_counter()
+            self.phases.append((phase, now - self._last, now - _START_TIME))
+            self._last = now
+
+    def report(self) -> str:
+        lines = ["arranque:   propio [ms] | acumulado [ms] | fase"]
+        for phase, own, cumulative in self.phases:
+            lines.append(
+                f"arranque: {own * 1000:10.1f} | {cumulative * 1000:14.1f} | {phase}"
+            )
+        return "\n".join(lines)
+
+
+class _GameLoader(threading.Thread):
+    """Importa los módulos del juego y genera el primer piso en segundo plano."""
+
+    def __init__(self, report: StartupReport):
+        super().__init__(name="loader", daemon=True)
+        self.report = report
+        self._engine: Optional[Engine] = None
+        self._error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        try:
+            import setup_game
+
+            self.report.mark("import del juego (en segundo plano)")
+            self._engine = setup_game.new_game()
+            self.report.mark("generación del primer piso (en segundo plano)")
+        except BaseException as exc:
+            self._error = exc
+
+    def result(self) -> Engine:
+        if self._error is not None:
+            raise self._error
+        assert self._engine is not None
+        return self._engine
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="7DRL")
+    parser.add_argument(
+        "--max-fps",
+        type=int,
+        default=60,
+        help="Límite de frames por segundo, 0 para no limitar.",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Muestra los tiempos de los frames al salir.",
+    )
+    parser.add_argument(
+        "--threaded",
+        action="store_true",
+        help="Resuelve la simulación en un hilo aparte del render.",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="ARCHIVO",
+        default=None,
+        help="Graba cada frame en ARCHIVO, para verlo con `recording.py play`.",
+    )
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="Muestra cuánto tardó cada fase del arranque hasta el primer frame.",
+    )
+    return parser.parse_args()
 
 
 def main() -> None:
+    args = parse_args()
+    report = StartupReport()
+
     screen_width = 80
     screen_height = 50
 
-    map_width = 80
-    map_height = 38
-
-    max_monsters_per_room = 2
-    max_items_per_room = 2
+    import tcod.console
+    import tcod.context
+    import tcod.event
+    import tcod.tileset
+    from tcod import libtcodpy
 
-    room_max_size = 10
-    room_min_size = 6
-    max_rooms = 30
+    report.mark("import tcod")
 
     tileset = tcod.tileset.load_tilesheet(
         "dejavu10x10_gs_tc.png", 32, 8, tcod.tileset.CHARMAP_TCOD
     )
-
-    player = copy.deepcopy(entity_factories.player)
-    engine = Engine(player=player)
-
-    engine.game_map = generate_dungeon(
-        max_rooms=max_rooms,
-        room_min_size=room_min_size,
-        room_max_size=room_max_size,
-        map_width=map_width,
-        map_height=map_height,
-        max_monsters_per_room=max_monsters_per_room,
-        max_items_per_room=max_items_per_room,
-        engine=engine,
-    )
-
-    engine.update_fov()
-
-    engine.message_log.add_message("¡Bienvenido!", color.welcome_text)
+    report.mark("tileset")
 
     with tcod.context.new_terminal(
         screen_width, screen_height, tileset=tileset, title="7DRL", vsync=True
     ) as context:
         root_console = tcod.console.Console(screen_width, screen_height, order="F")
-        while True:
-            root_console.clear()
-            engine.event_handler.on_render(console=root_console)
-            context.present(root_console)
-
-            try:
-                for event in tcod.event.wait():
-                    context.convert_event(event)
-                    engine.event_handler.handle_events(event)
-            except Exception:
-                traceback.print_exc()
-                engine.message_log.add_message(traceback.format_exc(), color.error)
+        root_console.print(
+            screen_width // 2,
+            screen_height // 2,
+            "Cargando...",
+            alignment=libtcodpy.CENTER,
+        )
+        context.present(root_console)
+        report.mark("ventana y pantalla de carga")
+
+        loader = _GameLoader(report)
+        loader.start()
+        while loader.is_alive():
+            # Mantiene la ventana respondiendo mientras carga.
+            for event in tcod.event.get():
+                if isinstance(event, tcod.event.Quit):
+                    raise SystemExit()
+            loader.join(timeout=0.01)
+        engine = loader.result()
+
+        import game_loop
+        import simulation
+
+        root_console.clear()
+        engine.event_handler.on_render(console=root_console)
+        context.present(root_console)
+        report.mark("primer frame")
+        if args.startup_report:
+            print(report.report(), file=sys.stderr)
+
+        stats = game_loop.FrameStats() if args.stats else None
+        recorder = None
+        if args.record:
+            import recording
+
+            recorder = recording.FrameRecorder(args.record, screen_width, screen_height)
+            recorder.record(root_console.rgb)
+        run = simulation.run_threaded if args.threaded else game_loop.run
+        try:
+            run(
+                context,
+                root_console,
+                engine,
+                max_fps=args.max_fps,
+                stats=stats,
+                recorder=recorder,
+            )
+        finally:
+            if recorder:
+                recorder.close()
+            if stats:
+                print(stats.report())
+                if recorder:
+                    print(recorder.report())
 
 
 if __name__ == "__main__":
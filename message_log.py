@@ -1,4 +1,6 @@
-from typing import Iterable, List, Reversible, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Reversible, Tuple
+from string import Formatter
+import collections
 import textwrap
 
 import tcod
@@ -6,11 +8,54 @@ import tcod
 import color
 
 
+class _MessageFormatter(Formatter):
+    """`str.format` con la conversión extra `!c`, que pasa a mayúscula la inicial."""
+
+    def convert_field(self, value: Any, conversion: Optional[str]) -> Any:
+        if conversion == "c":
+            return str(value).capitalize()
+        return super().convert_field(value, conversion)
+
+
+_formatter = _MessageFormatter()
+
+# Textos de cada evento. Los argumentos se guardan con el mensaje y solo se
+# formatean cuando hace falta mostrarlo o exportarlo.
+MESSAGE_TEMPLATES: Dict[str, str] = {
+    "melee_hit": "{0!c} atacó a {1} con {2} puntos de daño",
+    "melee_miss": "{0!c} atacó a {1} pero no hizo daño",
+    "melee_group_hit": "{1!c} x{0} atacaron a {2} con {3} puntos de daño en total",
+    "melee_group_miss": "{1!c} x{0} atacaron a {2} pero no hicieron daño",
+    "player_death": "Estás muerto!",
+    "enemy_death": "{0} está muerto!",
+    "heal": "You consume the {0}, and recover {1} HP!",
+    "drop": "Soltaste {0}.",
+    "pickup": "Agarraste {0}!",
+    "pickup_all": "Agarraste {0} items!",
+}
+
+# Evento de los mensajes que se agregan con el texto ya armado.
+TEXT_EVENT = "text"
+
+
 class Message:
-    def __init__(self, text: str, fg: Tuple[int, int, int]):
-        self.plain_text = text
+    def __init__(
+        self,
+        event: str,
+        args: Tuple[Any, ...],
+        fg: Tuple[int, int, int],
+    ):
+        self.event = event
+        self.args = args
         self.fg = fg
         self.count = 1
+        self._text: Optional[str] = args[0] if event == TEXT_EVENT else None
+
+    @property
+    def plain_text(self) -> str:
+        if self._text is None:
+            self._text = _formatter.format(MESSAGE_TEMPLATES[self.event], *self.args)
+        return self._text
 
     @property
     def full_text(self) -> str:
@@ -20,8 +65,20 @@ class Message:
 
 
 class MessageLog:
-    def __init__(self) -> None:
+    """
+    Historial de mensajes del juego.
+
+    Los mensajes se guardan como eventos (id de `MESSAGE_TEMPLATES` más argumentos)
+    y el texto se arma recién al dibujarlos. Con `headless` solo se cuentan los
+    eventos, para simulaciones donde nadie lee el historial.
+    """
+
+    def __init__(self, headless: bool = False) -> None:
         self.messages: List[Message] = []
+        self.headless = headless
+        self.event_counts: collections.Counter[str] = collections.Counter()
+        # Cantidad de mensajes agregados desde el inicio, incluidos los apilados.
+        self.total = 0
 
     def add_message(
         self,
@@ -30,10 +87,39 @@ class MessageLog:
         *,
         stack: bool = True,
     ) -> None:
-        if stack and self.messages and text == self.messages[-1].plain_text:
-            self.messages[-1].count += 1
-        else:
-            self.messages.append(Message(text, fg))
+        self.add_event(TEXT_EVENT, text, fg=fg, stack=stack)
+
+    def add_event(
+        self,
+        event: str,
+        *args: Any,
+        fg: Tuple[int, int, int] = color.white,
+        stack: bool = True,
+    ) -> None:
+        """Agrega el evento `event` de `MESSAGE_TEMPLATES` con sus argumentos."""
+        self.total += 1
+        self.event_counts[event] += 1
+        if self.headless:
+            return
+
+        if stack and self.messages:
+            last = self.messages[-1]
+            if last.event == event and last.args == args:
+                last.count += 1
+                return
+        self.messages.append(Message(event, args, fg))
+
+    def export(self) -> List[Dict[str, Any]]:
+        """Devuelve los mensajes ya formateados, por ejemplo para guardarlos en JSON."""
+        return [
+            {
+                "event": message.event,
+                "text": message.plain_text,
+                "count": message.count,
+                "fg": message.fg,
+            }
+            for message in self.messages
+        ]
 
     def render(
         self,
@@ -0,0 +1,207 @@
+"""
+Paneles de la interfaz que conservan lo que dibujaron.
+
+Cada panel tiene su propia consola y una clave con los datos que muestra (vida,
+cantidad de mensajes, items del inventario). Al dibujarse compara la clave con la
+del último dibujo: si no cambió, solo copia su consola a la pantalla con `blit`.
+"""
+from __future__ import annotations
+
+from typing import Any, Hashable, List, Tuple, TYPE_CHECKING
+
+import tcod
+from tcod import libtcodpy
+
+from message_log import MessageLog
+from render_functions import render_bar
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+# Clave que no es igual a ninguna otra: obliga a dibujar la próxima vez.
+_NOT_DRAWN: Any = object()
+
+
+class Panel:
+    """
+    Una parte de la pantalla con consola propia.
+
+    Las subclases definen `key`, con todo lo que cambia lo que se ve, y `draw`, que
+    dibuja en `self.console` (ya limpia). `redraws` cuenta los dibujos completos.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.console = tcod.console.Console(width, height, order="F")
+        self._drawn_key: Hashable = _NOT_DRAWN
+        self.redraws = 0
+
+    def key(self) -> Hashable:
+        raise NotImplementedError()
+
+    def draw(self) -> None:
+        raise NotImplementedError()
+
+    def invalidate(self) -> None:
+        """Fuerza a dibujar de nuevo la próxima vez, cambie o no la clave."""
+        self._drawn_key = _NOT_DRAWN
+
+    def resize(self, width: int, height: int) -> None:
+        if (width, height) != (self.console.width, self.console.height):
+            self.console = tcod.console.Console(width, height, order="F")
+            self.invalidate()
+
+    def render(self, console: tcod.console.Console, x: int, y: int) -> None:
+        key = self.key()
+        if key != self._drawn_key:
+            self.console.clear()
+            self.draw()
+            self._drawn_key = key
+            self.redraws += 1
+        self.console.blit(console, x, y)
+
+
+class MessageLogPanel(Panel):
+    """Los últimos mensajes del historial del motor."""
+
+    def __init__(self, engine: Engine, width: int, height: int):
+        super().__init__(width, height)
+        self.engine = engine
+
+    def key(self) -> Hashable:
+        # `total` cuenta también los apilados, que cambian el texto del último.
+        message_log = self.engine.message_log
+        return message_log, message_log.total
+
+    def draw(self) -> None:
+        self.engine.message_log.render(
+            self.console, 0, 0, self.console.width, self.console.height
+        )
+
+
+class HealthBarPanel(Panel):
+    """La barra de vida del jugador."""
+
+    def __init__(self, engine: Engine, width: int):
+        super().__init__(width, 1)
+        self.engine = engine
+
+    def key(self) -> Hashable:
+        fighter = self.engine.player.fighter
+        return fighter.hp, fighter.max_hp
+
+    def draw(self) -> None:
+        fighter = self.engine.player.fighter
+        render_bar(
+            console=self.console,
+            current_value=fighter.hp,
+            maximum_value=fighter.max_hp,
+            total_width=self.console.width,
+            x=0,
+            y=0,
+        )
+
+
+class InventoryPanel(Panel):
+    """Menú con los items del inventario del jugador y la letra de cada uno."""
+
+    def __init__(self, engine: Engine, title: str):
+        super().__init__(len(title) + 4, 3)
+        self.engine = engine
+        self.title = title
+
+    def key(self) -> Hashable:
+        return tuple(self.engine.player.inventory.slots)
+
+    def draw(self) -> None:
+        lines = [
+            f"({chr(ord('a') + slot)}) {item.name}"
+            for slot, item in self.engine.player.inventory.slotted()
+        ] or ["(Vacío)"]
+        self.resize(
+            max(len(self.title) + 4, max(len(line) for line in lines) + 2),
+            max(3, len(lines) + 2),
+        )
+        console = self.console
+        console.draw_frame(
+            x=0,
+            y=0,
+            width=console.width,
+            height=console.height,
+            title=self.title,
+            clear=True,
+            fg=(255, 255, 255),
+            bg=(0, 0, 0),
+        )
+        for i, line in enumerate(lines):
+            console.print(1, i + 1, line)
+
+
+class HistoryPanel(Panel):
+    """
+    Historial completo de mensajes con scroll.
+
+    La consola del panel solo tiene el marco. Los mensajes se escriben una vez,
+    todos, en la consola alta `lines`, y cada dibujo copia la parte que termina en
+    el mensaje del cursor: moverse por el historial cuesta dos `blit`.
+    """
+
+    TITLE = "┤Historial de mensajes├"
+
+    def __init__(self, engine: Engine, width: int, height: int):
+        super().__init__(width, height)
+        self.engine = engine
+        self.lines = tcod.console.Console(1, 1, order="F")
+        self._lines_key: Hashable = _NOT_DRAWN
+        # Línea siguiente a la última de cada mensaje en `lines`.
+        self._line_ends: List[int] = []
+
+    def key(self) -> Hashable:
+        return self.console.width, self.console.height
+
+    def draw(self) -> None:
+        console = self.console
+        console.draw_frame(0, 0, console.width, console.height)
+        console.print_box(
+            0, 0, console.width, 1, self.TITLE, alignment=libtcodpy.CENTER
+        )
+
+    def _update_lines(self) -> None:
+        message_log = self.engine.message_log
+        width = self.console.width - 2
+        key = message_log, message_log.total, width
+        if key == self._lines_key:
+            return
+        self._lines_key = key
+
+        wrapped: List[Tuple[str, Tuple[int, int, int]]] = []
+        self._line_ends = []
+        for message in message_log.messages:
+            wrapped.extend(
+                (line, message.fg) for line in MessageLog.wrap(message.full_text, width)
+            )
+            self._line_ends.append(len(wrapped))
+        self.lines = tcod.console.Console(width, max(1, len(wrapped)), order="F")
+        for y, (line, fg) in enumerate(wrapped):
+            self.lines.print(x=0, y=y, string=line, fg=fg)
+
+    def render_at(
+        self, console: tcod.console.Console, x: int, y: int, cursor: int
+    ) -> None:
+        """Dibuja el historial con el mensaje `cursor` en la última línea."""
+        self.render(console, x, y)
+        self._update_lines()
+        if not 0 <= cursor < len(self._line_ends):
+            return
+        visible = self.console.height - 2
+        end = self._line_ends[cursor]
+        start = max(0, end - visible)
+        if end > start:
+            self.lines.blit(
+                console,
+                x + 1,
+                y + 1 + visible - (end - start),
+                0,
+                start,
+                self.lines.width,
+                end - start,
+            )
@@ -3,18 +3,33 @@ from __future__ import annotations
 import random
 from typing import Iterator, List, Tuple, TYPE_CHECKING
 
+import numpy as np
 import tcod
 
 import entity_factories
 
 from game_map import GameMap
+from lighting import Light
+from regions import RegionGraph
 import tile_types
 
-
 if TYPE_CHECKING:
     from engine import Engine
 
 
+TORCH = Light(radius=6, color=(170, 90, 20), intensity=0.5)
+# Probabilidad de que una habitación tenga una antorcha en una esquina.
+TORCH_CHANCE = 0.4
+
+# Autómata de las cuevas: proporción inicial de paredes, pasadas de suavizado y
+# paredes (de las 9 celdas del vecindario 3x3) desde las que una celda es pared.
+CAVE_WALL_CHANCE = 0.45
+CAVE_SMOOTHING_STEPS = 5
+CAVE_WALL_THRESHOLD = 5
+# Las cuevas aisladas más chicas que esto se rellenan en vez de unirse con túneles.
+CAVE_MIN_SIZE = 20
+
+
 class RectangularRoom:
     def __init__(self, x: int, y: int, width: int, height: int) -> None:
         self.x1 = x
@@ -51,18 +66,30 @@ def generate_dungeon(
     max_monsters_per_room: int,
     max_items_per_room: int,
     engine: Engine,
+    rng: random.Random,
+    upstairs: bool = False,
 ) -> GameMap:
+    """
+    Genera un piso de habitaciones rectangulares unidas por túneles.
+
+    El jugador empieza en el centro de la primera habitación, donde quedan las
+    escaleras para subir si `upstairs` es verdadero. Las escaleras para bajar
+    van en el centro de la última habitación. Todo el azar sale de `rng`, así
+    dos generaciones en paralelo no se mezclan y la misma semilla repite el piso.
+    """
     player = engine.player
-    dungeon = GameMap(engine, map_width, map_height, entities=[player])
+    dungeon = GameMap(engine, map_width, map_height)
+    torch_rng = _torch_rng(rng)
 
     rooms: List[RectangularRoom] = []
+    tunnels: List[List[Tuple[int, int]]] = []
 
     for r in range(max_rooms):
-        room_width = random.randint(room_min_size, room_max_size)
-        room_height = random.randint(room_min_size, room_max_size)
+        room_width = rng.randint(room_min_size, room_max_size)
+        room_height = rng.randint(room_min_size, room_max_size)
 
-        x = random.randint(0, dungeon.width - room_width - 1)
-        y = random.randint(0, dungeon.height - room_height - 1)
+        x = rng.randint(0, dungeon.width - room_width - 1)
+        y = rng.randint(0, dungeon.height - room_height - 1)
 
         new_room = RectangularRoom(x, y, room_width, room_height)
 
@@ -74,45 +101,278 @@ def generate_dungeon(
         if len(rooms) == 0:
             player.place(*new_room.center, dungeon)
         else:
-            for x, y in tunnel_between(rooms[-1].center, new_room.center):
+            tunnel = list(tunnel_between(rooms[-1].center, new_room.center, rng))
+            for x, y in tunnel:
                 dungeon.tiles[x, y] = tile_types.floor
+            tunnels.append(tunnel)
 
-        place_entities(new_room, dungeon, max_monsters_per_room, max_items_per_room)
+        place_entities(
+            new_room, dungeon, max_monsters_per_room, max_items_per_room, rng
+        )
 
         rooms.append(new_room)
 
+    # Las escaleras van al final para que ningún túnel las tape.
+    if upstairs:
+        dungeon.upstairs_location = rooms[0].center
+        dungeon.tiles[dungeon.upstairs_location] = tile_types.up_stairs
+
+    if len(rooms) > 1:
+        dungeon.downstairs_location = rooms[-1].center
+    else:
+        dungeon.downstairs_location = rooms[0].x2 - 1, rooms[0].y2 - 1
+    dungeon.tiles[dungeon.downstairs_location] = tile_types.down_stairs
+
+    dungeon.regions = RegionGraph.from_layout(
+        dungeon.width, dungeon.height, rooms, tunnels
+    )
+
+    for room in rooms:
+        if torch_rng.random() < TORCH_CHANCE:
+            inner_x, inner_y = room.inner
+            corner_x = (inner_x.start, inner_x.stop - 1)[torch_rng.integers(2)]
+            corner_y = (inner_y.start, inner_y.stop - 1)[torch_rng.integers(2)]
+            dungeon.lights.add_static(corner_x, corner_y, TORCH)
+
     return dungeon
 
+
+def _torch_rng(rng: random.Random) -> np.random.Generator:
+    """
+    Generador para ubicar antorchas, derivado del estado de `rng` sin avanzarlo.
+
+    Así el mismo piso tiene siempre las mismas antorchas, y agregarlas no cambia
+    lo que `rng` genera después para los pisos siguientes.
+    """
+    return np.random.default_rng(rng.getstate()[1])
+
+
+def generate_caves(
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    max_monsters_per_room: int,
+    max_items_per_room: int,
+    engine: Engine,
+    rng: random.Random,
+    upstairs: bool = False,
+) -> GameMap:
+    """
+    Genera un piso de cuevas con un autómata celular.
+
+    Recibe lo mismo que `generate_dungeon` para poder usarse en su lugar. Como no
+    hay habitaciones, se eligen `max_rooms` zonas de `room_min_size` a
+    `room_max_size` Tiles de lado sobre la cueva y se usan como habitaciones para
+    ubicar monstruos, items y antorchas. Las escaleras para bajar quedan en el
+    piso más lejano al jugador, en línea recta. El mapa no tiene `regions`.
+    """
+    player = engine.player
+    torch_rng = _torch_rng(rng)
+
+    # El ruido sale de una semilla de `rng`, así la misma semilla repite el mapa.
+    noise_rng = np.random.default_rng(rng.getrandbits(64))
+    floor = _smooth_caves(noise_rng, map_width, map_height)
+    if not floor.any():
+        floor[map_width // 2, map_height // 2] = True
+    labels, sizes = _label_caves(floor)
+    floor_xs, floor_ys = _connect_caves(floor, labels, sizes, rng)
+
+    # Elegir el Tile de una tabla es mucho más rápido que asignar un dtype
+    # estructurado con una máscara. `floor.T` es contiguo en orden C, así el
+    # resultado traspuesto queda en el orden "F" que usa GameMap.
+    palette = np.array([tile_types.wall, tile_types.floor])
+    dungeon = GameMap(
+        engine, map_width, map_height, tiles=np.take(palette, floor.T.view(np.uint8)).T
+    )
+
+    start = rng.randrange(len(floor_xs))
+    start_xy = int(floor_xs[start]), int(floor_ys[start])
+    player.place(*start_xy, dungeon)
+
+    distance = np.maximum(
+        np.abs(floor_xs - start_xy[0]), np.abs(floor_ys - start_xy[1])
+    )
+    farthest = int(distance.argmax())
+    dungeon.downstairs_location = int(floor_xs[farthest]), int(floor_ys[farthest])
+
+    spawn_areas: List[RectangularRoom] = []
+    for _ in range(max_rooms):
+        center = rng.randrange(len(floor_xs))
+        width = min(rng.randint(room_min_size, room_max_size), map_width - 1)
+        height = min(rng.randint(room_min_size, room_max_size), map_height - 1)
+        x = min(max(0, int(floor_xs[center]) - width // 2), map_width - width - 1)
+        y = min(max(0, int(floor_ys[center]) - height // 2), map_height - height - 1)
+        area = RectangularRoom(x, y, width, height)
+        place_entities(area, dungeon, max_monsters_per_room, max_items_per_room, rng)
+        spawn_areas.append(area)
+
+    if upstairs:
+        dungeon.upstairs_location = start_xy
+        dungeon.tiles[start_xy] = tile_types.up_stairs
+    dungeon.tiles[dungeon.downstairs_location] = tile_types.down_stairs
+
+    for area in spawn_areas:
+        if torch_rng.random() < TORCH_CHANCE and dungeon.tiles["walkable"][area.center]:
+            dungeon.lights.add_static(*area.center, TORCH)
+
+    return dungeon
+
+
+def _smooth_caves(
+    rng: np.random.Generator, width: int, height: int
+) -> np.ndarray:
+    """
+    Devuelve la máscara de piso que queda al suavizar paredes al azar.
+
+    En cada pasada una celda es pared si en su vecindario 3x3 hay al menos
+    `CAVE_WALL_THRESHOLD` paredes. El conteo se hace sumando el mapa entero
+    desplazado a cada una de las 9 posiciones, sin recorrer celdas.
+    """
+    wall = rng.random((width, height), dtype=np.float32) < CAVE_WALL_CHANCE
+    counts = np.empty((width, height), dtype=np.uint8)
+    for _ in range(CAVE_SMOOTHING_STEPS):
+        wall[[0, -1], :] = True
+        wall[:, [0, -1]] = True
+        # Fuera del mapa cuenta como pared.
+        padded = np.pad(wall, 1, constant_values=True).view(np.uint8)
+        counts[...] = padded[:width, :height]
+        for dx in range(3):
+            for dy in range(3):
+                if dx or dy:
+                    counts += padded[dx : dx + width, dy : dy + height]
+        wall = counts >= CAVE_WALL_THRESHOLD
+    wall[[0, -1], :] = True
+    wall[:, [0, -1]] = True
+    return np.asfortranarray(~wall)
+
+
+def _label_caves(floor: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Separa el piso en cuevas, Tiles unidos en horizontal o vertical.
+
+    Devuelve el id de la cueva de cada Tile (-1 en las paredes) y la cantidad de
+    Tiles de cada id. Los ids no son seguidos: los que no se usan miden 0.
+
+    En vez de inundar Tile por Tile, cada tramo horizontal de piso es un nodo y
+    los tramos que se tocan entre filas vecinas se unen con un union-find
+    vectorizado: cada raíz se cuelga de la raíz menor de sus vecinas y después
+    se saltan punteros hasta que todo apunta a su raíz. Alcanzan unas pocas
+    vueltas aunque el mapa sea enorme.
+    """
+    starts = floor.copy(order="F")
+    starts[1:, :] &= ~floor[:-1, :]
+    run_count = int(starts.sum())
+    if not run_count:
+        return np.full(floor.shape, -1, dtype=np.int32, order="F"), np.zeros(0, np.intp)
+    runs = np.cumsum(starts.ravel(order="F"), dtype=np.int32).reshape(
+        floor.shape, order="F"
+    ) - 1
+
+    touching = floor[:, :-1] & floor[:, 1:]
+    pairs = np.unique(
+        runs[:, :-1][touching].astype(np.int64) * run_count + runs[:, 1:][touching]
+    )
+    first, second = pairs // run_count, pairs % run_count
+
+    parent = np.arange(run_count, dtype=np.int32)
+    while True:
+        root_first, root_second = parent[first], parent[second]
+        if (root_first == root_second).all():
+            break
+        lowest = np.minimum(root_first, root_second)
+        np.minimum.at(parent, root_first, lowest)
+        np.minimum.at(parent, root_second, lowest)
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+
+    labels = np.where(floor, parent[runs], -1).astype(np.int32, order="F")
+    sizes = np.bincount(labels[floor], minlength=run_count)
+    return labels, sizes
+
+
+def _connect_caves(
+    floor: np.ndarray, labels: np.ndarray, sizes: np.ndarray, rng: random.Random
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Deja una sola cueva en `floor`: rellena las chicas y une las demás a la más
+    grande.
+
+    Cada cueva aislada se une con un túnel desde uno de sus Tiles hasta el comienzo
+    de tramo más cercano de la cueva principal. Devuelve las coordenadas de los
+    comienzos de tramo de la cueva principal, que sirven para elegir Tiles de piso
+    al azar sin armar la lista de todos.
+    """
+    main = int(sizes.argmax())
+    too_small = sizes < CAVE_MIN_SIZE
+    too_small[main] = False
+    floor &= ~too_small[labels]
+
+    starts = floor.copy(order="F")
+    starts[1:, :] &= ~floor[:-1, :]
+    xs, ys = np.nonzero(starts)
+    caves = labels[xs, ys]
+    in_main = caves == main
+    main_xs, main_ys = xs[in_main], ys[in_main]
+
+    cave_ids, first_start = np.unique(caves, return_index=True)
+    for cave, index in zip(cave_ids.tolist(), first_start.tolist()):
+        if cave == main or too_small[cave]:
+            continue
+        x, y = int(xs[index]), int(ys[index])
+        nearest = int(
+            np.maximum(np.abs(main_xs - x), np.abs(main_ys - y)).argmin()
+        )
+        for tunnel_x, tunnel_y in tunnel_between(
+            (x, y), (int(main_xs[nearest]), int(main_ys[nearest])), rng
+        ):
+            floor[tunnel_x, tunnel_y] = True
+    return main_xs, main_ys
+
+
 def place_entities(
-    room: RectangularRoom, dungeon: GameMap, maximum_monsters: int, maximum_items: int
+    room: RectangularRoom,
+    dungeon: GameMap,
+    maximum_monsters: int,
+    maximum_items: int,
+    rng: random.Random,
 ) -> None:
-    number_of_monsters = random.randint(0, maximum_monsters)
-    number_of_items = random.randint(0, maximum_items)
+    number_of_monsters = rng.randint(0, maximum_monsters)
+    number_of_items = rng.randint(0, maximum_items)
 
     for i in range(number_of_monsters):
-       x = random.randint(room.x1 + 1, room.x2 - 1)
-       y = random.randint(room.y1 + 1, room.y2 - 1)
+       x = rng.randint(room.x1 + 1, room.x2 - 1)
+       y = rng.randint(room.y1 + 1, room.y2 - 1)
 
+       # En las cuevas la zona de aparición puede incluir paredes.
+       if not dungeon.tiles["walkable"][x, y]:
+           continue
        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-           if random.random() < 0.8:
+           if rng.random() < 0.8:
                entity_factories.orc.spawn(dungeon, x, y)
            else:
                entity_factories.troll.spawn(dungeon, x, y)
 
     for i in range(number_of_items):
-        x = random.randint(room.x1 + 1, room.x2 - 1)
-        y = random.randint(room.y1 + 1, room.y2 - 1)
+        x = rng.randint(room.x1 + 1, room.x2 - 1)
+        y = rng.randint(room.y1 + 1, room.y2 - 1)
 
+        if not dungeon.tiles["walkable"][x, y]:
+            continue
         if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
             entity_factories.health_potion.spawn(dungeon, x, y)
 
 
 def tunnel_between(
-    start: Tuple[int, int], end: Tuple[int, int]
+    start: Tuple[int, int], end: Tuple[int, int], rng: random.Random
 ) -> Iterator[Tuple[int, int]]:
     x1, y1 = start
     x2, y2 = end
-    if random.random() < 0.5:
+    if rng.random() < 0.5:
         corner_x, corner_y = x2, y1
     else:
         corner_x, corner_y = x1, y2
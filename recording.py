@@ -0,0 +1,353 @@
+"""
+Grabación de lo que se vio en pantalla y visor para reproducirlo.
+
+`FrameRecorder` guarda la consola después de cada `on_render`: cada tanto un frame
+completo (keyframe) y en el medio solo las celdas que cambiaron, todo comprimido
+con zlib y con el momento en que se dibujó. Un turno normal cambia unos cientos
+de celdas, así que cada frame ocupa alrededor de 1 KB.
+
+    python main.py --record partida.rec
+    python recording.py info partida.rec
+    python recording.py play partida.rec
+    python recording.py export partida.rec partida.cast --start 30 --end 90
+
+El visor se controla con: espacio pausa, izquierda/derecha un frame, re pág/av pág
+10 segundos, inicio/fin, arriba/abajo velocidad, escape sale. `export` escribe un
+asciicast v2 que se reproduce en una terminal con `asciinema play`.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import struct
+import time
+import zlib
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+import tcod
+
+MAGIC = b"7DRLREC1"
+# Ancho, alto y cada cuántos frames va un keyframe.
+_HEADER = struct.Struct("<HHI")
+# Segundos desde el comienzo de la grabación, tipo de frame y bytes comprimidos.
+_FRAME = struct.Struct("<dBI")
+KEYFRAME, DELTA = 0, 1
+
+# zlib en el nivel más rápido: el frame se comprime dentro del tiempo de render.
+COMPRESSION_LEVEL = 1
+
+
+def _encode_cells(cells: np.ndarray) -> bytes:
+    """Celdas de la consola como columnas separadas, que zlib comprime mejor."""
+    return b"".join(
+        (
+            cells["ch"].astype(np.uint32).tobytes(),
+            cells["fg"].tobytes(),
+            cells["bg"].tobytes(),
+        )
+    )
+
+
+def _decode_cells(data: memoryview, count: int, out: np.ndarray) -> None:
+    """Inversa de `_encode_cells`: escribe `count` celdas en el array plano `out`."""
+    out["ch"] = np.frombuffer(data, np.uint32, count)
+    out["fg"] = np.frombuffer(data, np.uint8, count * 3, 4 * count).reshape(-1, 3)
+    out["bg"] = np.frombuffer(data, np.uint8, count * 3, 7 * count).reshape(-1, 3)
+
+
+class FrameRecorder:
+    """Escribe los frames de una sesión en un archivo, a medida que se dibujan."""
+
+    def __init__(
+        self, path: str, width: int, height: int, keyframe_interval: int = 300
+    ):
+        self.width = width
+        self.height = height
+        self.keyframe_interval = keyframe_interval
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(MAGIC + _HEADER.pack(width, height, keyframe_interval))
+        self._previous: Optional[np.ndarray] = None
+        self._start = time.perf_counter()
+
+        self.frames = 0
+        self.bytes_written = len(MAGIC) + _HEADER.size
+        self.record_time = 0.0
+        self.max_record_time = 0.0
+
+    def record(self, rgb: np.ndarray) -> None:
+        """Guarda `rgb`, el `Console.rgb` de la consola raíz ya dibujada."""
+        start = time.perf_counter()
+        cells = rgb.ravel(order="F")
+        # Cada celda de `Console.rgb` ocupa 12 bytes: el caracter y los colores RGBA.
+        # Compararlas como 3 enteros es varias veces más rápido que como registros.
+        words = cells.view(np.uint32).reshape(-1, 3)
+        if self._previous is None or self.frames % self.keyframe_interval == 0:
+            kind = KEYFRAME
+            payload = _encode_cells(cells)
+            self._previous = words.copy()
+        else:
+            kind = DELTA
+            different = words != self._previous
+            changed = np.flatnonzero(
+                different[:, 0] | different[:, 1] | different[:, 2]
+            )
+            np.copyto(self._previous, words)
+            # Las posiciones se guardan como saltos desde la anterior: casi siempre
+            # son números chicos y repetidos.
+            jumps = np.diff(changed, prepend=0).astype(np.uint32)
+            payload = (
+                struct.pack("<I", len(changed))
+                + jumps.tobytes()
+                + _encode_cells(cells[changed])
+            )
+
+        data = zlib.compress(payload, COMPRESSION_LEVEL)
+        self._file.write(_FRAME.pack(start - self._start, kind, len(data)) + data)
+        self.frames += 1
+        self.bytes_written += _FRAME.size + len(data)
+
+        elapsed = time.perf_counter() - start
+        self.record_time += elapsed
+        self.max_record_time = max(self.max_record_time, elapsed)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def report(self) -> str:
+        average = self.record_time / self.frames if self.frames else 0.0
+        return (
+            f"grabación: {self.frames} frames, {self.bytes_written / 1024:.1f} KB, "
+            f"grabar promedio {average * 1000:.3f}ms, "
+            f"máximo {self.max_record_time * 1000:.3f}ms"
+        )
+
+
+class _Frame(NamedTuple):
+    timestamp: float
+    kind: int
+    data: bytes
+
+
+class Recording:
+    """Una grabación cargada en memoria, que se puede recorrer en cualquier orden.
+
+    Los frames se guardan comprimidos y se descomprimen al pedirlos. Para ir a un
+    frame se parte del último keyframe anterior, o del frame ya armado si queda
+    en el camino, así reproducir hacia adelante aplica un solo delta por frame.
+    """
+
+    def __init__(self, width: int, height: int, frames: List[_Frame]):
+        self.width = width
+        self.height = height
+        self.frames = frames
+        self.timestamps = np.array([frame.timestamp for frame in frames])
+        self._keyframes = np.flatnonzero(
+            np.array([frame.kind == KEYFRAME for frame in frames], dtype=bool)
+        )
+        self._cells = np.zeros(width * height, dtype=tcod.console.rgb_graphic)
+        self._index = -1
+
+    @classmethod
+    def load(cls, path: str) -> Recording:
+        """
+        Lee una grabación.
+
+        Un último frame cortado (la sesión se cerró mal) se ignora.
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{path} no es una grabación")
+        width, height, _ = _HEADER.unpack_from(data, len(MAGIC))
+
+        frames = []
+        offset = len(MAGIC) + _HEADER.size
+        while offset + _FRAME.size <= len(data):
+            timestamp, kind, size = _FRAME.unpack_from(data, offset)
+            offset += _FRAME.size
+            if offset + size > len(data):
+                break
+            frames.append(_Frame(timestamp, kind, data[offset : offset + size]))
+            offset += size
+        if not frames or frames[0].kind != KEYFRAME:
+            raise ValueError(f"{path} no tiene frames")
+        return cls(width, height, frames)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def duration(self) -> float:
+        return float(self.timestamps[-1])
+
+    def index_at(self, seconds: float) -> int:
+        """El último frame que se veía a los `seconds` segundos."""
+        index = int(np.searchsorted(self.timestamps, seconds, side="right")) - 1
+        return min(max(index, 0), len(self.frames) - 1)
+
+    def frame(self, index: int) -> np.ndarray:
+        """El frame `index`, con la forma de `Console.rgb`. No hay que modificarlo."""
+        position = np.searchsorted(self._keyframes, index, "right") - 1
+        keyframe = int(self._keyframes[position])
+        start = self._index + 1 if keyframe <= self._index <= index else keyframe
+        for current in range(start, index + 1):
+            self._apply(self.frames[current])
+        self._index = index
+        return self._cells.reshape((self.width, self.height), order="F")
+
+    def _apply(self, frame: _Frame) -> None:
+        payload = memoryview(zlib.decompress(frame.data))
+        if frame.kind == KEYFRAME:
+            _decode_cells(payload, len(self._cells), self._cells)
+            return
+        (count,) = struct.unpack_from("<I", payload)
+        jumps = np.frombuffer(payload, np.uint32, count, 4)
+        changed = np.cumsum(jumps, dtype=np.intp)
+        cells = np.empty(count, dtype=self._cells.dtype)
+        _decode_cells(payload[4 + 4 * count :], count, cells)
+        self._cells[changed] = cells
+
+    def info(self) -> str:
+        size = sum(len(frame.data) + _FRAME.size for frame in self.frames)
+        return (
+            f"{len(self.frames)} frames ({len(self._keyframes)} keyframes) en "
+            f"{self.duration:.1f}s, {self.width}x{self.height}, "
+            f"{size / 1024:.1f} KB, {size / len(self.frames):.0f} bytes por frame"
+        )
+
+
+def play(recording: Recording, tileset_path: str = "dejavu10x10_gs_tc.png") -> None:
+    """Reproduce la grabación en una ventana, respetando los tiempos originales."""
+    tileset = tcod.tileset.load_tilesheet(
+        tileset_path, 32, 8, tcod.tileset.CHARMAP_TCOD
+    )
+    with tcod.context.new_terminal(
+        recording.width, recording.height, tileset=tileset, vsync=True
+    ) as context:
+        console = tcod.console.Console(recording.width, recording.height, order="F")
+        position = 0.0  # Segundos de grabación que se están mostrando.
+        speed = 1.0
+        playing = True
+        last_tick = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            if playing:
+                position = min(position + (now - last_tick) * speed, recording.duration)
+                playing = position < recording.duration
+            last_tick = now
+
+            index = recording.index_at(position)
+            console.rgb[:] = recording.frame(index)
+            context.present(console)
+            if context.sdl_window is not None:
+                context.sdl_window.title = (
+                    f"frame {index + 1}/{len(recording)} - "
+                    f"{position:.1f}/{recording.duration:.1f}s - x{speed:g}"
+                    f"{'' if playing else ' (pausa)'}"
+                )
+
+            for event in tcod.event.wait(1 / 60 if playing else None):
+                if isinstance(event, tcod.event.Quit):
+                    return
+                if not isinstance(event, tcod.event.KeyDown):
+                    continue
+                key = event.sym
+                if key == tcod.event.KeySym.ESCAPE:
+                    return
+                elif key == tcod.event.KeySym.SPACE:
+                    playing = not playing
+                elif key in (tcod.event.KeySym.LEFT, tcod.event.KeySym.RIGHT):
+                    playing = False
+                    step = 1 if key == tcod.event.KeySym.RIGHT else -1
+                    target = min(max(index + step, 0), len(recording) - 1)
+                    position = float(recording.timestamps[target])
+                elif key == tcod.event.KeySym.PAGEUP:
+                    position = max(position - 10, 0.0)
+                elif key == tcod.event.KeySym.PAGEDOWN:
+                    position = min(position + 10, recording.duration)
+                elif key == tcod.event.KeySym.HOME:
+                    position = 0.0
+                elif key == tcod.event.KeySym.END:
+                    position = recording.duration
+                elif key == tcod.event.KeySym.UP:
+                    speed = min(speed * 2, 64.0)
+                elif key == tcod.event.KeySym.DOWN:
+                    speed = max(speed / 2, 1 / 8)
+
+
+def export_asciicast(
+    recording: Recording,
+    out: BinaryIO,
+    start: float = 0.0,
+    end: Optional[float] = None,
+) -> int:
+    """Escribe los frames entre `start` y `end` segundos como asciicast v2.
+
+    Cada frame se manda como las secuencias ANSI de las celdas que cambiaron, igual
+    que el servidor telnet. Devuelve la cantidad de frames exportados.
+    """
+    from server import AnsiRenderer
+
+    first = recording.index_at(start)
+    last = len(recording) - 1 if end is None else recording.index_at(end)
+    header = {"version": 2, "width": recording.width, "height": recording.height}
+    out.write((json.dumps(header) + "\n").encode("utf-8"))
+
+    renderer = AnsiRenderer(recording.width, recording.height)
+    origin = float(recording.timestamps[first])
+    for index in range(first, last + 1):
+        output = renderer.render(recording.frame(index))
+        timestamp = float(recording.timestamps[index]) - origin
+        line = json.dumps([round(timestamp, 4), "o", output.decode("utf-8")])
+        out.write((line + "\n").encode("utf-8"))
+    return last - first + 1
+
+
+def _frames_per_second(recording: Recording) -> Iterator[str]:
+    """Líneas con cuántos frames se grabaron en cada segundo con actividad."""
+    seconds, counts = np.unique(
+        recording.timestamps.astype(np.int64), return_counts=True
+    )
+    for second, count in zip(seconds.tolist(), counts.tolist()):
+        yield f"  {second:>6}s: {count} frames"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Grabaciones de partidas.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    info = commands.add_parser("info", help="Muestra el tamaño y la duración.")
+    info.add_argument("path")
+    info.add_argument(
+        "--per-second", action="store_true", help="Frames grabados en cada segundo."
+    )
+
+    play_parser = commands.add_parser("play", help="Reproduce en una ventana.")
+    play_parser.add_argument("path")
+
+    export = commands.add_parser("export", help="Exporta a asciicast v2.")
+    export.add_argument("path")
+    export.add_argument("out")
+    export.add_argument("--start", type=float, default=0.0, help="Segundo inicial.")
+    export.add_argument("--end", type=float, default=None, help="Segundo final.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    recording = Recording.load(args.path)
+    if args.command == "info":
+        print(recording.info())
+        if args.per_second:
+            print("\n".join(_frames_per_second(recording)))
+    elif args.command == "play":
+        play(recording)
+    elif args.command == "export":
+        with open(args.out, "wb") as out:
+            frames = export_asciicast(recording, out, args.start, args.end)
+        print(f"{frames} frames exportados a {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,529 @@
+from __future__ import annotations
+
+import heapq
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+import numpy as np
+import tcod
+
+if TYPE_CHECKING:
+    from procgen import RectangularRoom
+
+
+# Desplazamientos para encontrar regiones vecinas, incluidas las diagonales.
+_NEIGHBOUR_SHIFTS = ((1, 0), (0, 1), (1, 1), (1, -1))
+
+Point = Tuple[int, int]
+
+# Costo de un paso derecho y de uno en diagonal, en todas las búsquedas.
+CARDINAL_COST = 2
+DIAGONAL_COST = 3
+
+# Lado de los bloques en que se agrupan los Tiles de pasillo, ver `from_layout`.
+CORRIDOR_BLOCK = 16
+# Cada cuántos Tiles de contacto entre dos regiones se pone un portal.
+PORTAL_SPACING = 3
+
+# Debajo de esta cantidad de Tiles un A* sobre el mapa completo es más barato que
+# seguir el grafo de regiones.
+MIN_MAP_AREA = 10_000
+
+# Busca un camino dentro de una zona del mapa: recibe la caja, la máscara de Tiles
+# permitidos dentro de la caja, el origen y el destino en coordenadas del mapa.
+# Devuelve el camino sin el origen, o una lista vacía si no lo encuentra.
+FineSearch = Callable[[slice, slice, np.ndarray, Point, Point], List[Point]]
+
+# Nodos de `RegionGraph._route` que no son portales: el origen y el destino.
+_START = -1
+_GOAL = -2
+
+# Distancia de los Tiles que Dijkstra no alcanza.
+_UNREACHED = np.iinfo(np.int32).max
+
+# Peso de la distancia al destino en el A* sobre portales. Con más de 1 revisa
+# muchos menos portales y el costo del camino queda a lo sumo en ese factor del
+# mejor por portales.
+HEURISTIC_WEIGHT = 1.25
+# Parte de los portales que el A* puede revisar. Si el destino queda detrás de un
+# rodeo tan grande, A* sobre el mapa completo (en C) es más barato.
+MAX_EXPANDED = 0.05
+
+
+def search_area(
+    area_x: slice,
+    area_y: slice,
+    cost: np.ndarray,
+    start: Point,
+    goal: Point,
+) -> List[Point]:
+    """Corre A* sobre `cost`, que cubre la caja `area_x`, `area_y` del mapa."""
+    graph = tcod.path.SimpleGraph(
+        cost=cost, cardinal=CARDINAL_COST, diagonal=DIAGONAL_COST
+    )
+    pathfinder = tcod.path.Pathfinder(graph)
+    pathfinder.add_root((start[0] - area_x.start, start[1] - area_y.start))
+
+    # Calcula la ruta al destino y elimina el punto de inicio.
+    path: List[List[int]] = pathfinder.path_to(
+        (goal[0] - area_x.start, goal[1] - area_y.start)
+    )[1:].tolist()
+    return [(x + area_x.start, y + area_y.start) for x, y in path]
+
+
+def path_cost(start: Point, path: List[Point]) -> int:
+    """Costo de recorrer `path` desde `start`, sin contar las entidades."""
+    cost = 0
+    x, y = start
+    for next_x, next_y in path:
+        cost += DIAGONAL_COST if next_x != x and next_y != y else CARDINAL_COST
+        x, y = next_x, next_y
+    return cost
+
+
+def _block_components(mask: np.ndarray, block: int) -> np.ndarray:
+    """
+    Separa los Tiles de `mask` en grupos conectados, también en diagonal, que no
+    cruzan los bordes de los bloques de `block` de lado.
+
+    Devuelve el número de grupo de cada Tile, en el orden de `np.nonzero(mask)`.
+    Los grupos se numeran desde 0 en el orden de su primer Tile.
+    """
+    width, height = mask.shape
+    xs, ys = np.nonzero(mask)
+    index = np.full(mask.shape, -1, dtype=np.intp)
+    index[xs, ys] = np.arange(len(xs))
+    blocks = (np.arange(width) // block)[:, None] * height + (
+        np.arange(height) // block
+    )[None, :]
+
+    firsts, seconds = [], []
+    for dx, dy in _NEIGHBOUR_SHIFTS:
+        area_a = slice(0, width - dx), slice(max(0, -dy), height - max(0, dy))
+        area_b = slice(dx, width), slice(max(0, dy), height - max(0, -dy))
+        a, b = index[area_a], index[area_b]
+        linked = (a >= 0) & (b >= 0) & (blocks[area_a] == blocks[area_b])
+        firsts.append(a[linked])
+        seconds.append(b[linked])
+    first, second = np.concatenate(firsts), np.concatenate(seconds)
+
+    # Cada Tile toma el menor número entre él y sus vecinos, y después el del Tile
+    # con ese número, hasta que no cambia ninguno.
+    group = np.arange(len(xs))
+    while True:
+        new_group = group.copy()
+        np.minimum.at(new_group, first, group[second])
+        np.minimum.at(new_group, second, group[first])
+        new_group = new_group[new_group]
+        if np.array_equal(new_group, group):
+            break
+        group = new_group
+    return np.unique(group, return_inverse=True)[1]
+
+
+def octile_distance(a: Point, b: Point) -> int:
+    """Costo del camino más corto de `a` a `b` en un mapa sin paredes."""
+    dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+    return DIAGONAL_COST * min(dx, dy) + CARDINAL_COST * abs(dx - dy)
+
+
+class RegionGraph:
+    """
+    Grafo de habitaciones y pasillos que arma `procgen` al generar el mapa.
+
+    `labels` tiene, por cada Tile, el id de la región a la que pertenece o -1 si es
+    pared. Las habitaciones usan los ids `0 .. len(rooms) - 1`, en el mismo orden
+    de `rooms`, y los pasillos los ids siguientes.
+
+    Los caminos se buscan sobre los portales: Tiles de una región pegados a otra.
+    Dos portales pegados se unen con el costo de un paso, y dos portales de una
+    misma región con el costo del camino más corto dentro de ella.
+    """
+
+    def __init__(self, labels: np.ndarray, rooms: List[RectangularRoom]):
+        self.labels = labels
+        self.rooms = rooms
+        self.region_count = int(labels.max()) + 1
+
+        self.neighbours: List[Set[int]] = [set() for _ in range(self.region_count)]
+        # Posición de cada portal, y los portales de cada región.
+        self.nodes: List[Point] = []
+        self.region_nodes: List[List[int]] = [[] for _ in range(self.region_count)]
+        self._node_ids: Dict[Point, int] = {}
+        # Pasos de cada portal a los portales pegados de otras regiones, y todas
+        # sus aristas (pasos y caminos dentro de su región) una vez calculadas.
+        self._crossings: List[List[Tuple[int, int]]] = []
+        self._edges: Dict[int, List[Tuple[int, int]]] = {}
+        self._link_neighbours()
+        self._node_xs = np.array([x for x, _ in self.nodes], dtype=np.intp)
+        self._node_ys = np.array([y for _, y in self.nodes], dtype=np.intp)
+
+        # Caja (x1, y1, x2, y2) inclusiva de cada región.
+        xs, ys = np.nonzero(labels >= 0)
+        region_ids = labels[xs, ys]
+        self.boxes = np.empty((self.region_count, 4), dtype=np.intp)
+        self.boxes[:, 0:2] = np.iinfo(np.intp).max
+        self.boxes[:, 2:4] = -1
+        np.minimum.at(self.boxes[:, 0], region_ids, xs)
+        np.minimum.at(self.boxes[:, 1], region_ids, ys)
+        np.maximum.at(self.boxes[:, 2], region_ids, xs)
+        np.maximum.at(self.boxes[:, 3], region_ids, ys)
+
+        self._walks: Dict[Tuple[int, Point, Point], List[Point]] = {}
+
+    @classmethod
+    def from_layout(
+        cls,
+        width: int,
+        height: int,
+        rooms: List[RectangularRoom],
+        tunnels: Iterable[Iterable[Point]],
+    ) -> RegionGraph:
+        """
+        Arma el grafo a partir de las habitaciones y los Tiles de cada túnel.
+
+        Los túneles se pisan y se cruzan tanto que cortarlos en tramos deja miles de
+        pasillos de pocos Tiles. En cambio los Tiles de túnel fuera de habitaciones
+        se agrupan en bloques de `CORRIDOR_BLOCK` de lado: cada grupo conectado de
+        Tiles de un bloque es un pasillo.
+        """
+        labels = np.full((width, height), fill_value=-1, dtype=np.int32, order="F")
+        for room_id, room in enumerate(rooms):
+            labels[room.inner] = room_id
+
+        corridor = np.zeros((width, height), dtype=bool, order="F")
+        for tunnel in tunnels:
+            for x, y in tunnel:
+                corridor[x, y] = True
+        corridor &= labels < 0
+        labels[corridor] = len(rooms) + _block_components(corridor, CORRIDOR_BLOCK)
+
+        return cls(labels, rooms)
+
+    def _link_neighbours(self) -> None:
+        """
+        Busca los pares de Tiles pegados de regiones distintas y arma los portales.
+
+        Un pasillo que corre junto a una habitación la toca en muchos Tiles. De cada
+        par de regiones se usa un contacto cada `PORTAL_SPACING`, en orden de
+        posición, y el último: los caminos casi no dan vueltas y el grafo queda chico.
+        """
+        width, height = self.labels.shape
+        firsts, seconds, diagonals = [], [], []
+        first_xs, first_ys, second_xs, second_ys = [], [], [], []
+        for dx, dy in _NEIGHBOUR_SHIFTS:
+            a = self.labels[0 : width - dx, max(0, -dy) : height - max(0, dy)]
+            b = self.labels[dx:width, max(0, dy) : height - max(0, -dy)]
+            touching = (a >= 0) & (b >= 0) & (a != b)
+            xs, ys = np.nonzero(touching)
+            firsts.append(a[touching])
+            seconds.append(b[touching])
+            diagonals.append(np.full(len(xs), dx != 0 and dy != 0))
+            first_xs.append(xs)
+            first_ys.append(ys + max(0, -dy))
+            second_xs.append(xs + dx)
+            second_ys.append(ys + max(0, dy))
+
+        first, second = np.concatenate(firsts), np.concatenate(seconds)
+        low, high = np.minimum(first, second), np.maximum(first, second)
+        x1, y1 = np.concatenate(first_xs), np.concatenate(first_ys)
+        order = np.lexsort((y1, x1, high, low))
+        pairs = (low * self.region_count + high)[order]
+        _, starts, counts = np.unique(pairs, return_index=True, return_counts=True)
+        # Un contacto cada `PORTAL_SPACING` y el último de cada par.
+        group_ids = np.repeat(np.arange(len(starts)), counts)
+        offsets = np.arange(len(pairs)) - starts[group_ids]
+        chosen = (offsets % PORTAL_SPACING == 0) | (offsets == counts[group_ids] - 1)
+        picked = order[chosen]
+
+        contacts = zip(
+            first[picked].tolist(),
+            second[picked].tolist(),
+            x1[picked].tolist(),
+            y1[picked].tolist(),
+            np.concatenate(second_xs)[picked].tolist(),
+            np.concatenate(second_ys)[picked].tolist(),
+            np.concatenate(diagonals)[picked].tolist(),
+        )
+        for a_id, b_id, ax, ay, bx, by, diagonal in contacts:
+            self.neighbours[a_id].add(b_id)
+            self.neighbours[b_id].add(a_id)
+            a_node = self._node_at((ax, ay), a_id)
+            b_node = self._node_at((bx, by), b_id)
+            cost = DIAGONAL_COST if diagonal else CARDINAL_COST
+            self._crossings[a_node].append((b_node, cost))
+            self._crossings[b_node].append((a_node, cost))
+
+    def _node_at(self, xy: Point, region: int) -> int:
+        """Devuelve el portal en `xy`, y lo crea si todavía no existe."""
+        node = self._node_ids.get(xy)
+        if node is None:
+            node = self._node_ids[xy] = len(self.nodes)
+            self.nodes.append(xy)
+            self.region_nodes[region].append(node)
+            self._crossings.append([])
+        return node
+
+    def region_at(self, x: int, y: int) -> int:
+        return int(self.labels[x, y])
+
+    def _costs_within(
+        self, region: int, origin: Point, targets: List[Point]
+    ) -> List[Optional[int]]:
+        """
+        Costo del camino más corto de `origin` a cada uno de `targets` sin salir de
+        `region`, o None para los que no se alcanzan. No cuenta las entidades.
+        """
+        if region < len(self.rooms):
+            # Una habitación es un rectángulo de piso.
+            return [octile_distance(origin, target) for target in targets]
+
+        area_x, area_y, distance = self._distance_field(region, origin)
+        costs: List[int] = distance[
+            [x - area_x.start for x, _ in targets],
+            [y - area_y.start for _, y in targets],
+        ].tolist()
+        return [None if cost == _UNREACHED else cost for cost in costs]
+
+    def _distance_field(
+        self, region: int, origin: Point
+    ) -> Tuple[slice, slice, np.ndarray]:
+        """
+        Costo desde `origin` a cada Tile de la caja de `region` sin salir de ella.
+        Los Tiles que no se alcanzan quedan en `_UNREACHED`.
+        """
+        area_x, area_y, mask = self.region_area(region)
+        distance = np.full(mask.shape, _UNREACHED, dtype=np.int32)
+        distance[origin[0] - area_x.start, origin[1] - area_y.start] = 0
+        tcod.path.dijkstra2d(
+            distance, mask, CARDINAL_COST, DIAGONAL_COST, out=distance
+        )
+        return area_x, area_y, distance
+
+    def _node_edges(self, node: int) -> List[Tuple[int, int]]:
+        """Aristas de `node`, con su costo. Se calculan una vez y quedan guardadas."""
+        if node not in self._edges:
+            region = self.region_at(*self.nodes[node])
+            others = [other for other in self.region_nodes[region] if other != node]
+            costs = self._costs_within(
+                region, self.nodes[node], [self.nodes[other] for other in others]
+            )
+            self._edges[node] = self._crossings[node] + [
+                (other, cost) for other, cost in zip(others, costs) if cost is not None
+            ]
+        return self._edges[node]
+
+    def _route(
+        self,
+        start: Point,
+        start_region: int,
+        goal: Point,
+        goal_region: int,
+        direct_cost: Optional[int],
+    ) -> Optional[List[int]]:
+        """
+        A* de `start` a `goal` sobre los portales. Devuelve los portales del camino
+        más corto, en orden, o None si no se conectan o el A* revisa más de
+        `MAX_EXPANDED` de los portales.
+
+        `direct_cost` es el costo de un camino de `start` a `goal` que no pasa por
+        portales; si es el más corto devuelve una lista vacía.
+        """
+        start_nodes = self.region_nodes[start_region]
+        start_edges = [
+            (node, cost)
+            for node, cost in zip(
+                start_nodes,
+                self._costs_within(
+                    start_region, start, [self.nodes[node] for node in start_nodes]
+                ),
+            )
+            if cost is not None
+        ]
+        if direct_cost is not None:
+            start_edges.append((_GOAL, direct_cost))
+
+        # Los caminos son simétricos: el costo de un portal al destino es el del
+        # destino al portal.
+        goal_nodes = self.region_nodes[goal_region]
+        goal_costs = dict(
+            zip(
+                goal_nodes,
+                self._costs_within(
+                    goal_region, goal, [self.nodes[node] for node in goal_nodes]
+                ),
+            )
+        )
+
+        # Distancia octil de cada portal al destino, con el destino al final de la
+        # lista para que `estimates[_GOAL]` sea 0.
+        dx = np.abs(self._node_xs - goal[0])
+        dy = np.abs(self._node_ys - goal[1])
+        estimates: List[float] = (
+            HEURISTIC_WEIGHT
+            * (DIAGONAL_COST * np.minimum(dx, dy) + CARDINAL_COST * np.abs(dx - dy))
+        ).tolist() + [0, 0]
+
+        distances = {_START: 0}
+        previous: Dict[int, int] = {}
+        # Con el peso la estimación puede sobreestimar: un portal ya revisado no se
+        # vuelve a abrir, y el factor de `HEURISTIC_WEIGHT` se sigue cumpliendo.
+        expanded: Set[int] = set()
+        limit = MAX_EXPANDED * len(self.nodes)
+        frontier = [(octile_distance(start, goal), 0, _START)]
+        while frontier:
+            _, distance, node = heapq.heappop(frontier)
+            if node == _GOAL:
+                route = [previous[_GOAL]]
+                while route[-1] != _START:
+                    route.append(previous[route[-1]])
+                return route[-2::-1]
+            if node in expanded:
+                continue
+            expanded.add(node)
+            if len(expanded) > limit:
+                return None
+            if node == _START:
+                edges = start_edges
+            else:
+                edges = self._node_edges(node)
+                goal_cost = goal_costs.get(node)
+                if goal_cost is not None:
+                    edges = edges + [(_GOAL, goal_cost)]
+            for neighbour, cost in edges:
+                if neighbour in expanded:
+                    continue
+                new_distance = distance + cost
+                if new_distance < distances.get(neighbour, new_distance + 1):
+                    distances[neighbour] = new_distance
+                    previous[neighbour] = node
+                    heapq.heappush(
+                        frontier,
+                        (
+                            new_distance + estimates[neighbour],
+                            new_distance,
+                            neighbour,
+                        ),
+                    )
+        return None
+
+    def region_area(
+        self, region: int, *others: int
+    ) -> Tuple[slice, slice, np.ndarray]:
+        """Devuelve la caja de `region` y la máscara de sus Tiles dentro de la caja.
+
+        Con `others`, la caja y la máscara cubren todas las regiones. La caja tiene
+        un Tile de margen: el pathfinder de tcod falla con arrays de ancho o alto 1,
+        como la caja de un pasillo recto.
+        """
+        width, height = self.labels.shape
+        boxes = self.boxes[[region, *others]]
+        x1, y1 = boxes[:, 0:2].min(axis=0).tolist()
+        x2, y2 = boxes[:, 2:4].max(axis=0).tolist()
+        area_x = slice(max(0, x1 - 1), min(width, x2 + 2))
+        area_y = slice(max(0, y1 - 1), min(height, y2 + 2))
+        mask = self.labels[area_x, area_y] == region
+        for other in others:
+            mask |= self.labels[area_x, area_y] == other
+        return area_x, area_y, mask
+
+    def find_path(
+        self,
+        start: Point,
+        goal: Point,
+        search: FineSearch,
+        blockers: Optional[np.ndarray] = None,
+    ) -> Optional[List[Point]]:
+        """
+        Busca un camino de `start` a `goal` de portal en portal.
+
+        `search` se usa dentro de la región de origen y la de destino, que es donde
+        importan los bloqueos. Las regiones intermedias se cruzan con caminos que
+        se calculan una sola vez y quedan guardados; si se pasa `blockers` y alguno
+        de esos caminos pisa un Tile bloqueado, esa región también usa `search`.
+
+        Devuelve None si no hay ruta, algún tramo falla o el destino está detrás de
+        un rodeo muy grande, para que quien llama busque sobre el mapa completo.
+        """
+        start_region = self.region_at(*start)
+        goal_region = self.region_at(*goal)
+        if start_region < 0 or goal_region < 0:
+            return None
+
+        # Los portales no cubren todos los Tiles de contacto: si el destino está en
+        # la misma región o en una vecina se busca también directo en las dos, y la
+        # ruta por portales se usa solo si es más corta.
+        direct: List[Point] = []
+        if goal_region == start_region or goal_region in self.neighbours[start_region]:
+            area = self.region_area(start_region, goal_region)
+            direct = search(*area, start, goal)
+
+        route = self._route(
+            start,
+            start_region,
+            goal,
+            goal_region,
+            path_cost(start, direct) if direct else None,
+        )
+        if route is None:
+            return None
+        if not route:
+            return direct
+
+        waypoints = [start] + [self.nodes[node] for node in route] + [goal]
+        last = len(waypoints) - 2
+        path: List[Point] = []
+        for index, (position, target) in enumerate(zip(waypoints, waypoints[1:])):
+            if position == target:
+                continue
+            region = self.region_at(*position)
+            if region != self.region_at(*target):
+                # Paso de un portal al pegado de la región siguiente.
+                path.append(target)
+                continue
+
+            if index == 0 or index == last:
+                leg = search(*self.region_area(region), position, target)
+            else:
+                leg = self._walk(region, position, target)
+                if leg and blockers is not None and blockers[tuple(zip(*leg))].any():
+                    leg = search(*self.region_area(region), position, target)
+            if not leg:
+                return None
+            path.extend(leg)
+        return path
+
+    def _walk(self, region: int, start: Point, goal: Point) -> List[Point]:
+        """Camino entre dos Tiles de `region`, sin contar entidades. Se guarda."""
+        if region < len(self.rooms):
+            # Dentro de una habitación todo es piso: alcanza con ir en diagonal
+            # y después derecho.
+            path = []
+            x, y = start
+            while (x, y) != goal:
+                x += (goal[0] > x) - (goal[0] < x)
+                y += (goal[1] > y) - (goal[1] < y)
+                path.append((x, y))
+            return path
+
+        key = (region, start, goal)
+        if key not in self._walks:
+            # Armar un `Pathfinder` cuesta más que Dijkstra sobre la caja chica de
+            # un pasillo y bajar por las distancias hasta el destino.
+            area_x, area_y, distance = self._distance_field(region, goal)
+            local_start = start[0] - area_x.start, start[1] - area_y.start
+            steps: List[List[int]] = []
+            if distance[local_start] != _UNREACHED:
+                steps = tcod.path.hillclimb2d(
+                    distance, local_start, True, True
+                )[1:].tolist()
+            self._walks[key] = [(x + area_x.start, y + area_y.start) for x, y in steps]
+        return self._walks[key]
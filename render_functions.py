@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import Tuple, TYPE_CHECKING
 
 import color
 
@@ -14,30 +14,40 @@ def get_names_at_location(x: int, y: int, game_map: GameMap) -> str:
     if not game_map.in_bounds(x, y) or not game_map.visible[x, y]:
         return ""
 
-    names = ", ".join(
-        entity.name for entity in game_map.entities if entity.x == x and entity.y == y
-    )
-
-    return names.capitalize()
+    return game_map.names_at(x, y)
 
 
 def render_bar(
-    console: console.Console, current_value: int, maximum_value: int, total_width: int
+    console: console.Console,
+    current_value: int,
+    maximum_value: int,
+    total_width: int,
+    x: int = 0,
+    y: int = 45,
 ) -> None:
     bar_width = int(float(current_value) / maximum_value * total_width)
 
-    console.draw_rect(x=0, y=45, width=total_width, height=1, ch=1, bg=color.bar_empty)
+    console.draw_rect(x=x, y=y, width=total_width, height=1, ch=1, bg=color.bar_empty)
 
     if bar_width > 0:
         console.draw_rect(
-            x=0, y=45, width=bar_width, height=1, ch=1, bg=color.bar_filled
+            x=x, y=y, width=bar_width, height=1, ch=1, bg=color.bar_filled
         )
 
     console.print(
-        x=1, y=45, string=f"HP: {current_value}/{maximum_value}", fg=color.bar_text
+        x=x + 1, y=y, string=f"HP: {current_value}/{maximum_value}", fg=color.bar_text
     )
 
 
+def render_dungeon_level(
+    console: console.Console, dungeon_level: int, location: Tuple[int, int]
+) -> None:
+    """Muestra el piso actual en `location`."""
+    x, y = location
+
+    console.print(x=x, y=y, string=f"Piso: {dungeon_level}")
+
+
 def render_names_at_mouse_location(
     console: console.Console, x: int, y: int, engine: Engine
 ) -> None:
@@ -0,0 +1,576 @@
+"""
+Escenarios de carga para medir el juego sin ventana.
+
+Cada escenario arma un mapa pensado para forzar una parte del motor (muchos actores
+en una habitación, laberintos largos, campos abiertos enormes, pilas de items en un
+Tile) y mide cuánto tarda esa parte. Se corren con:
+
+    python scenarios.py crowd maze --seed 1 --repeat 50
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import copy
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import tcod
+
+from actions import Action, PickupAction, WaitAction
+from engine import Engine
+from entity import Actor
+import entity_factories
+from game_map import GameMap
+from message_log import MessageLog
+from procgen import TORCH, RectangularRoom, generate_caves, generate_dungeon
+import regions
+from render_functions import get_names_at_location
+import snapshots
+import tile_types
+
+
+class ScenarioResult(NamedTuple):
+    name: str
+    setup_time: float
+    timings: Dict[str, List[float]]  # Segundos de cada repetición, por medición.
+    # Otras medidas de cada repetición (KiB, objetos creados), por medición.
+    counts: Optional[Dict[str, List[float]]] = None
+
+    def report(self) -> str:
+        lines = [f"{self.name}: armado en {self.setup_time * 1000:.1f}ms"]
+        for label, samples in self.timings.items():
+            total = sum(samples)
+            lines.append(
+                f"  {label}: {len(samples)} veces, "
+                f"promedio {total / len(samples) * 1000:.3f}ms, "
+                f"máximo {max(samples) * 1000:.3f}ms, "
+                f"total {total * 1000:.1f}ms"
+            )
+        for label, values in (self.counts or {}).items():
+            lines.append(
+                f"  {label}: promedio {sum(values) / len(values):.1f}, "
+                f"máximo {max(values):.1f}"
+            )
+        return "\n".join(lines)
+
+
+class _Timings:
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+
+    @contextlib.contextmanager
+    def measure(self, label: str) -> Iterator[None]:
+        start = time.perf_counter()
+        yield
+        self.samples.setdefault(label, []).append(time.perf_counter() - start)
+
+
+def _new_engine(width: int, height: int) -> Tuple[Engine, GameMap]:
+    """Engine con un mapa de paredes vacío y el jugador todavía sin ubicar."""
+    player = copy.deepcopy(entity_factories.player)
+    # El jugador no tiene que morir en medio de una medición.
+    player.fighter.defense = 1_000
+
+    engine = Engine(player=player)
+    engine.message_log = MessageLog(headless=True)
+    engine.game_map = GameMap(engine, width, height)
+    return engine, engine.game_map
+
+
+def _free_tiles(gamemap: GameMap, exclude: Tuple[int, int]) -> List[Tuple[int, int]]:
+    xs, ys = gamemap.tiles["walkable"].nonzero()
+    return [xy for xy in zip(xs.tolist(), ys.tolist()) if xy != exclude]
+
+
+def crowd(rng: random.Random, size: int, repeat: int) -> ScenarioResult:
+    """`size` orcos en una sola habitación alrededor del jugador.
+
+    Mide los turnos enemigos (IA, pathfinding y combate) y el dibujo de entidades.
+    """
+    start = time.perf_counter()
+    engine, gamemap = _new_engine(100, 60)
+    room = RectangularRoom(0, 0, gamemap.width - 1, gamemap.height - 1)
+    gamemap.tiles[room.inner] = tile_types.floor
+    gamemap.refresh_tiles()
+    engine.player.place(*room.center, gamemap)
+
+    for x, y in rng.sample(_free_tiles(gamemap, room.center), size):
+        entity_factories.orc.spawn(gamemap, x, y)
+    engine.update_fov()
+    setup_time = time.perf_counter() - start
+
+    timings = _Timings()
+    console = tcod.console.Console(gamemap.width, gamemap.height, order="F")
+    wait = WaitAction(engine.player)
+    for _ in range(repeat):
+        with timings.measure("turno"):
+            engine.event_handler.handle_action(wait)
+        with timings.measure("render"):
+            gamemap.render(console)
+    return ScenarioResult("crowd", setup_time, timings.samples)
+
+
+def _print_entities(gamemap: GameMap, console: tcod.console.Console) -> None:
+    """Dibujo de referencia: cada entidad visible con `console.print`, en orden."""
+    ordered = sorted(gamemap.glyphs.priority(entity) for entity in gamemap.entities)
+    for _, _, entity in ordered:
+        if gamemap.visible[entity.x, entity.y]:
+            console.print(entity.x, entity.y, entity.char, fg=entity.color)
+
+
+def glyphs(rng: random.Random, size: int, repeat: int) -> ScenarioResult:
+    """`size` orcos en un campo abierto de 150 x 150, todos a la vista.
+
+    Mueve a todos los orcos y mide el dibujo de entidades con `GlyphTable`
+    contra dibujarlas de a una con `console.print`. Falla si difieren.
+    """
+    start = time.perf_counter()
+    engine, gamemap = _new_engine(150, 150)
+    free = _carve_field(gamemap, rng)
+    engine.player.place(*rng.choice(free), gamemap)
+    orcs = [
+        entity_factories.orc.spawn(gamemap, x, y) for x, y in rng.sample(free, size)
+    ]
+    # Algunos mueren, así hay cadáveres debajo de orcos vivos.
+    for orc in orcs[: size // 10]:
+        orc.fighter.die()
+    gamemap.visible[:] = True
+    setup_time = time.perf_counter() - start
+
+    timings = _Timings()
+    console = tcod.console.Console(gamemap.width, gamemap.height, order="F")
+    reference = tcod.console.Console(gamemap.width, gamemap.height, order="F")
+    for _ in range(repeat):
+        with timings.measure("mover"):
+            for orc in orcs:
+                dx, dy = rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1)))
+                if gamemap.tiles["walkable"][orc.x + dx, orc.y + dy]:
+                    orc.move(dx, dy)
+        console.clear()
+        reference.clear()
+        with timings.measure("glyphs"):
+            gamemap.render_entities(console)
+        with timings.measure("print"):
+            _print_entities(gamemap, reference)
+        if not np.array_equal(console.rgb, reference.rgb):
+            raise AssertionError("GlyphTable dibujó distinto que console.print")
+    return ScenarioResult("glyphs", setup_time, timings.samples)
+
+
+def _carve_maze(gamemap: GameMap, rng: random.Random) -> None:
+    """Laberinto perfecto: cada par de Tiles de piso se une por un único camino."""
+    cells_x = (gamemap.width - 1) // 2
+    cells_y = (gamemap.height - 1) // 2
+    walkable = gamemap.tiles["walkable"]
+
+    stack = [(0, 0)]
+    gamemap.tiles[1, 1] = tile_types.floor
+    while stack:
+        cx, cy = stack[-1]
+        options = [
+            (cx + dx, cy + dy)
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+            if 0 <= cx + dx < cells_x
+            and 0 <= cy + dy < cells_y
+            and not walkable[2 * (cx + dx) + 1, 2 * (cy + dy) + 1]
+        ]
+        if not options:
+            stack.pop()
+            continue
+        nx, ny = rng.choice(options)
+        gamemap.tiles[cx + nx + 1, cy + ny + 1] = tile_types.floor
+        gamemap.tiles[2 * nx + 1, 2 * ny + 1] = tile_types.floor
+        stack.append((nx, ny))
+    gamemap.refresh_tiles()
+
+
+def maze(rng: random.Random, size: int, repeat: int) -> ScenarioResult:
+    """Laberinto de `size` x `size / 2` celdas, con el jugador en una esquina.
+
+    Mide cuánto tardan 10 monstruos del extremo opuesto en buscar un camino
+    hasta el jugador.
+    """
+    start = time.perf_counter()
+    engine, gamemap = _new_engine(2 * size + 1, size | 1)
+    _carve_maze(gamemap, rng)
+    engine.player.place(1, 1, gamemap)
+
+    free = _free_tiles(gamemap, (1, 1))
+    free.sort(key=lambda xy: xy[0] + xy[1])
+    monsters: List[Actor] = [
+        entity_factories.orc.spawn(gamemap, x, y) for x, y in free[-10:]
+    ]
+    engine.update_fov()
+    setup_time = time.perf_counter() - start
+
+    timings = _Timings()
+    player = engine.player
+    for _ in range(repeat):
+        with timings.measure("path"):
+            for monster in monsters:
+                assert monster.ai is not None
+                monster.ai.get_path_to(player.x, player.y)
+    return ScenarioResult("maze", setup_time, timings.samples)
+
+
+def _carve_field(gamemap: GameMap, rng: random.Random) -> List[Tuple[int, int]]:
+    """Llena el mapa de piso con columnas sueltas y devuelve los Tiles libres."""
+    gamemap.tiles[1:-1, 1:-1] = tile_types.floor
+    pillars = rng.sample(
+        _free_tiles(gamemap, (-1, -1)), gamemap.width * gamemap.height // 20
+    )
+    for x, y in pillars:
+        gamemap.tiles[x, y] = tile_types.wall
+    gamemap.refresh_tiles()
+    return _free_tiles(gamemap, (-1, -1))
+
+
+def open_field(rng: random.Random, size: int, repeat: int) -> ScenarioResult:
+    """Campo abierto de `size` x `size` con algunas columnas sueltas.
+
+    Mide el FOV y el dibujo del mapa mientras el jugador salta a lugares al azar.
+    """
+    start = time.perf_counter()
+    engine, gamemap = _new_engine(size, size)
+    free = _carve_field(gamemap, rng)
+    engine.player.place(*rng.choice(free), gamemap)
+    setup_time = time.perf_counter() - start
+
+    timings = _Timings()
+    console = tcod.console.Console(gamemap.width, gamemap.height, order="F")
+    for _ in range(repeat):
+        engine.player.place(*rng.choice(free))
+        with timings.measure("fov"):
+            engine.update_fov()
+        with timings.measure("render"):
+            gamemap.render(console)
+    return ScenarioResult("open_field", setup_time, timings.samples)
+
+
+def lit_field(rng: random.Random, size: int, repeat: int) -> ScenarioResult:
+    """Campo abierto de 200 x 200 con `size` antorchas y `size` monstruos con luz.
+
+    Cada repetición mueve a todos los monstruos y mide cuánto cuesta actualizar la
+    luz y dibujar el mapa iluminado.
+    """
+    start = time.perf_counter()
+    engine, gamemap = _new_engine(200, 200)
+    free = _carve_field(gamemap, rng)
+    engine.player.place(*rng.choice(free), gamemap)
+    for x, y in rng.sample(free, size):
+        gamemap.lights.add_static(x, y, TORCH)
+
+    glowing = copy.deepcopy(entity_factories.orc)
+    glowing.light = TORCH
+    monsters = [glowing.spawn(gamemap, x, y) for x, y in rng.sample(free, size)]
+    engine.update_fov()
+    gamemap.lights.update()
+    setup_time = time.perf_counter() - start
+
+    timings = _Timings()
+    console = tcod.console.Console(gamemap.width, gamemap.height, order="F")
+    for _ in range(repeat):
+        for monster in monsters:
+            dx, dy = rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1)))
+            if gamemap.cost[monster.x + dx, monster.y + dy] == 1:
+                monster.move(dx, dy)
+        with timings.measure("luces"):
+            gamemap.lights.update()
+        with timings.measure("render"):
+            gamemap.render(console)
+    return ScenarioResult("lit_field", setup_time, timings.samples)
+
+
+def caves(rng: random.Random, size: int, repeat: int) -> ScenarioResult:
+    """Cuevas de `size` x `size` generadas con `generate_caves`.
+
+    Mide la generación completa: autómata, etiquetado, túneles y entidades.
+    """
+    start = time.perf_counter()
+    engine, _ = _new_engine(1, 1)
+    setup_time = time.perf_counter() - start
+
+    timings = _Timings()
+    for _ in range(repeat):
+        caves_rng = random.Random(rng.random())
+        with timings.measure("generar"):
+            engine.game_map = generate_caves(
+                max_rooms=30,
+                room_min_size=6,
+                room_max_size=10,
+                map_width=size,
+                map_height=size,
+                max_monsters_per_room=2,
+                max_items_per_room=2,
+                engine=engine,
+                rng=caves_rng,
+            )
+    return ScenarioResult("caves", setup_time, timings.samples)
+
+
+def region_paths(rng: random.Random, size: int, repeat: int) -> ScenarioResult:
+    """Mazmorra de `size` habitaciones en un mapa de `size` x `size * 3 / 4`.
+
+    Mide caminos con el grafo de regiones contra A* sobre el mapa completo, la
+    mitad a un destino cercano y la otra mitad a uno cualquiera. Como `BaseAI`,
+    busca en el mapa completo cuando el grafo no da un camino. Falla si algún
+    camino no es válido, si alguno cuesta más de 1.5 veces el de A* o si en
+    promedio cuestan más de 1.1 veces.
+    """
+    start = time.perf_counter()
+    engine, _ = _new_engine(1, 1)
+    gamemap = engine.game_map = generate_dungeon(
+        max_rooms=size,
+        room_min_size=6,
+        room_max_size=14,
+        map_width=size,
+        map_height=size * 3 // 4,
+        max_monsters_per_room=0,
+        max_items_per_room=0,
+        engine=engine,
+        rng=random.Random(rng.random()),
+    )
+    assert gamemap.regions is not None
+    xs, ys = np.nonzero(gamemap.regions.labels >= 0)
+    setup_time = time.perf_counter() - start
+
+    def search(
+        area_x: slice,
+        area_y: slice,
+        mask: np.ndarray,
+        origin: Tuple[int, int],
+        goal: Tuple[int, int],
+    ) -> List[Tuple[int, int]]:
+        cost = gamemap.cost[area_x, area_y] * mask
+        return regions.search_area(area_x, area_y, cost, origin, goal)
+
+    everywhere = slice(0, gamemap.width), slice(0, gamemap.height)
+    timings = _Timings()
+    ratios = []
+    while len(ratios) < repeat:
+        index = rng.randrange(len(xs))
+        origin = int(xs[index]), int(ys[index])
+        if len(ratios) % 2:
+            index = rng.randrange(len(xs))
+            goal = int(xs[index]), int(ys[index])
+        else:
+            goal = origin[0] + rng.randint(-20, 20), origin[1] + rng.randint(-20, 20)
+            if not gamemap.in_bounds(*goal) or gamemap.region_at(*goal) < 0:
+                continue
+        if goal == origin:
+            continue
+
+        with timings.measure("regiones"):
+            path = gamemap.regions.find_path(origin, goal, search, gamemap.blockers)
+            if path is None:
+                path = regions.search_area(*everywhere, gamemap.cost, origin, goal)
+        with timings.measure("completo"):
+            best = regions.search_area(*everywhere, gamemap.cost, origin, goal)
+        if not path or path[-1] != goal:
+            raise AssertionError(f"sin camino de {origin} a {goal}")
+        steps = zip([origin] + path, path)
+        if any(
+            max(abs(x - last_x), abs(y - last_y)) != 1 or not gamemap.cost[x, y]
+            for (last_x, last_y), (x, y) in steps
+        ):
+            raise AssertionError(f"camino inválido de {origin} a {goal}")
+        ratios.append(
+            regions.path_cost(origin, path) / regions.path_cost(origin, best)
+        )
+
+    if max(ratios) > 1.5 or sum(ratios) / len(ratios) > 1.1:
+        raise AssertionError(
+            f"caminos largos: {sum(ratios) / len(ratios):.3f} en promedio, "
+            f"{max(ratios):.3f} el peor"
+        )
+    return ScenarioResult("region_paths", setup_time, timings.samples)
+
+
+@contextlib.contextmanager
+def _count_actions() -> Iterator[List[int]]:
+    """Cuenta las acciones que se crean mientras dura el bloque."""
+    created = [0]
+    init = Action.__init__
+
+    def counting_init(self: Action, entity: Actor) -> None:
+        created[0] += 1
+        init(self, entity)
+
+    Action.__init__ = counting_init  # type: ignore[method-assign]
+    try:
+        yield created
+    finally:
+        Action.__init__ = init  # type: ignore[method-assign]
+
+
+def turn_allocations(rng: random.Random, size: int, repeat: int) -> ScenarioResult:
+    """`size` orcos persiguiendo al jugador en un campo abierto de 100 x 100.
+
+    El jugador espera con la tecla de esperar. Mide los turnos, y después repite
+    la misma cantidad con `tracemalloc` para medir el pico de memoria de cada
+    turno. Falla si algún turno crea acciones: deberían reusarse siempre.
+    """
+    start = time.perf_counter()
+    engine, gamemap = _new_engine(100, 100)
+    free = _carve_field(gamemap, rng)
+    engine.player.place(*rng.choice(free), gamemap)
+    for x, y in rng.sample(free, size):
+        if not gamemap.get_blocking_entity_at_location(x, y):
+            entity_factories.orc.spawn(gamemap, x, y)
+    engine.update_fov()
+    wait_key = tcod.event.KeyDown(0, tcod.event.KeySym.PERIOD, tcod.event.Modifier.NONE)
+    setup_time = time.perf_counter() - start
+
+    timings = _Timings()
+    for _ in range(repeat):
+        with timings.measure("turno"):
+            engine.event_handler.handle_events(wait_key)
+
+    peaks: List[float] = []
+    actions_created: List[float] = []
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            with _count_actions() as created:
+                engine.event_handler.handle_events(wait_key)
+            peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+            actions_created.append(created[0])
+    finally:
+        tracemalloc.stop()
+    if any(actions_created):
+        raise AssertionError(
+            f"se crearon {sum(actions_created):.0f} acciones en {repeat} turnos"
+        )
+    counts = {"pico KiB por turno": peaks, "acciones creadas": actions_created}
+    return ScenarioResult("turn_allocations", setup_time, timings.samples, counts)
+
+
+def rewind(rng: random.Random, size: int, repeat: int) -> ScenarioResult:
+    """Campo abierto de `size` x `size` con 200 orcos, tomando un snapshot por turno.
+
+    Mide tomar cada snapshot y después restaurarlos todos de atrás para adelante.
+    Salvo el primero, que copia el mapa entero, ninguno depende de `size`.
+    """
+    start = time.perf_counter()
+    engine, gamemap = _new_engine(size, size)
+    free = _carve_field(gamemap, rng)
+    engine.player.place(*rng.choice(free), gamemap)
+    for x, y in rng.sample(free, 200):
+        entity_factories.orc.spawn(gamemap, x, y)
+    engine.update_fov()
+    snapshots.take(gamemap)
+    setup_time = time.perf_counter() - start
+
+    timings = _Timings()
+    player = engine.player
+    history = []
+    for _ in range(repeat):
+        with timings.measure("snapshot"):
+            history.append(snapshots.take(gamemap))
+        dx, dy = rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1)))
+        if gamemap.cost[player.x + dx, player.y + dy] == 1:
+            player.move(dx, dy)
+        engine.end_turn()
+    for snapshot in reversed(history):
+        with timings.measure("restaurar"):
+            snapshots.restore(snapshot)
+    return ScenarioResult("rewind", setup_time, timings.samples)
+
+
+def item_hoard(rng: random.Random, size: int, repeat: int) -> ScenarioResult:
+    """`size` pociones apiladas en el Tile del jugador.
+
+    Mide el texto del mouse sobre la pila y agarrar items de a uno.
+    """
+    start = time.perf_counter()
+    engine, gamemap = _new_engine(20, 20)
+    room = RectangularRoom(0, 0, gamemap.width - 1, gamemap.height - 1)
+    gamemap.tiles[room.inner] = tile_types.floor
+    gamemap.refresh_tiles()
+    engine.player.place(*room.center, gamemap)
+    engine.player.inventory.capacity = size
+
+    for _ in range(size):
+        entity_factories.health_potion.spawn(gamemap, *room.center)
+    engine.update_fov()
+    setup_time = time.perf_counter() - start
+
+    timings = _Timings()
+    pickup = PickupAction(engine.player)
+    for _ in range(min(repeat, size)):
+        with timings.measure("nombres"):
+            get_names_at_location(*room.center, gamemap)
+        with timings.measure("agarrar"):
+            pickup.perform()
+    return ScenarioResult("item_hoard", setup_time, timings.samples)
+
+
+# Nombre -> (función, tamaño por defecto).
+# Cada escenario recibe el generador de azar, el tamaño y las repeticiones.
+Scenario = Callable[[random.Random, int, int], ScenarioResult]
+
+SCENARIOS: Dict[str, Tuple[Scenario, int]] = {
+    "crowd": (crowd, 2_000),
+    "glyphs": (glyphs, 2_000),
+    "maze": (maze, 100),
+    "open_field": (open_field, 200),
+    "lit_field": (lit_field, 300),
+    "caves": (caves, 2_000),
+    "region_paths": (region_paths, 400),
+    "turn_allocations": (turn_allocations, 150),
+    "rewind": (rewind, 1_000),
+    "item_hoard": (item_hoard, 3_000),
+}
+
+
+def run(
+    name: str, seed: int = 1, size: Optional[int] = None, repeat: int = 20
+) -> ScenarioResult:
+    function, default_size = SCENARIOS[name]
+    return function(random.Random(seed), size or default_size, repeat)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Escenarios de carga sin ventana.")
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        metavar="escenario",
+        help=(
+            f"Escenarios a correr ({', '.join(SCENARIOS)}). "
+            "Sin ninguno se corren todos."
+        ),
+    )
+    parser.add_argument(
+        "--seed", type=int, default=1, help="Semilla, para repetir el mismo mapa."
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=None,
+        help="Tamaño del escenario (actores, celdas, lado o items según el caso).",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Repeticiones de cada medición."
+    )
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"escenario desconocido: {name}")
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    for name in args.scenarios or list(SCENARIOS):
+        print(run(name, seed=args.seed, size=args.size, repeat=args.repeat).report())
+
+
+if __name__ == "__main__":
+    main()
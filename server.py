@@ -0,0 +1,362 @@
+"""
+Servidor para jugar por telnet, con una partida independiente por conexión.
+
+Cada sesión tiene su propio `Engine` y su propia consola fuera de pantalla. Después
+de cada entrada se dibuja la consola y solo se mandan, como secuencias ANSI, las
+celdas que cambiaron desde el frame anterior. Una sesión sin entrada no hace nada,
+así que cientos de conexiones quietas casi no usan CPU.
+
+    python server.py --port 4000
+    telnet localhost 4000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import codecs
+import contextlib
+import functools
+import random
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+import tcod
+
+import game_loop
+import setup_game
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+SCREEN_WIDTH = 80
+SCREEN_HEIGHT = 50
+
+IAC, SB, SE = 255, 250, 240
+WILL, WONT, DO, DONT = 251, 252, 253, 254
+ECHO, SUPPRESS_GO_AHEAD, LINEMODE = 1, 3, 34
+
+# El servidor hace el eco y el cliente manda cada tecla apenas se aprieta.
+TELNET_SETUP = bytes(
+    [IAC, WILL, ECHO, IAC, WILL, SUPPRESS_GO_AHEAD, IAC, DONT, LINEMODE]
+)
+HIDE_CURSOR = b"\x1b[?25l"
+RESET_TERMINAL = b"\x1b[0m\x1b[?25h\x1b[2J\x1b[H"
+
+# Secuencias de escape de las teclas especiales, sin el ESC inicial.
+ESCAPE_SEQUENCES: Dict[bytes, tcod.event.KeySym] = {
+    b"[A": tcod.event.KeySym.UP,
+    b"[B": tcod.event.KeySym.DOWN,
+    b"[C": tcod.event.KeySym.RIGHT,
+    b"[D": tcod.event.KeySym.LEFT,
+    b"[H": tcod.event.KeySym.HOME,
+    b"[F": tcod.event.KeySym.END,
+    b"[1~": tcod.event.KeySym.HOME,
+    b"[4~": tcod.event.KeySym.END,
+    b"[5~": tcod.event.KeySym.PAGEUP,
+    b"[6~": tcod.event.KeySym.PAGEDOWN,
+    b"OA": tcod.event.KeySym.UP,
+    b"OB": tcod.event.KeySym.DOWN,
+    b"OC": tcod.event.KeySym.RIGHT,
+    b"OD": tcod.event.KeySym.LEFT,
+    b"OH": tcod.event.KeySym.HOME,
+    b"OF": tcod.event.KeySym.END,
+}
+
+# Caracteres que en un teclado de EE.UU. se escriben con shift.
+SHIFTED_KEYS: Dict[str, tcod.event.KeySym] = {
+    ">": tcod.event.KeySym.PERIOD,
+    "<": tcod.event.KeySym.COMMA,
+}
+
+
+class TelnetInput:
+    """Convierte los bytes que manda un cliente telnet en eventos `KeyDown`.
+
+    Descarta los comandos de telnet (IAC ...) y guarda las secuencias que llegan
+    cortadas entre dos lecturas hasta tenerlas completas. El texto es UTF-8: un
+    caracter de varios bytes da una sola tecla, aunque llegue en dos lecturas.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = b""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+
+    def feed(self, data: bytes) -> List[tcod.event.KeyDown]:
+        buffer = self._buffer + data
+        events: List[tcod.event.KeyDown] = []
+        index = 0
+        while index < len(buffer):
+            byte = buffer[index]
+            if byte == IAC:
+                consumed = self._telnet_command(buffer, index)
+                if consumed == 0:
+                    break  # Comando incompleto, sigue en la próxima lectura.
+                if consumed == 2 and buffer[index + 1] == IAC:
+                    events.extend(self._decode(IAC))
+                index += consumed
+            elif byte == 0x1B:
+                consumed, sym = self._escape_sequence(buffer, index)
+                if consumed == 0:
+                    break
+                if sym is not None:
+                    events.append(
+                        tcod.event.KeyDown(0, sym, tcod.event.Modifier.NONE)
+                    )
+                index += consumed
+            else:
+                if byte not in b"\r\n\0":
+                    events.extend(self._decode(byte))
+                index += 1
+        self._buffer = buffer[index:]
+        return events
+
+    def _decode(self, byte: int) -> List[tcod.event.KeyDown]:
+        """Pasa `byte` por el decodificador: da una tecla al completar un caracter."""
+        return [self._key(char) for char in self._decoder.decode(bytes([byte]))]
+
+    @staticmethod
+    def _telnet_command(buffer: bytes, index: int) -> int:
+        """Devuelve cuántos bytes ocupa el comando en `index`, o 0 si está cortado."""
+        if index + 1 >= len(buffer):
+            return 0
+        command = buffer[index + 1]
+        if command in (WILL, WONT, DO, DONT):
+            return 3 if index + 2 < len(buffer) else 0
+        if command == SB:
+            end = buffer.find(bytes([IAC, SE]), index + 2)
+            return end + 2 - index if end >= 0 else 0
+        return 2
+
+    @staticmethod
+    def _escape_sequence(
+        buffer: bytes, index: int
+    ) -> Tuple[int, Optional[tcod.event.KeySym]]:
+        rest = buffer[index + 1 :]
+        if not rest or rest[:1] not in b"[O":
+            # ESC solo: un telnet manda las secuencias de una vez, así que un ESC al
+            # final de la lectura es la tecla Escape.
+            return 1, tcod.event.KeySym.ESCAPE
+        for sequence, sym in ESCAPE_SEQUENCES.items():
+            if rest.startswith(sequence):
+                return len(sequence) + 1, sym
+        if any(sequence.startswith(rest) for sequence in ESCAPE_SEQUENCES):
+            return 0, None  # Secuencia cortada.
+        return 1, None  # Secuencia desconocida: se descarta el ESC.
+
+    @staticmethod
+    def _key(char: str) -> tcod.event.KeyDown:
+        modifier = tcod.event.Modifier.NONE
+        if char in SHIFTED_KEYS:
+            return tcod.event.KeyDown(
+                0, SHIFTED_KEYS[char], tcod.event.Modifier.SHIFT
+            )
+        if char.isupper():
+            char = char.lower()
+            modifier = tcod.event.Modifier.SHIFT
+        return tcod.event.KeyDown(0, ord(char), modifier)
+
+
+class AnsiRenderer:
+    """Traduce la consola a ANSI, mandando solo las celdas que cambiaron."""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self._previous: Optional[np.ndarray] = None
+
+    def render(self, rgb: np.ndarray) -> bytes:
+        """`rgb` es `Console.rgb` de una consola con order="F"."""
+        if self._previous is None:
+            changed = np.ones(rgb.shape, dtype=bool)
+            parts = ["\x1b[2J"]
+        else:
+            changed = rgb != self._previous
+            parts = []
+        self._previous = rgb.copy()
+
+        # Recorre fila por fila, así las celdas seguidas no necesitan mover el cursor.
+        ys, xs = np.nonzero(changed.T)
+        if not len(xs):
+            return b""
+        cells = rgb[xs, ys]
+        chars = cells["ch"].tolist()
+        fgs = cells["fg"].tolist()
+        bgs = cells["bg"].tolist()
+
+        cursor = (-1, -1)
+        fg: Optional[List[int]] = None
+        bg: Optional[List[int]] = None
+        for x, y, char, cell_fg, cell_bg in zip(
+            xs.tolist(), ys.tolist(), chars, fgs, bgs
+        ):
+            if cursor != (x, y):
+                parts.append(f"\x1b[{y + 1};{x + 1}H")
+            if cell_fg != fg:
+                fg = cell_fg
+                parts.append("\x1b[38;2;{};{};{}m".format(*fg))
+            if cell_bg != bg:
+                bg = cell_bg
+                parts.append("\x1b[48;2;{};{};{}m".format(*bg))
+            parts.append(chr(char) if char > 32 else " ")
+            cursor = (x + 1, y) if x + 1 < self.width else (-1, -1)
+        return "".join(parts).encode("utf-8")
+
+
+class LatencyStats:
+    """Tiempo entre que llega una entrada y se termina de mandar su frame."""
+
+    def __init__(self) -> None:
+        self.turns = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, latency: float) -> None:
+        self.turns += 1
+        self.total += latency
+        self.maximum = max(self.maximum, latency)
+
+    def report(self) -> str:
+        average = self.total / self.turns if self.turns else 0.0
+        return (
+            f"{self.turns} entradas, latencia promedio {average * 1000:.2f}ms, "
+            f"máxima {self.maximum * 1000:.2f}ms"
+        )
+
+
+class Session:
+    """Una partida conectada: su Engine, su consola y lo último que se mandó."""
+
+    def __init__(self, session_id: int, engine: Engine):
+        self.session_id = session_id
+        self.engine = engine
+        self.console = tcod.console.Console(SCREEN_WIDTH, SCREEN_HEIGHT, order="F")
+        self.input = TelnetInput()
+        self.renderer = AnsiRenderer(SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.latency = LatencyStats()
+
+    def handle_input(self, data: bytes) -> None:
+        """Procesa la entrada. Lanza SystemExit si el jugador sale del juego."""
+        for event in self.input.feed(data):
+            game_loop.dispatch_event(self.engine, event)
+
+    def render(self) -> bytes:
+        self.console.clear()
+        self.engine.event_handler.on_render(console=self.console)
+        return self.renderer.render(self.console.rgb)
+
+
+class GameServer:
+    def __init__(self) -> None:
+        self.sessions: Dict[int, Session] = {}
+        self._next_id = 1
+        self._report_task: Optional[asyncio.Task[None]] = None
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        session_id = self._next_id
+        self._next_id += 1
+        peer = writer.get_extra_info("peername")
+        session: Optional[Session] = None
+        try:
+            # Generar el mapa tarda: se hace en otro hilo para no frenar las demás
+            # sesiones mientras tanto. Cada partida usa su propio `random.Random`,
+            # así las generaciones en paralelo no comparten el estado del azar.
+            seed = random.getrandbits(64)
+            loop = asyncio.get_running_loop()
+            engine = await loop.run_in_executor(
+                None, functools.partial(setup_game.new_game, seed=seed)
+            )
+            session = Session(session_id, engine)
+            self.sessions[session_id] = session
+            print(f"sesión {session_id}: conectada desde {peer}, semilla {seed}")
+
+            writer.write(TELNET_SETUP + HIDE_CURSOR + session.render())
+            await writer.drain()
+            while True:
+                data = await reader.read(1024)
+                if not data:
+                    break
+                start = time.perf_counter()
+                try:
+                    session.handle_input(data)
+                except SystemExit:
+                    break
+                writer.write(session.render())
+                await writer.drain()
+                session.latency.add(time.perf_counter() - start)
+        except ConnectionError:
+            pass
+        finally:
+            if session is not None:
+                del self.sessions[session_id]
+                print(f"sesión {session_id}: cerrada, {session.latency.report()}")
+            if not writer.is_closing():
+                writer.write(RESET_TERMINAL)
+                writer.close()
+
+    def start_reporting(self, interval: float) -> None:
+        """Muestra la latencia de las sesiones cada `interval` segundos."""
+        self._report_task = asyncio.create_task(self.report_periodically(interval))
+        self._report_task.add_done_callback(self._report_finished)
+
+    @staticmethod
+    def _report_finished(task: asyncio.Task[None]) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            traceback.print_exception(task.exception())
+
+    async def close(self) -> None:
+        if self._report_task is not None and not self._report_task.done():
+            self._report_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._report_task
+        self._report_task = None
+
+    async def report_periodically(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            print(f"{len(self.sessions)} sesiones")
+            for session in self.sessions.values():
+                print(f"  sesión {session.session_id}: {session.latency.report()}")
+
+
+async def serve(host: str, port: int, report_interval: float = 0.0) -> None:
+    game_server = GameServer()
+    server = await asyncio.start_server(game_server.handle_connection, host, port)
+    print(f"Escuchando en {host}:{port}")
+    if report_interval > 0:
+        game_server.start_reporting(report_interval)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await game_server.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Servidor telnet del juego.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=0.0,
+        help=(
+            "Cada cuántos segundos mostrar la latencia de cada sesión, 0 para nunca."
+        ),
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.report_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
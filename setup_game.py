@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import copy
+import random
+from typing import Optional
+
+import color
+from engine import Engine
+import entity_factories
+from game_world import GameWorld
+
+
+def new_game(
+    *,
+    map_width: int = 80,
+    map_height: int = 38,
+    max_rooms: int = 30,
+    room_min_size: int = 6,
+    room_max_size: int = 10,
+    max_monsters_per_room: int = 2,
+    max_items_per_room: int = 2,
+    seed: Optional[int] = None,
+) -> Engine:
+    """Devuelve un Engine con el primer piso generado y el FOV calculado.
+
+    La partida genera sus pisos con su propio `random.Random(seed)`: se pueden
+    crear varias a la vez en distintos hilos, y con la misma `seed` se repiten.
+    """
+    player = copy.deepcopy(entity_factories.player)
+    engine = Engine(player=player)
+
+    engine.game_world = GameWorld(
+        engine=engine,
+        max_rooms=max_rooms,
+        room_min_size=room_min_size,
+        room_max_size=room_max_size,
+        map_width=map_width,
+        map_height=map_height,
+        max_monsters_per_room=max_monsters_per_room,
+        max_items_per_room=max_items_per_room,
+        rng=random.Random(seed),
+    )
+
+    engine.game_world.generate_floor()
+    engine.update_fov()
+
+    engine.message_log.add_message("¡Bienvenido!", color.welcome_text)
+    return engine
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import NamedTuple, Optional, TYPE_CHECKING
+
+import numpy as np
+import tcod
+
+import game_loop
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from recording import FrameRecorder
+
+
+class FrameSnapshot(NamedTuple):
+    """Un frame terminado, listo para que el hilo de render lo muestre.
+
+    `rgb` es una copia de solo lectura de la consola de la simulación, con el mapa,
+    las entidades, los mensajes y los menús ya compuestos.
+    """
+
+    frame: int
+    rgb: np.ndarray
+    simulation_time: float  # Segundos que tardó en resolverse este frame.
+
+
+class SimulationThread(threading.Thread):
+    """
+    Corre la simulación (acciones, turnos enemigos y FOV) fuera del hilo de render.
+
+    Los eventos ya convertidos se encolan con `submit`. Cada vez que la cola queda
+    vacía y algo cambió, se dibuja el estado en una consola propia y se publica un
+    `FrameSnapshot` nuevo, que se lee con `snapshot`.
+    """
+
+    def __init__(self, engine: Engine, width: int, height: int):
+        super().__init__(name="simulation", daemon=True)
+        self.engine = engine
+        self.events: queue.Queue[Optional[tcod.event.Event]] = queue.Queue()
+        self.finished = threading.Event()
+        self.exit_requested = False
+        # Excepción que terminó el hilo; `run_threaded` la vuelve a lanzar.
+        self.error: Optional[BaseException] = None
+
+        self._console = tcod.console.Console(width, height, order="F")
+        self._snapshot: Optional[FrameSnapshot] = None
+        self._frame = 0
+
+    @property
+    def snapshot(self) -> Optional[FrameSnapshot]:
+        return self._snapshot
+
+    def submit(self, event: tcod.event.Event) -> None:
+        self.events.put(event)
+
+    def stop(self) -> None:
+        self.events.put(None)
+
+    def run(self) -> None:
+        try:
+            self._publish(0.0)
+            while True:
+                event = self.events.get()
+                if event is None:
+                    return
+                start = time.perf_counter()
+                changed = game_loop.dispatch_event(self.engine, event)
+
+                # Procesa todo lo que quedó encolado antes de publicar el frame.
+                while True:
+                    try:
+                        event = self.events.get_nowait()
+                    except queue.Empty:
+                        break
+                    if event is None:
+                        return
+                    changed |= game_loop.dispatch_event(self.engine, event)
+
+                if changed:
+                    self._publish(time.perf_counter() - start)
+        except SystemExit:
+            self.exit_requested = True
+        except BaseException as exc:
+            self.error = exc
+        finally:
+            self.finished.set()
+
+    def _publish(self, simulation_time: float) -> None:
+        self._console.clear()
+        self.engine.event_handler.on_render(console=self._console)
+
+        rgb = self._console.rgb.copy()
+        rgb.flags.writeable = False
+        self._frame += 1
+        # Reemplazar la referencia es atómico: nunca se ve un frame a medias.
+        self._snapshot = FrameSnapshot(self._frame, rgb, simulation_time)
+
+
+def run_threaded(
+    context: tcod.context.Context,
+    console: tcod.console.Console,
+    engine: Engine,
+    max_fps: int = 60,
+    stats: Optional[game_loop.FrameStats] = None,
+    recorder: Optional[FrameRecorder] = None,
+) -> None:
+    """
+    Loop principal con la simulación en un `SimulationThread`.
+
+    Este hilo solo convierte y encola la entrada y presenta el último
+    `FrameSnapshot`, así la pantalla sigue respondiendo mientras se resuelven
+    turnos caros. Revisa si hay frames nuevos `max_fps` veces por segundo.
+    """
+    frame_time = 1 / max_fps if max_fps > 0 else 1 / 60
+    worker = SimulationThread(engine, console.width, console.height)
+    worker.start()
+
+    last_frame = 0
+    mouse_tile: Optional[tuple] = None
+    try:
+        while not worker.finished.is_set():
+            snapshot = worker.snapshot
+            if snapshot is not None and snapshot.frame != last_frame:
+                start = time.perf_counter()
+                console.rgb[:] = snapshot.rgb
+                if recorder:
+                    recorder.record(snapshot.rgb)
+                context.present(console)
+                if stats:
+                    stats.add_frame(time.perf_counter() - start)
+                last_frame = snapshot.frame
+
+            events = tcod.event.wait(frame_time)
+            for event in game_loop.coalesce_events(events, stats):
+                context.convert_event(event)
+                if isinstance(event, tcod.event.MouseMotion):
+                    if event.tile is None or tuple(event.tile) == mouse_tile:
+                        if stats:
+                            stats.skipped_motion += 1
+                        continue
+                    mouse_tile = tuple(event.tile)
+                if stats:
+                    stats.events += 1
+                worker.submit(event)
+    finally:
+        worker.stop()
+        worker.join(timeout=1.0)
+
+    if worker.error is not None:
+        raise worker.error
+    if worker.exit_requested:
+        raise SystemExit()
@@ -0,0 +1,454 @@
+"""
+Snapshots de un GameMap para deshacer turnos y simular jugadas.
+
+Los arrays de Tiles se guardan por bloques de `CHUNK_SIZE` x `CHUNK_SIZE`. Un
+snapshot solo copia los bloques que se escribieron desde el anterior y comparte el
+resto con él, así que su costo depende de lo que cambió (en un turno normal, los
+pocos bloques alrededor del FOV) y no del tamaño del mapa.
+
+Las entidades se guardan como tuplas con su estado, sin copiar los objetos, y de
+la misma forma: cada snapshot guarda solo las que cambiaron desde el anterior.
+Por eso los snapshots de un mapa forman una pila y se restauran del último al
+primero.
+"""
+from __future__ import annotations
+
+import collections
+import contextlib
+import itertools
+from typing import (
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+    Union,
+)
+
+import numpy as np
+
+from components.ai import HostileEnemy
+from entity import Actor, Item
+from game_map import CHUNK_SIZE, SNAPSHOT_ARRAYS
+from message_log import MessageLog
+
+if TYPE_CHECKING:
+    from components.ai import BaseAI
+    from components.inventory import Inventory
+    from engine import Engine
+    from entity import Entity
+    from game_map import GameMap
+    from input_handlers import EventHandler
+    from lighting import Light
+    from render_order import RenderOrder
+
+# Cada copia de un bloque recibe un número nuevo, así dos tablas se comparan
+# comparando números en vez de arrays.
+_versions = itertools.count(1)
+
+
+class ChunkTable(NamedTuple):
+    """Los bloques de un array en un momento dado."""
+
+    # Número de copia de cada bloque, con la forma de la grilla de bloques.
+    versions: np.ndarray
+    # Copia de cada bloque, en el orden de `versions.ravel()`.
+    chunks: List[np.ndarray]
+
+
+class ChunkStore:
+    """Tablas de bloques de los arrays de un GameMap.
+
+    `head` tiene las tablas del último snapshot tomado o restaurado. Junto con
+    `GameMap.dirty_chunks` alcanza para saber qué bloques difieren del mapa vivo.
+    """
+
+    def __init__(self, gamemap: GameMap):
+        self.gamemap = gamemap
+        self.head: Dict[str, ChunkTable] = {}
+        for name in SNAPSHOT_ARRAYS:
+            shape = gamemap.dirty_chunks[name].shape
+            # Todavía no hay copias: ningún número de versión es 0.
+            empty: List[np.ndarray] = [None] * (shape[0] * shape[1])  # type: ignore
+            self.head[name] = ChunkTable(np.zeros(shape, dtype=np.int64), empty)
+
+    def _area(self, name: str, index: int) -> Tuple[slice, slice]:
+        chunk_x, chunk_y = divmod(index, self.gamemap.dirty_chunks[name].shape[1])
+        return (
+            slice(chunk_x * CHUNK_SIZE, (chunk_x + 1) * CHUNK_SIZE),
+            slice(chunk_y * CHUNK_SIZE, (chunk_y + 1) * CHUNK_SIZE),
+        )
+
+    def take(self) -> Dict[str, ChunkTable]:
+        """Copia los bloques escritos desde el último snapshot y comparte el resto."""
+        gamemap = self.gamemap
+        tables = {}
+        for name in SNAPSHOT_ARRAYS:
+            dirty = gamemap.dirty_chunks[name]
+            head = self.head[name]
+            if not dirty.any():
+                tables[name] = head
+                continue
+            array = getattr(gamemap, name)
+            versions = head.versions.copy()
+            chunks = head.chunks.copy()
+            for index in np.flatnonzero(dirty).tolist():
+                chunks[index] = array[self._area(name, index)].copy()
+                versions.flat[index] = next(_versions)
+            tables[name] = ChunkTable(versions, chunks)
+            dirty[:] = False
+        self.head = tables
+        return tables
+
+    def restore(self, tables: Dict[str, ChunkTable]) -> None:
+        """Vuelve los arrays a `tables`, escribiendo solo los bloques que difieren."""
+        gamemap = self.gamemap
+        tiles_changed = False
+        background_areas = set()
+        for name in SNAPSHOT_ARRAYS:
+            dirty = gamemap.dirty_chunks[name]
+            table = tables[name]
+            changed = dirty | (table.versions != self.head[name].versions)
+            array = getattr(gamemap, name)
+            for index in np.flatnonzero(changed).tolist():
+                area = self._area(name, index)
+                array[area] = table.chunks[index]
+                background_areas.add(index)
+            tiles_changed |= name == "tiles" and bool(changed.any())
+            dirty[:] = False
+        self.head = dict(tables)
+
+        if tiles_changed:
+            gamemap.refresh_tiles()
+            gamemap.dirty_chunks["tiles"][:] = False
+        else:
+            # Las grillas de bloques de los tres arrays son iguales.
+            for index in background_areas:
+                gamemap.refresh_background(*self._area("visible", index))
+
+
+class EntityRecord(NamedTuple):
+    """Estado de una entidad. Los componentes se guardan como tuplas de valores."""
+
+    entity: Entity
+    parent: Union[GameMap, Inventory]
+    x: int
+    y: int
+    char: str
+    color: Tuple[int, int, int]
+    name: str
+    blocks_movement: bool
+    render_order: RenderOrder
+    light: Optional[Light]
+    ai: Optional[BaseAI] = None
+    path: Optional[Tuple[Tuple[int, int], ...]] = None
+    # hp, max_hp, defense, power y turnos de regeneración acumulados.
+    fighter: Optional[Tuple[int, int, int, int, int]] = None
+    slots: Optional[Tuple[Optional[Item], ...]] = None
+
+    @classmethod
+    def capture(cls, entity: Entity) -> EntityRecord:
+        if not isinstance(entity, Actor):
+            return cls(
+                entity,
+                entity.parent,
+                entity.x,
+                entity.y,
+                entity.char,
+                entity.color,
+                entity.name,
+                entity.blocks_movement,
+                entity.render_order,
+                entity.light,
+            )
+        ai = entity.ai
+        fighter = entity.fighter
+        return cls(
+            entity,
+            entity.parent,
+            entity.x,
+            entity.y,
+            entity.char,
+            entity.color,
+            entity.name,
+            entity.blocks_movement,
+            entity.render_order,
+            entity.light,
+            ai,
+            tuple(ai.path) if isinstance(ai, HostileEnemy) else None,
+            (
+                fighter.hp,
+                fighter.max_hp,
+                fighter.defense,
+                fighter.power,
+                fighter.regen_counter,
+            ),
+            tuple(entity.inventory.slots),
+        )
+
+    def apply(self) -> None:
+        """Devuelve la entidad a este estado, sin avisarle al mapa.
+
+        La entidad tiene que estar fuera del mapa: quien llama saca y vuelve a
+        agregar las entidades, así el GameMap rearma sus índices.
+        """
+        entity = self.entity
+        entity.restore(
+            self.parent,
+            self.x,
+            self.y,
+            self.char,
+            self.color,
+            self.name,
+            self.blocks_movement,
+            self.render_order,
+            self.light,
+        )
+        if isinstance(entity, Actor):
+            entity.restore_ai(self.ai)
+            self._apply_components(entity)
+
+    def update(self) -> bool:
+        """
+        Devuelve a este estado una entidad que está en el mapa y se queda en él.
+
+        Usa los setters, que le avisan al mapa cada cambio, así la entidad no pierde
+        su lugar en las colecciones del mapa. Devuelve True si un actor murió o
+        revivió: entonces hay que llamar a `GameMap.reindex_actors`.
+        """
+        entity = self.entity
+        if (entity.x, entity.y) != (self.x, self.y):
+            entity.place(self.x, self.y)
+        entity.char = self.char
+        entity.color = self.color
+        entity.render_order = self.render_order
+        entity.name = self.name
+        entity.blocks_movement = self.blocks_movement
+        if not isinstance(entity, Actor):
+            return False
+        was_alive = entity.is_alive
+        entity.restore_ai(self.ai)
+        self._apply_components(entity)
+        return was_alive != entity.is_alive
+
+    def _apply_components(self, actor: Actor) -> None:
+        if self.path is not None:
+            assert isinstance(self.ai, HostileEnemy)
+            self.ai.path = list(self.path)
+        assert self.fighter is not None and self.slots is not None
+        actor.fighter.restore(*self.fighter)
+        actor.inventory.restore(self.slots)
+
+
+class EntityStore:
+    """Estado de las entidades de un GameMap en el último snapshot.
+
+    Como en `ChunkStore`, `head` es el estado del último snapshot tomado o
+    restaurado y `GameMap.dirty_entities` dice qué entidades pueden diferir de él.
+    `depth` cuenta los snapshots de la pila.
+    """
+
+    def __init__(self, gamemap: GameMap):
+        self.gamemap = gamemap
+        # Solo el primer snapshot recorre todas las entidades.
+        self.head: Dict[Entity, EntityRecord] = {
+            entity: EntityRecord.capture(entity)
+            for entity in _entities_of(gamemap)
+        }
+        self.depth = 0
+        gamemap.dirty_entities.clear()
+
+    def take(self) -> Dict[Entity, Optional[EntityRecord]]:
+        """
+        Guarda en `head` las entidades que cambiaron y apila un snapshot.
+
+        Devuelve el estado que esas entidades tenían en el snapshot anterior (None
+        si no estaban), que es lo que hace falta para volver a él.
+        """
+        dirty = self.gamemap.dirty_entities
+        previous = {entity: self.head.get(entity) for entity in dirty}
+        for entity in dirty:
+            self.head[entity] = EntityRecord.capture(entity)
+        dirty.clear()
+        self.depth += 1
+        return previous
+
+    def restore(self) -> None:
+        """Vuelve las entidades que cambiaron desde el último snapshot a `head`."""
+        gamemap = self.gamemap
+        lives_changed = False
+        added: List[Entity] = []
+        # Se deshacen del último cambio al primero: así las pilas de items vuelven
+        # a su orden, porque los items se agarran y se dejan arriba de la pila.
+        for entity in reversed(list(gamemap.dirty_entities)):
+            record = self.head.get(entity)
+            if (
+                entity in gamemap.entities
+                and record is not None
+                and record.parent is gamemap
+                and record.light is entity.light
+            ):
+                lives_changed |= record.update()
+                continue
+            if entity in gamemap.entities:
+                gamemap.remove_entity(entity)
+            if record is not None:
+                record.apply()
+                if record.parent is gamemap:
+                    added.append(entity)
+        for entity in added:
+            gamemap.add_entity(entity)
+        if lives_changed:
+            gamemap.reindex_actors()
+        gamemap.dirty_entities.clear()
+
+    def pop(self, previous: Dict[Entity, Optional[EntityRecord]]) -> None:
+        """
+        Saca el último snapshot de la pila sin tocar las entidades: `head` vuelve al
+        snapshot anterior con `previous`, lo que devolvió `take`.
+        """
+        dirty = self.gamemap.dirty_entities
+        for entity, record in previous.items():
+            if record is None:
+                self.head.pop(entity, None)
+            else:
+                self.head[entity] = record
+            dirty[entity] = None
+        self.depth -= 1
+
+
+def _entities_of(gamemap: GameMap) -> List[Entity]:
+    """Las entidades del mapa y los items en los inventarios de sus actores."""
+    entities: List[Entity] = [*gamemap.all_actors, *gamemap.items]
+    if len(entities) != len(gamemap.entities):
+        entities.extend(gamemap.entities.difference(entities))
+    for actor in gamemap.all_actors:
+        entities.extend(item for item in actor.inventory.slots if item)
+    return entities
+
+
+class Snapshot(NamedTuple):
+    gamemap: GameMap
+    tables: Dict[str, ChunkTable]
+    # Estado en el snapshot anterior de las entidades que cambiaron desde él.
+    entities: Dict[Entity, Optional[EntityRecord]]
+    fov_origin: Optional[Tuple[int, int]]
+    # Lugar en la pila de snapshots del mapa, empezando por 1.
+    depth: int
+
+
+def take(gamemap: GameMap) -> Snapshot:
+    """Guarda el estado de `gamemap`: Tiles, FOV y entidades con sus inventarios."""
+    if gamemap.chunk_store is None:
+        gamemap.chunk_store = ChunkStore(gamemap)
+    if gamemap.entity_store is None:
+        gamemap.entity_store = EntityStore(gamemap)
+    entities = gamemap.entity_store.take()
+    return Snapshot(
+        gamemap,
+        gamemap.chunk_store.take(),
+        entities,
+        gamemap.fov_origin,
+        gamemap.entity_store.depth,
+    )
+
+
+def _check_top(snapshot: Snapshot) -> EntityStore:
+    store = snapshot.gamemap.entity_store
+    assert store is not None
+    if snapshot.depth != store.depth:
+        raise ValueError(
+            f"El snapshot {snapshot.depth} no es el último del mapa ({store.depth})"
+        )
+    return store
+
+
+def restore(snapshot: Snapshot) -> None:
+    """
+    Devuelve el mapa del snapshot al estado en que se tomó y lo saca de la pila.
+
+    Tiene que ser el último snapshot del mapa que no se restauró ni descartó.
+    """
+    store = _check_top(snapshot)
+    gamemap = snapshot.gamemap
+    assert gamemap.chunk_store is not None
+    gamemap.chunk_store.restore(snapshot.tables)
+    gamemap.fov_origin = snapshot.fov_origin
+    store.restore()
+    store.pop(snapshot.entities)
+
+
+def discard(snapshot: Snapshot) -> None:
+    """Saca el último snapshot de la pila sin restaurarlo: el mapa queda como está."""
+    _check_top(snapshot).pop(snapshot.entities)
+
+
+class UndoHistory:
+    """Los últimos `limit` snapshots, uno por comando del jugador."""
+
+    def __init__(self, limit: int):
+        self.snapshots: Deque[Snapshot] = collections.deque(maxlen=limit)
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def push(self, gamemap: GameMap) -> None:
+        if self.snapshots.maxlen:
+            self.snapshots.append(take(gamemap))
+
+    def discard_last(self) -> None:
+        """Descarta el último snapshot, cuando el comando no jugó ningún turno."""
+        if self.snapshots:
+            discard(self.snapshots.pop())
+
+    def clear(self) -> None:
+        """Descarta todos los snapshots, por ejemplo al cambiar de piso."""
+        self.snapshots.clear()
+
+    def undo(self, gamemap: GameMap) -> bool:
+        """Restaura el último snapshot de `gamemap`. Devuelve False si no hay.
+
+        Los snapshots de otro piso se descartan: no se deshace un cambio de piso.
+        """
+        if not self.snapshots:
+            return False
+        snapshot = self.snapshots.pop()
+        if snapshot.gamemap is not gamemap:
+            self.snapshots.clear()
+            return False
+        restore(snapshot)
+        return True
+
+
+@contextlib.contextmanager
+def lookahead(engine: Engine) -> Iterator[Snapshot]:
+    """
+    Permite simular jugadas sobre el mapa actual y deshacerlas al salir.
+
+    Mientras dura, los mensajes van a un historial aparte y no se muestran, y los
+    comandos no se guardan para deshacer. Al salir se restaura el mapa, el handler
+    de eventos y los historiales. No cubre cambios de piso.
+
+        with snapshots.lookahead(engine):
+            action.perform()
+            engine.end_turn()
+            score = evaluate(engine)
+    """
+    message_log: MessageLog = engine.message_log
+    event_handler: EventHandler = engine.event_handler
+    undo_history = engine.undo_history
+    snapshot = take(engine.game_map)
+    engine.message_log = MessageLog(headless=True)
+    # Lo simulado no se puede deshacer con BACKSPACE.
+    engine.undo_history = UndoHistory(0)
+    try:
+        yield snapshot
+    finally:
+        engine.game_map = snapshot.gamemap
+        restore(snapshot)
+        engine.message_log = message_log
+        engine.event_handler = event_handler
+        engine.undo_history = undo_history
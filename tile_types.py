@@ -46,3 +46,33 @@ wall = new_tile(
     dark=(ord(" "), (255, 255, 255), (0, 0, 100)),
     light=(ord(" "), (255, 255, 255), (130, 110, 50)),
 )
+
+down_stairs = new_tile(
+    walkable=True,
+    transparent=True,
+    dark=(ord(">"), (0, 0, 100), (50, 50, 150)),
+    light=(ord(">"), (255, 255, 255), (200, 180, 50)),
+)
+
+up_stairs = new_tile(
+    walkable=True,
+    transparent=True,
+    dark=(ord("<"), (0, 0, 100), (50, 50, 150)),
+    light=(ord("<"), (255, 255, 255), (200, 180, 50)),
+)
+
+# Orden fijo de los tipos de Tile, para guardar un mapa como un array de ids.
+TILE_TYPES = (wall, floor, down_stairs, up_stairs)
+
+
+def to_ids(tiles: np.ndarray) -> np.ndarray:
+    """Convierte un array de Tiles en un array de ids de `TILE_TYPES`."""
+    ids = np.zeros(tiles.shape, dtype=np.uint8, order="F")
+    for tile_id, tile in enumerate(TILE_TYPES):
+        ids[tiles == tile] = tile_id
+    return ids
+
+
+def from_ids(ids: np.ndarray) -> np.ndarray:
+    """Convierte un array de ids de `TILE_TYPES` en un array de Tiles."""
+    return np.asfortranarray(np.array(TILE_TYPES)[ids])
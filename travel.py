@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+import tcod
+
+if TYPE_CHECKING:
+    from game_map import GameMap
+
+# Distancia de los Tiles que no alcanzan ningún destino en el mapa de Dijkstra.
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+def _step_cost(gamemap: GameMap) -> np.ndarray:
+    """Tiles por los que se puede dar un paso ahora: piso sin entidades que bloqueen."""
+    return (gamemap.tiles["walkable"] & (gamemap.blockers == 0)).astype(np.int8)
+
+
+def _distance_to(
+    gamemap: GameMap, goals: np.ndarray, start: Tuple[int, int], explored_only: bool
+) -> np.ndarray:
+    """Mapa de Dijkstra: distancia de cada Tile al destino más cercano en `goals`."""
+    cost = _step_cost(gamemap)
+    if explored_only:
+        cost &= gamemap.explored
+    # El que camina bloquea su propio Tile, pero desde ahí tiene que salir el camino.
+    cost[start] = 1
+
+    distance = np.full(goals.shape, UNREACHABLE, dtype=np.int32, order="F")
+    distance[goals] = 0
+    tcod.path.dijkstra2d(distance, cost, 2, 3, out=distance)
+    return distance
+
+
+def explore_step(gamemap: GameMap, start: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+    """Devuelve (dx, dy) del primer paso hacia el Tile sin explorar más cercano.
+
+    Devuelve None si no queda nada sin explorar que se pueda alcanzar. Cada paso
+    descubre Tiles nuevos, así que el mapa de Dijkstra se arma de nuevo cada vez.
+    """
+    goals = gamemap.tiles["walkable"] & ~gamemap.explored
+    if not goals.any():
+        return None
+
+    distance = _distance_to(gamemap, goals, start, explored_only=False)
+    if distance[start] in (0, UNREACHABLE):
+        return None
+    next_x, next_y = tcod.path.hillclimb2d(distance, start, True, True)[1].tolist()
+    return next_x - start[0], next_y - start[1]
+
+
+def travel_path(
+    gamemap: GameMap, start: Tuple[int, int], goal: Tuple[int, int]
+) -> List[Tuple[int, int]]:
+    """Camino de `start` a `goal`, sin el origen, pasando solo por Tiles explorados.
+
+    Devuelve una lista vacía si no hay camino.
+    """
+    goals = np.zeros((gamemap.width, gamemap.height), dtype=bool, order="F")
+    goals[goal] = True
+    distance = _distance_to(gamemap, goals, start, explored_only=True)
+    if start == goal or distance[start] == UNREACHABLE:
+        return []
+    path: List[List[int]] = tcod.path.hillclimb2d(distance, start, True, True)[
+        1:
+    ].tolist()
+    return [(x, y) for x, y in path]
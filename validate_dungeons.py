@@ -0,0 +1,273 @@
+"""
+Validación en lote de los generadores de mapas.
+
+Genera muchos pisos, uno por semilla, repartidos entre varios procesos. En cada uno
+arma con Dijkstra la distancia de cada Tile al jugador y revisa que todo el piso,
+los items y las escaleras se puedan alcanzar y que ningún monstruo empiece pegado
+al jugador. Además cuenta la densidad de monstruos por franja de distancia y marca
+las semillas que se alejan mucho del promedio. Sale con código 1 si algún piso
+falla, para poder correrlo todas las noches:
+
+    python validate_dungeons.py --seeds 10000 --generator caves
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import multiprocessing
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import tcod
+
+from engine import Engine
+import entity_factories
+from game_map import GameMap
+from game_world import pack_floor, unpack_floor
+from procgen import generate_caves, generate_dungeon
+from travel import UNREACHABLE
+
+GENERATORS: Dict[str, Callable[..., GameMap]] = {
+    "dungeon": generate_dungeon,
+    "caves": generate_caves,
+}
+
+# Los mismos valores que usa `setup_game.new_game`.
+GENERATOR_SETTINGS = dict(
+    map_width=80,
+    map_height=38,
+    max_rooms=30,
+    room_min_size=6,
+    room_max_size=10,
+    max_monsters_per_room=2,
+    max_items_per_room=2,
+)
+
+# Pasos (con diagonales) que abarca cada franja de distancia al jugador.
+BAND_WIDTH = 10
+# Un monstruo más cerca que esto del jugador lo ataca apenas empieza el piso.
+MIN_MONSTER_DISTANCE = 3
+# Desvíos estándar desde los que una densidad se considera anómala.
+OUTLIER_SIGMAS = 3.0
+
+
+class DungeonReport(NamedTuple):
+    seed: int
+    generation_time: float
+    floor_tiles: int
+    unreachable_tiles: int
+    unreachable_items: int
+    stairs_reachable: bool
+    nearest_monster: Optional[int]  # Pasos hasta el monstruo más cercano.
+    restored_in_order: bool  # Los monstruos juegan en el mismo orden al restaurarlo.
+    band_tiles: List[int]  # Tiles alcanzables en cada franja de distancia.
+    band_monsters: List[int]  # Monstruos en cada franja de distancia.
+
+    @property
+    def problems(self) -> List[str]:
+        problems = []
+        if self.unreachable_tiles:
+            problems.append(f"{self.unreachable_tiles} Tiles inalcanzables")
+        if self.unreachable_items:
+            problems.append(f"{self.unreachable_items} items inalcanzables")
+        if not self.stairs_reachable:
+            problems.append("escaleras inalcanzables")
+        nearest = self.nearest_monster
+        if nearest is not None and nearest < MIN_MONSTER_DISTANCE:
+            problems.append(f"monstruo a {self.nearest_monster} pasos del jugador")
+        if not self.restored_in_order:
+            problems.append("el orden de los monstruos cambia al restaurar el piso")
+        return problems
+
+
+def distance_from(gamemap: GameMap, start: Tuple[int, int]) -> np.ndarray:
+    """Pasos desde `start` hasta cada Tile, sin contar entidades, o UNREACHABLE."""
+    distance = np.full(
+        (gamemap.width, gamemap.height), UNREACHABLE, dtype=np.int32, order="F"
+    )
+    distance[start] = 0
+    cost = gamemap.tiles["walkable"].astype(np.int8)
+    tcod.path.dijkstra2d(distance, cost, 1, 1, out=distance)
+    return distance
+
+
+def turn_order(gamemap: GameMap) -> List[Tuple[str, int, int]]:
+    """Nombre y posición de cada monstruo, en el orden en que juegan."""
+    return [(monster.name, monster.x, monster.y) for monster in gamemap.monsters]
+
+
+def validate_seed(generator_name: str, seed: int) -> DungeonReport:
+    """Genera el piso de `seed` con el generador `generator_name` y lo revisa."""
+    rng = random.Random(seed)
+    engine = Engine(player=copy.deepcopy(entity_factories.player))
+    start_time = time.perf_counter()
+    gamemap = GENERATORS[generator_name](
+        engine=engine, rng=rng, **GENERATOR_SETTINGS
+    )
+    generation_time = time.perf_counter() - start_time
+
+    player = engine.player
+    distance = distance_from(gamemap, (player.x, player.y))
+    walkable = gamemap.tiles["walkable"]
+    reachable = distance != UNREACHABLE
+
+    item_xs = np.array([item.x for item in gamemap.items], dtype=np.intp)
+    item_ys = np.array([item.y for item in gamemap.items], dtype=np.intp)
+    monster_xs = np.array([monster.x for monster in gamemap.monsters], dtype=np.intp)
+    monster_ys = np.array([monster.y for monster in gamemap.monsters], dtype=np.intp)
+    monster_distance = distance[monster_xs, monster_ys]
+    monster_distance = monster_distance[monster_distance != UNREACHABLE]
+
+    band_count = int(distance[reachable].max()) // BAND_WIDTH + 1
+    band_tiles = np.bincount(
+        distance[reachable & walkable] // BAND_WIDTH, minlength=band_count
+    )
+    band_monsters = np.bincount(monster_distance // BAND_WIDTH, minlength=band_count)
+
+    # Un piso desalojado y vuelto a cargar tiene que jugar igual que antes.
+    restored = unpack_floor(pack_floor(gamemap, exclude=player), engine)
+
+    stairs = gamemap.downstairs_location
+    return DungeonReport(
+        seed=seed,
+        generation_time=generation_time,
+        floor_tiles=int(walkable.sum()),
+        unreachable_tiles=int((walkable & ~reachable).sum()),
+        unreachable_items=int((~reachable[item_xs, item_ys]).sum()),
+        stairs_reachable=stairs is not None and bool(reachable[stairs]),
+        nearest_monster=int(monster_distance.min()) if len(monster_distance) else None,
+        restored_in_order=turn_order(restored) == turn_order(gamemap),
+        band_tiles=band_tiles.tolist(),
+        band_monsters=band_monsters.tolist(),
+    )
+
+
+def _validate(job: Tuple[str, int]) -> DungeonReport:
+    return validate_seed(*job)
+
+
+def validate_many(
+    generator_name: str, seeds: range, workers: Optional[int] = None
+) -> Iterator[DungeonReport]:
+    """Revisa todas las semillas repartidas entre `workers` procesos.
+
+    Los reportes llegan en el orden en que terminan, no en el de las semillas.
+    """
+    jobs = [(generator_name, seed) for seed in seeds]
+    processes = workers or os.cpu_count() or 1
+    if processes == 1:
+        yield from map(_validate, jobs)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        # Cada piso tarda milisegundos: repartirlos de a muchos ahorra mensajes.
+        chunksize = max(1, len(jobs) // (processes * 8))
+        yield from pool.imap_unordered(_validate, jobs, chunksize=chunksize)
+
+
+class Summary:
+    """Junta los reportes y encuentra los pisos que fallan o se salen de la norma."""
+
+    def __init__(self, reports: List[DungeonReport]):
+        self.reports = sorted(reports, key=lambda report: report.seed)
+        self.failures = [report for report in self.reports if report.problems]
+
+        band_count = max(len(report.band_tiles) for report in self.reports)
+        tiles = np.zeros((len(self.reports), band_count), dtype=np.int64)
+        monsters = np.zeros((len(self.reports), band_count), dtype=np.int64)
+        for row, report in enumerate(self.reports):
+            tiles[row, : len(report.band_tiles)] = report.band_tiles
+            monsters[row, : len(report.band_monsters)] = report.band_monsters
+
+        # Monstruos cada 100 Tiles alcanzables, por semilla y por franja. Las franjas
+        # que una semilla no tiene quedan en NaN y no cuentan para el promedio.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.density = np.where(tiles > 0, monsters * 100 / tiles, np.nan)
+        self.band_mean = np.nanmean(self.density, axis=0)
+        self.band_std = np.nanstd(self.density, axis=0)
+        self.band_seeds = (tiles > 0).sum(axis=0)
+
+        # Solo son anómalas las franjas con Tiles suficientes: una franja de 3 Tiles
+        # con un monstruo no dice nada del generador.
+        limit = self.band_mean + OUTLIER_SIGMAS * self.band_std
+        with np.errstate(invalid="ignore"):
+            outlier = (self.density > limit) & (tiles >= 2 * BAND_WIDTH)
+        self.outliers: List[Tuple[DungeonReport, int, float]] = [
+            (self.reports[row], band, float(self.density[row, band]))
+            for row, band in zip(*np.nonzero(outlier))
+        ]
+
+    def report(self, show: int) -> str:
+        generation = [report.generation_time for report in self.reports]
+        lines = [
+            f"{len(self.reports)} pisos, generación promedio "
+            f"{sum(generation) / len(generation) * 1000:.2f}ms, "
+            f"máxima {max(generation) * 1000:.2f}ms",
+            "Monstruos cada 100 Tiles, por distancia al jugador:",
+        ]
+        for band, (mean, std, seeds) in enumerate(
+            zip(
+                self.band_mean.tolist(),
+                self.band_std.tolist(),
+                self.band_seeds.tolist(),
+            )
+        ):
+            lines.append(
+                f"  {band * BAND_WIDTH:>4}-{(band + 1) * BAND_WIDTH - 1:<4} pasos: "
+                f"{mean:6.2f} ± {std:5.2f} ({seeds} pisos)"
+            )
+
+        lines.append(f"{len(self.failures)} pisos con problemas")
+        for report in self.failures[:show]:
+            lines.append(f"  semilla {report.seed}: {', '.join(report.problems)}")
+        lines.append(f"{len(self.outliers)} franjas con densidad anómala")
+        for report, band, density in self.outliers[:show]:
+            lines.append(
+                f"  semilla {report.seed}: {density:.2f} monstruos cada 100 Tiles "
+                f"a {band * BAND_WIDTH}-{(band + 1) * BAND_WIDTH - 1} pasos"
+            )
+        return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Valida muchos pisos generados.")
+    parser.add_argument(
+        "--generator", choices=sorted(GENERATORS), default="dungeon"
+    )
+    parser.add_argument(
+        "--seeds", type=int, default=1_000, help="Cantidad de semillas."
+    )
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Procesos a usar. Por defecto uno por CPU.",
+    )
+    parser.add_argument(
+        "--show", type=int, default=20, help="Cuántos pisos con problemas mostrar."
+    )
+    args = parser.parse_args()
+    if args.seeds < 1:
+        parser.error("--seeds tiene que ser al menos 1")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers tiene que ser al menos 1")
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    start = time.perf_counter()
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    summary = Summary(list(validate_many(args.generator, seeds, args.workers)))
+    print(summary.report(args.show))
+    print(f"Terminado en {time.perf_counter() - start:.1f}s")
+    if summary.failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()